@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+'''
+:author: Marjorie Battude <marjorie.battude@csgroup.eu>
+:organization: CS Group
+:copyright: 2023 CS Group. All rights reserved.
+:license: see LICENSE file
+:created: 2023
+
+Benchmark of the day of year to date conversions
+(python benchmarks/bench_doy_conversion.py)
+'''
+
+from datetime import datetime
+import timeit
+
+import numpy as np
+
+from ewoc_prod.utils import conversion_doy_to_date, conversion_doy_to_datetime64
+
+NB_DOYS = 100000
+
+def strptime_doy_to_date(doy: int, year: int):
+    """Conversion before the lookup table (strptime round-trips)"""
+    date_string = datetime.strptime(str(year) + "-" + str(doy), "%Y-%j").strftime("%Y-%m-%d")
+    return datetime.strptime(date_string, "%Y-%m-%d").date()
+
+def main()->None:
+    """
+    Compare strptime, lookup table and vectorized conversions
+    """
+    rng = np.random.default_rng(0)
+    doys = rng.integers(1, 367, NB_DOYS)
+    years = rng.integers(2017, 2025, NB_DOYS)
+    doys_list, years_list = doys.tolist(), years.tolist()
+
+    def run_strptime():
+        return [strptime_doy_to_date(doy, year) for doy, year in zip(doys_list, years_list)]
+
+    def run_table():
+        return [conversion_doy_to_date(doy, year) for doy, year in zip(doys_list, years_list)]
+
+    def run_vectorized():
+        return conversion_doy_to_datetime64(doys, years)
+
+    assert run_strptime() == run_table() == run_vectorized().astype(object).tolist()
+    results = {}
+    for name, func in (('strptime', run_strptime),
+                       ('lookup table', run_table),
+                       ('vectorized', run_vectorized)):
+        results[name] = min(timeit.repeat(func, number=1, repeat=5))
+    for name, duration in results.items():
+        print(f"{name:>12}: {duration * 1e9 / NB_DOYS:10.1f} ns/doy "
+              f"(x{results['strptime'] / duration:.0f})")
+
+if __name__ == '__main__':
+    main()
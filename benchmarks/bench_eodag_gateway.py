@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+'''
+:author: Marjorie Battude <marjorie.battude@csgroup.eu>
+:organization: CS Group
+:copyright: 2023 CS Group. All rights reserved.
+:license: see LICENSE file
+:created: 2023
+
+Benchmark of the EODataAccessGateway initialisation: time to create a gateway
+with all the providers or only the providers used, and time saved for an AEZ
+when the gateways are reused
+(python benchmarks/bench_eodag_gateway.py [eodag config file] [nb tiles] [nb threads])
+'''
+
+import os
+import sys
+import time
+
+from ewoc_prod.ewoc_work_plan.utils import (EODAG_PROVIDERS_ENV, get_eodag_providers,
+    set_eodag_providers)
+
+NB_RUNS = 3
+
+# Workplan data providers of the default production
+S1_DATA_PROVIDER = 'creodias'
+S2_DATA_PROVIDER = ['aws', 'aws_sng']
+
+def time_gateway(creds: str)->float:
+    """
+    Get the best time to create a gateway
+    :param creds: eodag configuration file
+    """
+    from eodag.api.core import EODataAccessGateway
+
+    durations = []
+    for _ in range(NB_RUNS):
+        start = time.perf_counter()
+        EODataAccessGateway(user_conf_file_path=creds)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+def main()->None:
+    """
+    Print the gateway init cost and the cost saved per AEZ
+    """
+    creds = sys.argv[1] if len(sys.argv) > 1 else \
+        f"{os.getenv('HOME')}/.config/eodag/eodag.yml"
+    nb_tiles = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    nb_threads = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+    providers = get_eodag_providers(S1_DATA_PROVIDER, S2_DATA_PROVIDER)
+    # Searches of a tile: S1, S2 (one per provider and level), L8
+    nb_calls_per_tile = 1 + 2 * len(S2_DATA_PROVIDER) + 1
+
+    whitelist = os.getenv(EODAG_PROVIDERS_ENV)
+    set_eodag_providers([])
+    init_all = time_gateway(creds)
+    set_eodag_providers(providers)
+    init_used = time_gateway(creds)
+    set_eodag_providers(whitelist.split(',') if whitelist else [])
+
+    # One gateway per call before, one per thread and provider now
+    before = nb_tiles * nb_calls_per_tile * init_all
+    after = nb_threads * len(providers) * init_used
+    print(f"{'gateway init, all providers':<40} {init_all * 1000:8.1f} ms")
+    print(f"{'gateway init, ' + ','.join(providers):<40} {init_used * 1000:8.1f} ms")
+    print(f"AEZ of {nb_tiles} tiles, {nb_calls_per_tile} searches per tile, "
+          f"{nb_threads} threads:")
+    print(f"{'init cost without cache':<40} {before:8.1f} s")
+    print(f"{'init cost with cache':<40} {after:8.1f} s")
+    print(f"{'init cost saved':<40} {before - after:8.1f} s")
+
+if __name__ == '__main__':
+    main()
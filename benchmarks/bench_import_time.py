@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+'''
+:author: Marjorie Battude <marjorie.battude@csgroup.eu>
+:organization: CS Group
+:copyright: 2023 CS Group. All rights reserved.
+:license: see LICENSE file
+:created: 2023
+
+Benchmark of the cold start of the entry points: time to import them (or to
+print the help) in a new interpreter and heavy dependencies loaded
+(python benchmarks/bench_import_time.py)
+'''
+
+import json
+import subprocess
+import sys
+import time
+
+# Entry points (module or command line) to measure
+ENTRY_POINTS = (
+    ('import ewoc_prod.cli', ['-c', 'import ewoc_prod.cli']),
+    ('import ewoc_prod.ewoc_work_plan.cli', ['-c', 'import ewoc_prod.ewoc_work_plan.cli']),
+    ('import ewoc_prod.supervisor', ['-c', 'import ewoc_prod.supervisor']),
+    ('ewoc_prod --help', ['-m', 'ewoc_prod.cli', '--help']),
+    ('ewoc_work_plan --help', ['-m', 'ewoc_prod.ewoc_work_plan.cli', '--help']),
+)
+
+# Dependencies that must only be loaded when they are used
+HEAVY_MODULES = ('osgeo', 'boto3', 'botocore', 'eodag', 'eotile', 'geopandas',
+                 'ewoc_dag', 'shapely', 'pandas')
+
+NB_RUNS = 5
+
+def get_loaded_modules(module_name: str)->list:
+    """
+    Get the heavy modules loaded by the import of a module
+    :param module_name: module to import
+    """
+    code = (f"import json, sys; import {module_name}; "
+            f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))")
+    output = subprocess.run([sys.executable, '-c', code], check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+def time_command(args: list)->float:
+    """
+    Get the best wall time of a python command in a new interpreter
+    :param args: python arguments
+    """
+    durations = []
+    for _ in range(NB_RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, check=True, capture_output=True)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+def main()->None:
+    """
+    Print the cold start time of each entry point
+    """
+    baseline = time_command(['-c', 'pass'])
+    print(f"{'python -c pass':<40} {baseline * 1000:8.1f} ms")
+    for name, args in ENTRY_POINTS:
+        duration = time_command(args)
+        line = f"{name:<40} {duration * 1000:8.1f} ms"
+        if args[0] == '-c':
+            loaded = get_loaded_modules(args[1].split()[-1])
+            line += f"  heavy modules: {', '.join(loaded) or '-'}"
+        print(line)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+'''
+:author: Marjorie Battude <marjorie.battude@csgroup.eu>
+:organization: CS Group
+:copyright: 2023 CS Group. All rights reserved.
+:license: see LICENSE file
+:created: 2023
+
+Benchmark of the merge of the S2 products of several providers: quadratic merge
+(before) and merge indexed by date, for several years and providers
+(python benchmarks/bench_s2_merge.py)
+'''
+
+from datetime import datetime, timedelta
+import logging
+import timeit
+
+from ewoc_prod.ewoc_work_plan.s2prods import merge_ids, merge_providers_ids
+
+NB_RUNS = 5
+# Products every 5 days for each S2 satellite
+S2_REVISIT = 5
+# Providers and levels of the merge (the first one is the reference)
+PROVIDERS = [('creodias', 'L1C'), ('aws', 'L2A'), ('aws_sng', 'L1C'), ('creodias', 'L2A')]
+
+def quadratic_merge_ids(ref: dict, sec: dict)->dict:
+    """Merge before the date index (every ref product compared to every sec product)"""
+    fusion = {}
+    for pid_r in ref:
+        found = False
+        for pid_s in sec:
+            if ref[pid_r]["date"] == sec[pid_s]["date"] and \
+                ref[pid_r]["level"] != sec[pid_s]["level"]:
+                found = True
+                sec_id = pid_s
+        if found:
+            fusion[sec_id] = sec[sec_id]
+        else:
+            fusion[pid_r] = ref[pid_r]
+    return fusion
+
+def quadratic_merge_providers_ids(ref: dict, secs: list)->dict:
+    """Merge of several providers before the date index (full scan of ref each round)"""
+    first = next(iter(ref.values()))
+    for sec in secs:
+        if not any(info["provider"] == first["provider"] and info["level"] == first["level"]
+                   for info in ref.values()):
+            break
+        ref = quadratic_merge_ids(ref, sec)
+    return ref
+
+def s2_products(provider: str, level: str, nb_years: int, missing: int)->dict:
+    """
+    S2 products of a tile for a provider, one product every `missing` is missing
+    """
+    products = {}
+    start = datetime(2018, 1, 1, 10, 54, 41)
+    for day in range(0, nb_years * 365, S2_REVISIT):
+        for sat, offset in (('A', 0), ('B', 2)):
+            if (day + offset) % missing == 0:
+                continue
+            date = start + timedelta(days=day + offset)
+            pid = (f'S2{sat}_MSI{level}_{date:%Y%m%dT%H%M%S}_N0400_R051_T31TCJ_'
+                   f'{date + timedelta(hours=2):%Y%m%dT%H%M%S}')
+            products[pid] = {'cc': float(day % 100), 'date': date, 'provider': provider,
+                             'level': level}
+    return products
+
+def main()->None:
+    """
+    Compare the merges for 1 to 5 years and 2 to 4 providers
+    """
+    logging.disable(logging.INFO)
+    print(f"{'years':>5} {'providers':>9} {'products':>9} {'quadratic ms':>13} "
+          f"{'date index ms':>14} {'speedup':>8}")
+    for nb_years in (1, 3, 5):
+        for nb_providers in (2, 3, 4):
+            all_products = [s2_products(provider, level, nb_years, missing)
+                            for (provider, level), missing in
+                            zip(PROVIDERS[:nb_providers], (7, 11, 13, 17))]
+            ref, secs = all_products[0], all_products[1:]
+            provider, level = PROVIDERS[0]
+            assert quadratic_merge_providers_ids(ref, secs) == \
+                merge_providers_ids(ref, [lambda sec=sec: sec for sec in secs], provider, level)
+            quadratic = min(timeit.repeat(lambda: quadratic_merge_providers_ids(ref, secs),
+                                          number=1, repeat=NB_RUNS))
+            indexed = min(timeit.repeat(
+                lambda: merge_providers_ids(ref, [lambda sec=sec: sec for sec in secs],
+                                            provider, level),
+                number=1, repeat=NB_RUNS))
+            nb_products = sum(len(products) for products in all_products)
+            print(f'{nb_years:>5} {nb_providers:>9} {nb_products:>9} {quadratic * 1000:>13.2f} '
+                  f'{indexed * 1000:>14.2f} {quadratic / indexed:>7.0f}x')
+    pair = [s2_products(provider, level, 5, 7) for provider, level in PROVIDERS[:2]]
+    assert quadratic_merge_ids(*pair) == merge_ids(*pair)
+
+if __name__ == '__main__':
+    main()
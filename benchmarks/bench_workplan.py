@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+'''
+:author: Marjorie Battude <marjorie.battude@csgroup.eu>
+:organization: CS Group
+:copyright: 2023 CS Group. All rights reserved.
+:license: see LICENSE file
+:created: 2023
+
+End-to-end benchmark of the workplan generation with synthetic catalogues:
+S2 grid, S1/S2/L8 searches and bucket checks are answered by local stand-ins,
+WorkPlan (and run_multiple_cross_provider for S2) runs unchanged for N tiles and
+M years. Time per stage, number of requests per kind and peak memory are reported
+(python benchmarks/bench_workplan.py -t 1 10 100 1000 -y 1)
+'''
+
+import argparse
+from datetime import date, datetime, timedelta
+import logging
+import random
+import threading
+import time
+import tracemalloc
+
+from ewoc_prod.ewoc_work_plan.engine import AsyncEngine, set_engine
+from ewoc_prod.ewoc_work_plan.s2prods import S2_SEARCHES, STAC_UNRELIABLE_TILES
+from ewoc_prod.ewoc_work_plan.search_cache import CachedProduct
+from ewoc_prod.ewoc_work_plan.tile_index import S2TileIndex, set_s2_tile_index
+from ewoc_prod.ewoc_work_plan.transport import LiveTransport, set_transport
+from ewoc_prod.ewoc_work_plan.utils import (EODAG_L8_PROVIDER, get_search_key,
+    get_search_kwargs)
+from ewoc_prod.ewoc_work_plan.workplan import S1_PRODUCT_TYPES, WorkPlan
+
+# Grid of 1 degree tiles, GRID_WIDTH tiles per row
+GRID_WIDTH = 40
+LATITUDE_BANDS = 'CDEFGHJKLMNPQRSTUVWX'
+SQUARE_LETTERS = 'ABCDEFGHJKLMNPQRSTUVWXYZ'
+START_DATE = date(2021, 1, 1)
+# Revisit of the synthetic acquisitions (days)
+S1_REVISIT = 6
+S2_REVISIT = 5
+L8_REVISIT = 16
+# Part of the S2 products missing in the buckets
+S2_MISSING_RATIO = 0.02
+STAGES = ('s1', 's2', 'l8')
+
+def build_s2_grid(nb_tiles: int):
+    """
+    Synthetic S2 grid: 1 degree tiles with valid tile ids, rows of GRID_WIDTH tiles
+    The tiles read from the buckets instead of the STAC API (01KAB) are skipped
+    :param nb_tiles: number of tiles
+    """
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    tile_ids, geometries = [], []
+    i = 0
+    while len(tile_ids) < nb_tiles:
+        x, y = i % GRID_WIDTH, i // GRID_WIDTH
+        i += 1
+        tile_id = (f'{x + 1:02d}{LATITUDE_BANDS[y % 20]}'
+                   f'{SQUARE_LETTERS[y // 20]}{SQUARE_LETTERS[(x + 1) % 24]}')
+        if tile_id in STAC_UNRELIABLE_TILES:
+            continue
+        tile_ids.append(tile_id)
+        geometries.append(box(x, 30 + y, x + 1, 31 + y))
+    return gpd.GeoDataFrame({'id': tile_ids}, geometry=geometries, crs='EPSG:4326')
+
+def acquisition_dates(start: date, end: date, revisit: int, offset: int):
+    """Dates of the acquisitions between start and end"""
+    current = start + timedelta(days=offset % revisit)
+    while current <= end:
+        yield current
+        current += timedelta(days=revisit)
+
+class SyntheticCatalogue:
+    """
+    Products of the synthetic tiles, generated when they are searched (same
+    products for the same tile and dates)
+    """
+
+    def __init__(self, start: date, end: date):
+        self.start = start
+        self.end = end
+
+    def s1_products(self, tile_id: str, geometry):
+        """S1 GRD products of a tile, ascending and descending orbits"""
+        rng = random.Random(f'S1{tile_id}')
+        products = []
+        for orbit, hour in (('ascending', '173000'), ('descending', '054500')):
+            offset = rng.randrange(S1_REVISIT)
+            for acq_date in acquisition_dates(self.start, self.end, S1_REVISIT, offset):
+                day = acq_date.strftime('%Y%m%d')
+                abs_orbit = 36000 + (acq_date - self.start).days * 15
+                pid = (f'S1A_IW_GRDH_1SDV_{day}T{hour}_{day}T{hour[:4]}25_'
+                       f'{abs_orbit:06d}_{abs_orbit % 0xFFFFFF:06X}_{rng.randrange(0xFFFF):04X}')
+                products.append(CachedProduct({'id': pid, 'timeliness': 'Fast-24h',
+                                               'orbitDirection': orbit}, {}, geometry))
+        return products
+
+    def s2_products(self, tile_id: str, geometry, provider: str, level: str):
+        """S2 products of a tile for an eodag provider and a level"""
+        # Same dates and cloud cover for all the providers and levels
+        rng = random.Random(f'S2{tile_id}')
+        products = []
+        for i, acq_date in enumerate(acquisition_dates(self.start, self.end, S2_REVISIT,
+                                                       rng.randrange(S2_REVISIT))):
+            day = acq_date.strftime('%Y%m%d')
+            sat = 'AB'[i % 2]
+            pid = f'S2{sat}_MSI{level}_{day}T105441_N0400_R051_T{tile_id}_{day}T120000'
+            cloud_cover = round(rng.uniform(0, 100), 2)
+            if provider == 'creodias':
+                properties = {'title': pid, 'cloudCover': cloud_cover,
+                              'storageStatus': 'ONLINE'}
+            else:
+                properties = {'sentinel:product_id': pid, 'cloudCover': cloud_cover,
+                              'id': f'S2{sat}_{tile_id}_{day}_0_{level}'}
+            products.append(CachedProduct(properties, {}, geometry))
+        return products
+
+    def l8_products(self, tile_id: str, geometry):
+        """L8 C2L2 products of a tile, two overlapping paths"""
+        rng = random.Random(f'L8{tile_id}')
+        path = 100 + rng.randrange(100)
+        row = 20 + rng.randrange(100)
+        products = []
+        for path_offset in (0, 1):
+            for acq_date in acquisition_dates(self.start, self.end, L8_REVISIT,
+                                              rng.randrange(L8_REVISIT)):
+                day = acq_date.strftime('%Y%m%d')
+                processing_day = (acq_date + timedelta(days=10)).strftime('%Y%m%d')
+                pid = (f'LC08_L2SP_{path + path_offset:03d}{row:03d}_{day}_'
+                       f'{processing_day}_02_T1_SR')
+                href = (f's3://usgs-landsat/collection02/level-2/standard/oli-tirs/'
+                        f'{acq_date.year}/{path + path_offset:03d}/{row:03d}/{pid}/{pid}_B2.TIF')
+                products.append(CachedProduct(
+                    {'id': pid,
+                     'startTimeFromAscendingNode': f'{acq_date.isoformat()}T10:30:00Z',
+                     'landsat:cloud_cover_land': round(rng.uniform(-1, 100), 2),
+                     'landsat:correction': 'L2SP'},
+                    {'blue': {'href': href}}, geometry))
+        return products
+
+class SyntheticTransport(LiveTransport):
+    """
+    Local stand-in of the providers: catalogue searches of the synthetic tiles,
+    bucket checks and cloud masks, with an optional latency per request
+    """
+
+    mode = 'synthetic'
+
+    def __init__(self, catalogue: SyntheticCatalogue, latency: float = 0.):
+        """
+        :param catalogue: products of the tiles
+        :param latency: time of each request (s)
+        """
+        self.catalogue = catalogue
+        self.latency = latency
+        self.nb_calls = {}
+        self.generation_time = 0.
+        self._searches = {}
+        self._lock = threading.Lock()
+
+    def add_tiles(self, s2_grid, s1_provider: str, s2_searches, start: str, end: str,
+                  cloudcover: float):
+        """
+        Register the searches of the tiles done by WorkPlan
+        :param s2_grid: tiles (GeoDataFrame)
+        :param s2_searches: list of (eodag provider, product type, level)
+        """
+        from shapely.wkt import dumps
+
+        for tile_id, geometry in zip(s2_grid['id'], s2_grid.geometry):
+            poly = dumps(geometry)
+            searches = {
+                (s1_provider, S1_PRODUCT_TYPES[s1_provider], None): ('s1',),
+                (EODAG_L8_PROVIDER, 'LANDSAT_C2L2_SR', cloudcover): ('l8',),
+            }
+            for provider, product_type, level in s2_searches:
+                searches[(provider, product_type, 100)] = ('s2', provider, level)
+            for (provider, product_type, cloud_cover), search in searches.items():
+                search_kwargs = get_search_kwargs(poly, start, end, product_type, cloud_cover)
+                self._searches[get_search_key(provider, search_kwargs)] = \
+                    (tile_id, geometry, search)
+
+    def search(self, key: str):
+        """Products of a registered search"""
+        tile_id, geometry, search = self._searches[key]
+        start = time.perf_counter()
+        if search[0] == 's1':
+            products = self.catalogue.s1_products(tile_id, geometry)
+        elif search[0] == 's2':
+            products = self.catalogue.s2_products(tile_id, geometry, *search[1:])
+        else:
+            products = self.catalogue.l8_products(tile_id, geometry)
+        with self._lock:
+            self.generation_time += time.perf_counter() - start
+        return products
+
+    def list_bucket(self, listing_prefix: str):
+        """
+        Objects counts of the S2 products of a listed prefix of the sentinel-s2-l2a
+        (tiles/31/T/CJ/2021/...) or sentinel-cogs buckets, some products are missing
+        """
+        root, zone, band, square = listing_prefix.split('/')[:4]
+        tile_id = f'{int(zone):02d}{band}{square}'
+        counts = {}
+        for product in self.catalogue.s2_products(tile_id, None, 'earth_search', 'L2A'):
+            acq_date = datetime.strptime(product.properties['id'].split('_')[2], '%Y%m%d')
+            prefix = [root, zone.lstrip('0'), band, square, str(acq_date.year),
+                      str(acq_date.month)]
+            if root == 'tiles':
+                prefix += [str(acq_date.day), '0']
+                nb_objects = 70
+            else:
+                prefix.append(product.properties['id'])
+                nb_objects = 20
+            prd_prefix = '/'.join(prefix) + '/'
+            if prd_prefix.startswith(listing_prefix) and \
+                    random.Random(prd_prefix).random() >= S2_MISSING_RATIO:
+                counts[prd_prefix] = nb_objects
+        return counts
+
+    def _request(self, kind, key, func, encode=None, decode=None):
+        with self._lock:
+            self.nb_calls[kind] = self.nb_calls.get(kind, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        if kind == 'search':
+            return self.search(key)
+        if kind in ('s2_l2a_bucket_listing', 's2_l2a_cogs_bucket_listing'):
+            return self.list_bucket(key)
+        if kind in ('s2_l2a_bucket', 's2_l2a_cogs_bucket'):
+            return key in self.list_bucket(key)
+        if kind == 'landsat_cloud_mask':
+            return True, f'{key}_QA_PIXEL.TIF', f'{key}_ST_B10.TIF'
+        if kind == 's2_tile_info_listing':
+            return []
+        if kind == 's2_tile_info':
+            return None
+        raise NotImplementedError(f'No synthetic response for {kind}')
+
+class TimedWorkPlan(WorkPlan):
+    """
+    WorkPlan with the time spent in the identification of each sensor
+    (cumulated over the threads)
+    """
+
+    stage_times = {}
+    _stage_lock = threading.Lock()
+
+    def _timed(self, stage, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            with self._stage_lock:
+                TimedWorkPlan.stage_times[stage] = \
+                    TimedWorkPlan.stage_times.get(stage, 0.) + time.perf_counter() - start
+
+    def _identify_s1(self, *args, **kwargs):
+        return self._timed('s1', super()._identify_s1, *args, **kwargs)
+
+    def _identify_s2(self, *args, **kwargs):
+        return self._timed('s2', super()._identify_s2, *args, **kwargs)
+
+    def _identify_l8(self, *args, **kwargs):
+        return self._timed('l8', super()._identify_l8, *args, **kwargs)
+
+def run(args, s2_grid, nb_tiles: int, trace_memory: bool):
+    """
+    Generate the workplan of the first tiles of the grid
+    :return: workplan, total time, stage times, transport and peak memory (MB)
+    """
+    start_date = START_DATE
+    end_date = date(START_DATE.year + args.years, 1, 1) - timedelta(days=1)
+    start, end = start_date.isoformat(), end_date.isoformat()
+    grid = s2_grid.iloc[:nb_tiles]
+    set_s2_tile_index(S2TileIndex(grid))
+
+    s2_searches = []
+    for provider, level in zip(args.s2_data_provider, args.s2_strategy):
+        if (provider, level) in S2_SEARCHES:
+            s2_searches.append((S2_SEARCHES[(provider, level)][0],
+                                S2_SEARCHES[(provider, level)][1], level))
+    transport = SyntheticTransport(SyntheticCatalogue(start_date, end_date),
+                                   latency=args.latency / 1000)
+    transport.add_tiles(grid, args.s1_data_provider, s2_searches, start, end, args.cloudcover)
+    set_transport(transport)
+    engine = AsyncEngine(max_threads=args.engine_threads) if args.engine_threads else None
+    set_engine(engine)
+    TimedWorkPlan.stage_times = {}
+
+    if trace_memory:
+        tracemalloc.start()
+    begin = time.perf_counter()
+    try:
+        workplan = TimedWorkPlan(
+            list(grid['id']),
+            {'season_start': start, 'season_end': end},
+            start,
+            end,
+            args.s1_data_provider,
+            args.s2_data_provider,
+            args.s2_strategy,
+            cloudcover=args.cloudcover,
+            only_s2=args.sensor == 's2',
+            only_s1=args.sensor == 's1',
+            only_l8=args.sensor == 'l8',
+            max_workers=args.workers,
+        )
+        total = time.perf_counter() - begin
+        peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2 if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        set_transport(LiveTransport())
+        set_s2_tile_index(None)
+        if engine is not None:
+            set_engine(None)
+            engine.close()
+    return workplan, total, dict(TimedWorkPlan.stage_times), transport, peak
+
+def main()->None:
+    """
+    Print the workplan generation costs for each number of tiles
+    """
+    parser = argparse.ArgumentParser(description='Benchmark of the workplan generation')
+    parser.add_argument('-t', '--tiles', help='Numbers of tiles', nargs='+', type=int,
+                        default=[1, 10, 100, 1000])
+    parser.add_argument('-y', '--years', help='Number of years', type=int, default=1)
+    parser.add_argument('-w', '--workers', help='Number of identifications running at '
+                        'the same time (WorkPlan max_workers)', type=int, default=1)
+    parser.add_argument('-e', '--engine_threads', help='Threads of the async engine '
+                        '(0: no engine)', type=int, default=0)
+    parser.add_argument('-l', '--latency', help='Latency of each request (ms)',
+                        type=float, default=0.)
+    parser.add_argument('-s1prov', '--s1_data_provider', type=str, default='creodias')
+    parser.add_argument('-s2prov', '--s2_data_provider', nargs='+', type=str,
+                        default=['creodias', 'aws'])
+    parser.add_argument('-strategy', '--s2_strategy', nargs='+', type=str,
+                        default=['L1C', 'L2A'])
+    parser.add_argument('-cc', '--cloudcover', type=float, default=90)
+    parser.add_argument('-only', '--sensor', choices=STAGES, default=None,
+                        help='Identify the products of one sensor only')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='Do not measure the peak memory (second run with tracemalloc)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL, force=True)
+
+    s2_grid = build_s2_grid(max(args.tiles))
+    print(f"{'tiles':>6} {'total s':>9} {'ms/tile':>8} "
+          + ' '.join(f'{stage + " s":>8}' for stage in STAGES)
+          + f" {'catalog s':>9} {'requests':>9} {'products':>9} {'peak MB':>8}")
+    for nb_tiles in args.tiles:
+        workplan, total, stage_times, transport, _ = run(args, s2_grid, nb_tiles, False)
+        peak = run(args, s2_grid, nb_tiles, True)[4] if args.memory else float('nan')
+        nb_products = sum(tile['s1_nb'] + tile['s2_nb'] + tile['l8_nb']
+                          for tile in workplan._plan['tiles'])
+        print(f'{nb_tiles:>6} {total:>9.2f} {total / nb_tiles * 1000:>8.1f} '
+              + ' '.join(f'{stage_times.get(stage, 0.):>8.2f}' for stage in STAGES)
+              + f' {transport.generation_time:>9.2f} {sum(transport.nb_calls.values()):>9}'
+              f' {nb_products:>9} {peak:>8.1f}')
+        print('        requests: ' + ', '.join(
+            f'{kind}={nb}' for kind, nb in sorted(transport.nb_calls.items())))
+    print(f'{args.years} year(s), {args.workers} worker(s), {args.engine_threads} engine '
+          f'thread(s), {args.latency} ms latency')
+
+if __name__ == '__main__':
+    main()
@@ -12,11 +12,12 @@ import json
 import logging
 import sys
 
-from eotile import eotile_module
 from eodag.utils.logging import setup_logging
 from eodag.api.core import EODataAccessGateway
 from osgeo import ogr, osr
 
+from ewoc_prod.ewoc_work_plan.tile_index import get_s2_tile_index
+
 
 def filter_tiles(s2_tiles, s2_exclusion_json):
     out_s2tiles = []
@@ -98,9 +99,12 @@ def main(arguments):
     out_layer.CreateField(ogr.FieldDefn('wweos_max', ogr.OFTInteger))
 
 
+    # S2 grid loaded once for all the AEZ
+    s2_tile_index = get_s2_tile_index()
+
     for feat in aez_layer:
 
-        [s2_tiles, l8_tiles, srtm_tiles, copernicus_tiles] = eotile_module.main(feat.GetGeometryRef().ExportToWkt())
+        s2_tiles = s2_tile_index.get_many(s2_tile_index.query(feat.GetGeometryRef().ExportToWkt()))
         filtered_s2_tiles = filter_tiles(s2_tiles, s2_exclusion_json)
 
         if len(filtered_s2_tiles):
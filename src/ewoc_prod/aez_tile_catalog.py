@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+'''
+:author: Marjorie Battude <marjorie.battude@csgroup.eu>
+:organization: CS Group
+:copyright: 2023 CS Group. All rights reserved.
+:license: see LICENSE file
+:created: 2023
+'''
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Fields of the MGRS/AEZ grid used to prepare the workplans
+CATALOG_FIELDS = ('zoneID',
+                  'wwsos_min', 'wweos_max',
+                  'm1sos_min', 'm1eos_max',
+                  'm2sos_min', 'm2eos_max',
+                  'L8', 'trigger_sw')
+
+# End of season fields, by order of precedence when several seasons end the same day
+EOS_FIELDS = (('winter', 'wweos_max'),
+              ('summer1', 'm1eos_max'),
+              ('summer2', 'm2eos_max'))
+
+# Bump when the layout of the sidecar cache changes
+CACHE_VERSION = 1
+
+class AezTile:
+    """
+    S2 tile of the MGRS/AEZ grid with its aez information
+    Fields are read with GetField() as for an ogr feature of the grid
+    """
+    __slots__ = ('tile_id', 'index', '_catalog')
+
+    def __init__(self, catalog: 'AezTileCatalog', index: int)->None:
+        self._catalog = catalog
+        self.index = index
+        self.tile_id = catalog.tile_ids[index]
+
+    def GetField(self, field_name: str):
+        """
+        Get a field value (None if the field is null)
+        :param field_name: field name (e.g. 'wwsos_min')
+        """
+        if field_name == 'tile':
+            return self.tile_id
+        return self._catalog.get_field(self.index, field_name)
+
+    def GetGeometryRef(self):
+        """
+        Get the tile geometry (ogr geometry)
+        """
+        return self._catalog.get_geometry(self.index)
+
+    def intersects(self, geometry)->bool:
+        """
+        Check if the tile intersects a geometry (envelope prefilter then exact test)
+        :param geometry: ogr geometry in the grid spatial reference
+        """
+        tile_geometry = self.GetGeometryRef()
+        if tile_geometry is None:
+            return False
+        t_minx, t_maxx, t_miny, t_maxy = tile_geometry.GetEnvelope()
+        g_minx, g_maxx, g_miny, g_maxy = geometry.GetEnvelope()
+        if t_minx > g_maxx or g_minx > t_maxx or t_miny > g_maxy or g_miny > t_maxy:
+            return False
+        return tile_geometry.Intersects(geometry)
+
+class AezTileCatalog:
+    """
+    In-memory MGRS/AEZ grid, loaded once and indexed by tile id and by aez id
+
+    Fields are stored as columns (float64, NaN for null values), geometries
+    are kept as WKB and only decoded by GDAL when requested.
+    """
+    def __init__(self,
+                 tile_ids: Sequence[str],
+                 columns: Dict[str, np.ndarray],
+                 kinds: Optional[Dict[str, str]] = None,
+                 wkb_offsets: Optional[np.ndarray] = None,
+                 wkb_buffer=None)->None:
+        self.tile_ids = [str(tile_id) for tile_id in tile_ids]
+        self._columns = {field: np.asarray(values, dtype=np.float64)
+                         for field, values in columns.items()}
+        self._kinds = kinds if kinds is not None else {field: 'i' for field in columns}
+        self._wkb_offsets = wkb_offsets
+        self._wkb_buffer = wkb_buffer
+        self._geometries = {}
+        self._eos_doy_index: Optional[Dict[int, List[Tuple[str, float, str]]]] = None
+        self._tile_index = {tile_id: index for index, tile_id in enumerate(self.tile_ids)}
+        self._aez_index: Dict[int, List[int]] = {}
+        if 'zoneID' in self._columns:
+            for index, zone_id in enumerate(self._columns['zoneID']):
+                if not np.isnan(zone_id):
+                    self._aez_index.setdefault(int(zone_id), []).append(index)
+
+    @classmethod
+    def from_file(cls, s2tiles_aez_file: str, use_cache: bool = True)->'AezTileCatalog':
+        """
+        Load the MGRS/AEZ grid (read-only)
+        The grid is read from its sidecar cache when it is up to date, otherwise
+        it is parsed with OGR and the cache is (re)built next to the grid.
+        :param s2tiles_aez_file: MGRS grid that contains for each included tile
+            the associated aez information (geojson file)
+        :param use_cache: if False, always parse the grid with OGR
+        """
+        if use_cache:
+            catalog = read_catalog_cache(s2tiles_aez_file)
+            if catalog is not None:
+                logger.info("%s tiles loaded from the cache of %s",
+                            len(catalog), s2tiles_aez_file)
+                return catalog
+        catalog = cls._from_ogr(s2tiles_aez_file)
+        logger.info("%s tiles loaded from %s", len(catalog), s2tiles_aez_file)
+        if use_cache:
+            try:
+                write_catalog_cache(catalog, s2tiles_aez_file)
+            except OSError as err:
+                logger.warning("Cannot write the cache of %s: %s", s2tiles_aez_file, err)
+        return catalog
+
+    @classmethod
+    def _from_ogr(cls, s2tiles_aez_file: str)->'AezTileCatalog':
+        """
+        Parse the MGRS/AEZ grid with OGR
+        :param s2tiles_aez_file: MGRS grid (geojson file)
+        """
+        from osgeo import ogr
+
+        driver = ogr.GetDriverByName('GeoJSON')
+        data_source = driver.Open(s2tiles_aez_file, 0)
+        if data_source is None:
+            raise ValueError(f"Cannot open the MGRS/AEZ grid {s2tiles_aez_file}")
+        s2tiles_layer = data_source.GetLayer()
+        layer_defn = s2tiles_layer.GetLayerDefn()
+        kinds = {}
+        for i in range(layer_defn.GetFieldCount()):
+            field_defn = layer_defn.GetFieldDefn(i)
+            if field_defn.GetName() in CATALOG_FIELDS:
+                is_integer = field_defn.GetType() in (ogr.OFTInteger, ogr.OFTInteger64)
+                kinds[field_defn.GetName()] = 'i' if is_integer else 'f'
+        tile_ids = []
+        values = {field: [] for field in kinds}
+        wkb_list = []
+        for feature in s2tiles_layer:
+            tile_ids.append(feature.GetField('tile'))
+            for field, field_values in values.items():
+                value = feature.GetField(field)
+                field_values.append(np.nan if value is None else value)
+            geometry = feature.GetGeometryRef()
+            wkb_list.append(bytes(geometry.ExportToWkb()) if geometry is not None else b'')
+        data_source = None
+        wkb_offsets = np.cumsum([0] + [len(wkb) for wkb in wkb_list], dtype=np.int64)
+        return cls(tile_ids, values, kinds, wkb_offsets, b''.join(wkb_list))
+
+    def __len__(self)->int:
+        return len(self.tile_ids)
+
+    def __iter__(self)->Iterator[AezTile]:
+        return (AezTile(self, index) for index in range(len(self.tile_ids)))
+
+    def __contains__(self, tile_id: str)->bool:
+        return tile_id in self._tile_index
+
+    @property
+    def fields(self)->List[str]:
+        """
+        Fields available in the grid
+        """
+        return list(self._columns)
+
+    @property
+    def aez_ids(self)->List[int]:
+        """
+        Aez id of the grid
+        """
+        return list(self._aez_index)
+
+    def column(self, field_name: str)->np.ndarray:
+        """
+        Get the values of a field for all the tiles (grid order, NaN if null)
+        :param field_name: field name (e.g. 'wwsos_min')
+        """
+        try:
+            return self._columns[field_name]
+        except KeyError as exc:
+            raise KeyError(f"Illegal field requested in GetField(): {field_name}") from exc
+
+    def get_columns(self, tiles_id: Optional[Iterable[str]] = None)->Dict[str, np.ndarray]:
+        """
+        Get the fields values of a list of tiles (all the tiles by default)
+        :param tiles_id: list of s2 tiles
+        """
+        if tiles_id is None:
+            return dict(self._columns)
+        indexes = np.array([self.get_index(tile_id) for tile_id in tiles_id], dtype=np.int64)
+        return {field: values[indexes] for field, values in self._columns.items()}
+
+    def get_field(self, index: int, field_name: str):
+        """
+        Get a field value of a tile (None if the field is null)
+        :param index: tile index in the grid
+        :param field_name: field name (e.g. 'wwsos_min')
+        """
+        value = self.column(field_name)[index]
+        if np.isnan(value):
+            return None
+        if self._kinds.get(field_name) == 'i':
+            return int(value)
+        return float(value)
+
+    def get_geometry(self, index: int):
+        """
+        Get the geometry of a tile (ogr geometry decoded from WKB)
+        :param index: tile index in the grid
+        """
+        if index in self._geometries:
+            return self._geometries[index]
+        wkb = self.get_wkb(index)
+        geometry = None
+        if wkb:
+            from osgeo import ogr
+            geometry = ogr.CreateGeometryFromWkb(wkb)
+        self._geometries[index] = geometry
+        return geometry
+
+    def get_wkb(self, index: int)->bytes:
+        """
+        Get the WKB geometry of a tile
+        :param index: tile index in the grid
+        """
+        if self._wkb_offsets is None:
+            return b''
+        start, end = self._wkb_offsets[index], self._wkb_offsets[index + 1]
+        return bytes(self._wkb_buffer[start:end])
+
+    def get_index(self, tile_id: str)->int:
+        """
+        Get the index of a tile in the grid
+        :param tile_id: tile id (e.g. '31TCJ')
+        """
+        try:
+            return self._tile_index[tile_id]
+        except KeyError as exc:
+            raise KeyError(f"Tile {tile_id} is not in the MGRS/AEZ grid") from exc
+
+    def get_tile(self, tile_id: str)->AezTile:
+        """
+        Get a tile from its id
+        :param tile_id: tile id (e.g. '31TCJ')
+        """
+        return AezTile(self, self.get_index(tile_id))
+
+    def get_first_tile(self, tiles_id: Iterable[str])->AezTile:
+        """
+        Get the first tile (grid order) among a list of tiles
+        :param tiles_id: list of s2 tiles
+        """
+        tiles_id = list(tiles_id)
+        indexes = [self._tile_index[tile_id] for tile_id in tiles_id
+                   if tile_id in self._tile_index]
+        if not indexes:
+            raise ValueError(f"No tile of {tiles_id} in the MGRS/AEZ grid")
+        return AezTile(self, min(indexes))
+
+    def get_aez_tiles(self, aez_id: int)->List[AezTile]:
+        """
+        Get the tiles of an aez (grid order)
+        :param aez_id: aez id (e.g. 46172)
+        """
+        return [AezTile(self, index) for index in self._aez_index.get(int(aez_id), [])]
+
+    def get_aez_id(self, tile_id: str):
+        """
+        Get the aez id (zoneID field) of a tile
+        :param tile_id: tile id (e.g. '31TCJ')
+        """
+        return self.get_tile(tile_id).GetField('zoneID')
+
+    def get_eos_doy_index(self)->Dict[int, List[Tuple[str, float, str]]]:
+        """
+        Get the end of season index: day of year -> [(tile id, aez id, season type)]
+        Tiles are in grid order, a tile appears once per day of year with the
+        first season type (winter, summer1, summer2) ending that day
+        """
+        if self._eos_doy_index is None:
+            eos_columns = [(season_type, self._columns[field].tolist())
+                           for season_type, field in EOS_FIELDS if field in self._columns]
+            eos_doy_index = {}
+            for index, tile_id in enumerate(self.tile_ids):
+                tile_doys = set()
+                for season_type, end_doys in eos_columns:
+                    end_doy = end_doys[index]
+                    # Null or 0 (no season) never match a day of year
+                    if end_doy != end_doy or end_doy < 1 or end_doy in tile_doys:
+                        continue
+                    tile_doys.add(end_doy)
+                    eos_doy_index.setdefault(int(end_doy), []).append(
+                        (tile_id, self.get_field(index, 'zoneID'), season_type))
+            self._eos_doy_index = eos_doy_index
+        return self._eos_doy_index
+
+    def get_eos_triggers(self, doy: int)->List[Tuple[str, float, str]]:
+        """
+        Get the tiles with a season ending on a day of year (grid order)
+        :param doy: day of year
+        """
+        return self.get_eos_doy_index().get(int(doy), [])
+
+def get_catalog_cache_paths(s2tiles_aez_file: str)->Tuple[Path, Path]:
+    """
+    Get the sidecar cache files of the grid (attributes, WKB geometries)
+    :param s2tiles_aez_file: MGRS grid (geojson file)
+    """
+    s2tiles_aez_file = Path(s2tiles_aez_file)
+    return s2tiles_aez_file.with_suffix('.catalog.npz'), \
+        s2tiles_aez_file.with_suffix('.catalog.wkb')
+
+def file_sha256(filepath: str)->str:
+    """
+    Compute the sha256 of a file
+    :param filepath: path to the file
+    """
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def _source_stamp(s2tiles_aez_file: str)->np.ndarray:
+    stat = os.stat(s2tiles_aez_file)
+    return np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+def write_catalog_cache(catalog: AezTileCatalog,
+                        s2tiles_aez_file: str,
+                        sha256: Optional[str] = None)->None:
+    """
+    Write the sidecar cache of the grid next to it
+    :param catalog: catalog loaded from the grid
+    :param s2tiles_aez_file: MGRS grid (geojson file)
+    :param sha256: sha256 of the grid (computed if not provided)
+    """
+    npz_path, wkb_path = get_catalog_cache_paths(s2tiles_aez_file)
+    if sha256 is None:
+        sha256 = file_sha256(s2tiles_aez_file)
+    wkb_offsets = catalog._wkb_offsets
+    if wkb_offsets is None:
+        wkb_offsets = np.zeros(len(catalog) + 1, dtype=np.int64)
+    wkb_tmp = wkb_path.with_name(f'{wkb_path.name}.{os.getpid()}.tmp')
+    with open(wkb_tmp, 'wb') as wkb_file:
+        if catalog._wkb_buffer is not None:
+            wkb_file.write(bytes(catalog._wkb_buffer))
+    os.replace(wkb_tmp, wkb_path)
+    arrays = {f'field_{field}': values for field, values in catalog._columns.items()}
+    npz_tmp = npz_path.with_name(f'{npz_path.name}.{os.getpid()}.tmp')
+    with open(npz_tmp, 'wb') as npz_file:
+        np.savez(npz_file,
+                 version=np.array(CACHE_VERSION),
+                 stamp=_source_stamp(s2tiles_aez_file),
+                 sha256=np.array(sha256),
+                 tile=np.array(catalog.tile_ids, dtype=str),
+                 fields=np.array(list(catalog._columns), dtype=str),
+                 kinds=np.array([catalog._kinds[field] for field in catalog._columns],
+                                dtype=str),
+                 wkb_offsets=wkb_offsets,
+                 **arrays)
+    os.replace(npz_tmp, npz_path)
+    logger.debug("Cache of %s written in %s", s2tiles_aez_file, npz_path)
+
+def read_catalog_cache(s2tiles_aez_file: str)->Optional[AezTileCatalog]:
+    """
+    Read the sidecar cache of the grid, None if it is missing or outdated
+    The cache is valid if the grid mtime/size or its sha256 are unchanged.
+    :param s2tiles_aez_file: MGRS grid (geojson file)
+    """
+    npz_path, wkb_path = get_catalog_cache_paths(s2tiles_aez_file)
+    if not (npz_path.is_file() and wkb_path.is_file()):
+        return None
+    try:
+        with np.load(npz_path) as cache:
+            if int(cache['version']) != CACHE_VERSION:
+                logger.info("Cache of %s has an old layout, rebuild it", s2tiles_aez_file)
+                return None
+            stamp = cache['stamp']
+            if not np.array_equal(stamp, _source_stamp(s2tiles_aez_file)):
+                sha256 = file_sha256(s2tiles_aez_file)
+                if sha256 != str(cache['sha256']):
+                    logger.info("%s has changed, rebuild its cache", s2tiles_aez_file)
+                    return None
+                stamp = None
+            fields = [str(field) for field in cache['fields']]
+            kinds = dict(zip(fields, (str(kind) for kind in cache['kinds'])))
+            columns = {field: cache[f'field_{field}'] for field in fields}
+            tile_ids = cache['tile'].tolist()
+            wkb_offsets = cache['wkb_offsets']
+    except (OSError, ValueError, KeyError) as err:
+        logger.warning("Cannot read the cache of %s: %s", s2tiles_aez_file, err)
+        return None
+    if wkb_path.stat().st_size != wkb_offsets[-1]:
+        logger.info("Geometries cache of %s is incomplete, rebuild it", s2tiles_aez_file)
+        return None
+    wkb_buffer = np.memmap(wkb_path, dtype=np.uint8, mode='r') if wkb_offsets[-1] else b''
+    catalog = AezTileCatalog(tile_ids, columns, kinds, wkb_offsets, wkb_buffer)
+    if stamp is None:
+        # Same content with a new mtime: refresh the stamp to skip the hash next time
+        try:
+            write_catalog_cache(catalog, s2tiles_aez_file, sha256=sha256)
+        except OSError as err:
+            logger.debug("Cannot refresh the cache of %s: %s", s2tiles_aez_file, err)
+    return catalog
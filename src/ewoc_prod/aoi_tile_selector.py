@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+'''
+:author: Marjorie Battude <marjorie.battude@csgroup.eu>
+:organization: CS Group
+:copyright: 2023 CS Group. All rights reserved.
+:license: see LICENSE file
+:created: 2023
+'''
+
+import logging
+from typing import Iterable, List
+
+from shapely import wkb
+
+from ewoc_prod.aez_tile_catalog import AezTileCatalog
+from ewoc_prod.ewoc_work_plan.geometry_tree import GeometryTree
+
+logger = logging.getLogger(__name__)
+
+class AoiTileSelector:
+    """
+    Selection of the tiles of the MGRS/AEZ grid that intersect areas of interest
+    Tile footprints are indexed in a STRtree (bounding box prefilter), then the
+    intersection is tested with the exact geometries.
+    """
+    def __init__(self, aez_catalog: AezTileCatalog)->None:
+        self._catalog = aez_catalog
+        self._indexes = []
+        geometries = []
+        for index in range(len(aez_catalog)):
+            tile_wkb = aez_catalog.get_wkb(index)
+            if tile_wkb:
+                self._indexes.append(index)
+                geometries.append(wkb.loads(tile_wkb))
+        self._tree = GeometryTree(geometries)
+        logger.debug("%s tiles footprints indexed", len(geometries))
+
+    def select(self, aoi_geoms: Iterable, exact: bool = True)->List[str]:
+        """
+        Get the tiles that intersect at least one area of interest
+        Tiles are returned once, in grid order
+        :param aoi_geoms: areas of interest (shapely geometries in the grid spatial reference)
+        :param exact: if False, only the bounding boxes are compared
+        """
+        aoi_geoms = [aoi_geom for aoi_geom in aoi_geoms
+                     if aoi_geom is not None and not aoi_geom.is_empty]
+        selected = self._tree.query_many(aoi_geoms, exact=exact)
+        return [self._catalog.tile_ids[self._indexes[position]]
+                for position in sorted(selected)]
+
+def read_aoi_geometries(user_aoi: str)->List:
+    """
+    Read the geometries of an area of interest file
+    :param user_aoi: area of interest (geojson file)
+    """
+    from osgeo import ogr
+
+    driver = ogr.GetDriverByName('GeoJSON')
+    data_source = driver.Open(user_aoi, 0)
+    if data_source is None:
+        raise ValueError(f"Cannot open the user aoi {user_aoi}")
+    aoi_geoms = []
+    for aoi in data_source.GetLayer():
+        aoi_geom = aoi.GetGeometryRef()
+        if aoi_geom is not None:
+            aoi_geoms.append(wkb.loads(bytes(aoi_geom.ExportToWkb())))
+    data_source = None
+    return aoi_geoms
@@ -25,11 +25,18 @@ from typing import List
 
 import numpy as np
 
-from ewoc_prod.tiles_2_workplan import (extract_s2tiles_list,
-    check_number_of_aez_for_selected_tiles, extract_s2tiles_list_per_aez,
-    get_aez_season_type_from_date, get_tiles_infos_from_tiles,
-        get_tiles_metaseason_infos_from_tiles, ewoc_s3_upload)
-from .ewoc_work_plan.workplan import WorkPlan
+from ewoc_prod.aez_tile_catalog import AezTileCatalog
+from ewoc_prod.season_windows import (get_metaseason_table, read_metaseason_table,
+    write_metaseason_table)
+from ewoc_prod.tiles_2_workplan import (extract_s2tiles_list, group_tiles_by_aez,
+    get_aez_season_type_from_date, get_aez_tiles_infos, read_orbit_file, ewoc_s3_upload)
+from .ewoc_work_plan.engine import AsyncEngine, get_engine, set_engine
+from .ewoc_work_plan.search_cache import SearchCache
+from .ewoc_work_plan.stats import aggregate_stats
+from .ewoc_work_plan.transport import TRANSPORT_MODES, create_transport, set_transport
+from .ewoc_work_plan.utils import (clear_prefetched_prods, get_eodag_providers, get_search_cache,
+    set_eodag_providers, set_search_cache)
+from .ewoc_work_plan.workplan import WorkPlan, prefetch_searches
 
 _logger = logging.getLogger(__name__)
 
@@ -78,6 +85,11 @@ def parse_args(args: List[str])->argparse.Namespace:
                         help="Year of the season to process in the metaseason mode (e.g. 2021 to process 2020/2021)",
                         type=int,
                         default=2021)
+    parser.add_argument('-m_table', "--metaseason_table",
+                        help="Metaseason dates of the tiles (csv file), read if it exists, \
+                            written otherwise",
+                        type=str,
+                        default=None)
     parser.add_argument('-season', "--season_type",
                         help="Season type (winter, summer1, summer2)",
                         type=str,
@@ -119,6 +131,75 @@ def parse_args(args: List[str])->argparse.Namespace:
     parser.add_argument('-rm_l1c', "--remove_l1c",
                         help="Remove L1C products or not",
                         action='store_true')
+    parser.add_argument('-wp_workers', "--wp_max_workers",
+                        help="Number of products identifications running at the same time \
+                            for each tile workplan",
+                        type=int,
+                        default=1)
+    parser.add_argument('-eodag_min', "--eodag_used_providers_only",
+                        help="Load only the eodag providers used by the workplans",
+                        action='store_true')
+    parser.add_argument('-cache', "--search_cache",
+                        help="Cache of the catalogue searches (sqlite file), \
+                            reused by the next runs",
+                        type=str,
+                        default=None)
+    parser.add_argument('-cache_ttl', "--search_cache_ttl",
+                        help="Time to live of the cached searches in hours",
+                        type=float,
+                        default=168)
+    parser.add_argument('-cache_size', "--search_cache_size",
+                        help="Maximum size of the cache in MB",
+                        type=int,
+                        default=512)
+    parser.add_argument('-cache_refresh', "--search_cache_refresh",
+                        help="Run the searches again and refresh the cache",
+                        action='store_true')
+    parser.add_argument('-batch', "--batch_search",
+                        help="Search the products once per cluster of tiles \
+                            instead of once per tile",
+                        action='store_true')
+    parser.add_argument('-batch_cell', "--batch_cell_size",
+                        help="Size of the clusters of tiles in degrees",
+                        type=float,
+                        default=5.0)
+    parser.add_argument('-transport', "--transport_mode",
+                        help="Access to the providers: live, record (responses saved \
+                            to the archive) or replay (responses read from the archive, \
+                            no network access)",
+                        type=str,
+                        choices=TRANSPORT_MODES,
+                        default="live")
+    parser.add_argument('-archive', "--transport_archive",
+                        help="Archive of the providers responses (sqlite file) \
+                            for the record and replay modes",
+                        type=str,
+                        default=None)
+    parser.add_argument('-engine', "--async_engine",
+                        help="Run the remote calls of all the tiles (searches, bucket checks, \
+                            manifests) in one asyncio engine, with a limit per provider",
+                        action='store_true')
+    parser.add_argument('-engine_threads', "--engine_max_threads",
+                        help="Number of threads of the engine for the blocking calls",
+                        type=int,
+                        default=64)
+    parser.add_argument('-engine_limit', "--engine_provider_limit",
+                        help="Maximum number of calls in flight per S3 bucket",
+                        type=int,
+                        default=32)
+    parser.add_argument('-s2_fan_out', "--s2_fan_out",
+                        help="Search all the S2 providers of a tile at once instead of \
+                            one after the other",
+                        action='store_true')
+    parser.add_argument('-s2_timeout', "--s2_provider_timeout",
+                        help="Maximum time of the S2 search of a provider for a tile in \
+                            seconds, the provider is skipped after it",
+                        type=float,
+                        default=None)
+    parser.add_argument('-stats', "--wp_stats",
+                        help="Add the stats of each tile to the workplans (time, remote calls \
+                            and discarded products per sensor) and write the stats of the AEZ",
+                        action='store_true')
     parser.add_argument('-o', "--output_path",
                         help="Output path for json files",
                         type=str)
@@ -229,8 +310,32 @@ def main(args: List[str])->None:
         if all(arg is None for arg in (args.tile_id, args.aez_id, args.user_aoi, args.user_tiles, args.user_list_tiles)):
             raise ValueError("The metaseason mode requires -t, -aid, -aoi, -ut or -ult inputs and is not compatible with -pd input")
 
+    if args.eodag_used_providers_only:
+        eodag_providers = get_eodag_providers(args.s1_data_provider, args.s2_data_provider)
+        _logger.info("eodag providers = %s", eodag_providers)
+        set_eodag_providers(eodag_providers)
+
+    transport = create_transport(args.transport_mode, args.transport_archive)
+    set_transport(transport)
+    if args.transport_mode != "live":
+        _logger.info("Providers responses %s with %s", args.transport_mode,
+                     args.transport_archive)
+
+    if args.async_engine:
+        set_engine(AsyncEngine(max_threads=args.engine_max_threads,
+                               default_limit=args.engine_provider_limit))
+
+    if args.search_cache:
+        set_search_cache(SearchCache(args.search_cache,
+                                     ttl=args.search_cache_ttl * 3600,
+                                     max_size=args.search_cache_size * 1024**2,
+                                     refresh=args.search_cache_refresh))
+
+    #Load the MGRS/AEZ grid once
+    aez_catalog = AezTileCatalog.from_file(args.s2tiles_aez_file)
+
     #Extract list of s2 tiles
-    s2tiles_list = extract_s2tiles_list(args.s2tiles_aez_file,
+    s2tiles_list = extract_s2tiles_list(aez_catalog,
                                         args.tile_id,
                                         args.aez_id,
                                         args.user_aoi,
@@ -243,27 +348,44 @@ def main(args: List[str])->None:
         _logger.info("No tile found")
         sys.exit(0)
 
-    #Check number of AEZ
-    aez_list = check_number_of_aez_for_selected_tiles(args.s2tiles_aez_file, s2tiles_list)
-    _logger.debug("AEZ = %s", aez_list)
+    #Get metaseason dates of all the tiles at once
+    metaseason_table = None
+    if args.metaseason:
+        if args.metaseason_table and pa.isfile(args.metaseason_table):
+            metaseason_table = read_metaseason_table(args.metaseason_table)
+        else:
+            metaseason_table = get_metaseason_table(aez_catalog,
+                                                    [args.metaseason_year],
+                                                    s2tiles_list)
+            if args.metaseason_table:
+                write_metaseason_table(metaseason_table, args.metaseason_table)
+
+    #Get s1 orbit directions
+    orbit_dirs = read_orbit_file(args.orbit_file)
+
+    #Group tiles by AEZ
+    tiles_per_aez = group_tiles_by_aez(aez_catalog, s2tiles_list)
+    _logger.debug("AEZ = %s", list(tiles_per_aez))
+    unknown_tiles = [tile for tile in s2tiles_list if tile not in aez_catalog]
+    if unknown_tiles:
+        _logger.warning("Tiles not in the MGRS/AEZ grid: %s", unknown_tiles)
 
     #Get tiles info for each AEZ
-    for aez_id in aez_list:
+    for aez_id, aez_tiles in tiles_per_aez.items():
         _logger.debug("Current AEZ = %s", aez_id)
-        aez_id = str(int(aez_id)) #Remove .0
+        aez_id = str(aez_id)
 
         #Create output folder
         json_path = pa.join(args.output_path, aez_id, 'json')
         if not pa.exists(json_path):
             os.makedirs(json_path)
 
-        #Extract list of s2 tiles for the aez
-        if len(aez_list) == 1:
-            s2tiles_list_subset = s2tiles_list
+        #Extract list of s2 tiles for the aez (tiles not in the grid are ignored)
+        if len(tiles_per_aez) == 1:
+            aez_tiles_set = set(aez_tiles)
+            s2tiles_list_subset = [tile for tile in s2tiles_list if tile in aez_tiles_set]
         else:
-            s2tiles_list_subset = extract_s2tiles_list_per_aez(args.s2tiles_aez_file,
-                                                               s2tiles_list,
-                                                               aez_id)
+            s2tiles_list_subset = aez_tiles
 
         #Get season_type info
         if args.metaseason:
@@ -278,7 +400,7 @@ def main(args: List[str])->None:
                 if args.season_type:
                     _logger.info("Argument season_type is not used, \
                         value retrieved from the date provided")
-                season_type = get_aez_season_type_from_date(args.s2tiles_aez_file,
+                season_type = get_aez_season_type_from_date(aez_catalog,
                                                             aez_id,
                                                             args.prod_start_date)
             elif not args.season_type:
@@ -286,11 +408,49 @@ def main(args: List[str])->None:
             else:
                 season_type = args.season_type
 
+        #Get tiles info once for the AEZ
+        tiles_to_do = [tile for tile in s2tiles_list_subset
+                       if not glob.glob(pa.join(json_path, f'{aez_id}_{tile}_*.json'))]
+        tiles_infos = get_aez_tiles_infos(aez_catalog,
+                                          tiles_to_do,
+                                          season_type,
+                                          args.prod_start_date,
+                                          metaseason=args.metaseason,
+                                          metaseason_year=args.metaseason_year,
+                                          metaseason_table=metaseason_table,
+                                          orbit_dirs=orbit_dirs)
+
+        #Search the products once per cluster of tiles with the same dates
+        if args.batch_search:
+            tiles_per_dates = defaultdict(list)
+            for tile in tiles_to_do:
+                tile_infos = tiles_infos.get(tile)
+                if tile_infos is not None and tile_infos.wp_processing_start is not None:
+                    tiles_per_dates[(tile_infos.wp_processing_start,
+                                     tile_infos.wp_processing_end)].append(tile)
+            for (wp_processing_start, wp_processing_end), tiles in tiles_per_dates.items():
+                try:
+                    prefetch_searches(tiles,
+                                      str(wp_processing_start),
+                                      str(wp_processing_end),
+                                      args.s1_data_provider,
+                                      args.s2_data_provider,
+                                      args.s2_strategy,
+                                      eodag_config_filepath=f"{os.getenv('HOME')}/.config/eodag/eodag.yml",
+                                      cloudcover=args.cloudcover,
+                                      only_s2=args.extract_only_s2,
+                                      only_s1=args.extract_only_s1,
+                                      only_l8=args.extract_only_l8,
+                                      cell_size=args.batch_cell_size)
+                except Exception as exception:
+                    _logger.warning("Batch search failed, tiles are searched one by one: %s",
+                                    exception)
+
         #Create one WP per tile in parallel
         def process_tile(tile,
                          aez_id,
                          json_path,
-                         s2tiles_aez_file,
+                         tile_infos,
                          s1_data_provider,
                          s2_data_provider,
                          s2_strategy,
@@ -298,38 +458,32 @@ def main(args: List[str])->None:
                          visibility,
                          cloudcover,
                          min_nb_prods,
-                         orbit_file,
                          remove_l1c,
                          extract_only_s2,
                          extract_only_s1,
                          extract_only_l8,
-                         prod_start_date,
                          metaseason,
-                         metaseason_year,
-                         season_type,
                          user_short,
-                         date_now):
+                         date_now,
+                         wp_max_workers,
+                         wp_stats,
+                         s2_fan_out,
+                         s2_provider_timeout):
 
             error_tiles = []
             if glob.glob(pa.join(json_path, f'{aez_id}_{tile}_*.json')):
                 pass
+            elif tile_infos is None:
+                _logger.error("No tile info for %s", tile)
+                error_tiles.append([tile, ValueError(f"No tile info for {tile}")])
             else:
                 tile_lst = [tile]
 
                 #Get tile info
-                if metaseason:
-                    season_type, season_start, season_end, \
-                    season_processing_start, season_processing_end, \
-                    annual_processing_start, annual_processing_end, wp_processing_start, \
-                    wp_processing_end, l8_enable_sr, enable_sw, detector_set = \
-                    get_tiles_metaseason_infos_from_tiles(s2tiles_aez_file, \
-                    tile_lst, year=metaseason_year)
-                else:
-                    season_start, season_end, season_processing_start, season_processing_end, \
-                    annual_processing_start, annual_processing_end, wp_processing_start, \
-                    wp_processing_end, l8_enable_sr, enable_sw, detector_set = \
-                    get_tiles_infos_from_tiles(s2tiles_aez_file, \
-                    tile_lst, season_type, prod_start_date)
+                season_type, season_start, season_end, \
+                season_processing_start, season_processing_end, \
+                annual_processing_start, annual_processing_end, wp_processing_start, \
+                wp_processing_end, l8_enable_sr, enable_sw, detector_set, orbit_dir = tile_infos
 
                 meta_dict = {"season_start": str(season_start),
                             "season_end": str(season_end),
@@ -338,16 +492,8 @@ def main(args: List[str])->None:
                             "annual_processing_start": str(annual_processing_start),
                             "annual_processing_end": str(annual_processing_end)}
 
-		        #Get s1 orbit direction
-                orbit_dir = None
-                if orbit_file:
-                    with open(orbit_file, "r", encoding='utf8') as csv_file:
-                        reader = csv.reader(csv_file, delimiter=';')
-                        headers = next(reader)
-                        for row in reader:
-                            if row[0] == tile:
-                                orbit_dir = row[1]
-                                _logger.info("Force orbit direction to %s for tile %s", orbit_dir, tile)
+                if orbit_dir is not None:
+                    _logger.info("Force orbit direction to %s for tile %s", orbit_dir, tile)
 
                 #Print tile info
                 _logger.info("aez_id = %s", aez_id)
@@ -399,6 +545,10 @@ def main(args: List[str])->None:
                                         only_s2=extract_only_s2,
                                         only_s1=extract_only_s1,
                                         only_l8=extract_only_l8,
+                                        max_workers=wp_max_workers,
+                                        stats=wp_stats,
+                                        s2_fan_out=s2_fan_out,
+                                        s2_provider_timeout=s2_provider_timeout,
                                         )
 
                     #Export tile wp to json file
@@ -421,7 +571,7 @@ def main(args: List[str])->None:
                             zip(s2tiles_list_subset,
                             repeat(aez_id),
                             repeat(json_path),
-                            repeat(args.s2tiles_aez_file),
+                            [tiles_infos.get(tile) for tile in s2tiles_list_subset],
                             repeat(args.s1_data_provider),
                             repeat(args.s2_data_provider),
                             repeat(args.s2_strategy),
@@ -429,18 +579,19 @@ def main(args: List[str])->None:
                             repeat(args.visibility),
                             repeat(args.cloudcover),
                             repeat(args.min_nb_prods),
-                            repeat(args.orbit_file),
                             repeat(args.remove_l1c),
                             repeat(args.extract_only_s2),
                             repeat(args.extract_only_s1),
                             repeat(args.extract_only_l8),
-                            repeat(args.prod_start_date),
                             repeat(args.metaseason),
-                            repeat(args.metaseason_year),
-                            repeat(season_type),
                             repeat(user_short),
-                            repeat(date_now)),
+                            repeat(date_now),
+                            repeat(args.wp_max_workers),
+                            repeat(args.wp_stats),
+                            repeat(args.s2_fan_out),
+                            repeat(args.s2_provider_timeout)),
                             chunksize = 20)
+        clear_prefetched_prods()
 
         #Merge all tiles wp to AEZ wp
         list_files_aez = glob.glob(pa.join(json_path, f'{aez_id}*.json'))
@@ -469,6 +620,19 @@ def main(args: List[str])->None:
             nb_tiles_error = 0
         _logger.info("Number of tiles with error = %s", str(nb_tiles_error))
 
+        if args.wp_stats:
+            tile_plans = []
+            for file_aez in list_files_aez:
+                with open(file_aez, encoding="utf-8") as json_file:
+                    tile_plans.extend(json.load(json_file)["tiles"])
+            aez_stats = aggregate_stats(tile_plans)
+            for sensor, sensor_stats in aez_stats["sensors"].items():
+                _logger.info("%s stats = %s", sensor, sensor_stats)
+            _logger.info("Slowest tiles = %s", aez_stats["slowest_tiles"])
+            stats_file = pa.join(args.output_path, f'wp_stats_{aez_id}.json')
+            with open(stats_file, "w", encoding="utf-8") as outfile:
+                json.dump(aez_stats, outfile, indent=4)
+
         if nb_tiles_processed == (len(s2tiles_list_subset)-nb_tiles_error):
             _logger.info('All the tiles are processed (%s tiles with error)', str(nb_tiles_error))
             wp_for_aez = pa.join(args.output_path, aez_id, f'{aez_id}_{user_short}_{date_now}.json')
@@ -504,6 +668,16 @@ def main(args: List[str])->None:
             _logger.info('Need to process %s missing tiles among %s tiles before merging to AEZ', \
                 (len(s2tiles_list_subset) - nb_tiles_processed), len(s2tiles_list_subset))
 
+    if get_search_cache() is not None:
+        _logger.info("Search cache = %s", get_search_cache().stats())
+    if args.transport_mode != "live":
+        _logger.info("Number of providers responses %s = %s",
+                     args.transport_mode, transport.nb_calls)
+
+    if args.async_engine:
+        get_engine().close()
+        set_engine(None)
+
     _logger.info("END of the Process")
     _logger.info("--- Total time : %s seconds ---", (time.time() - start_time))
 
@@ -0,0 +1,211 @@
+import logging
+import os
+import threading
+
+from .engine import get_limit, run_blocking
+from .stats import count_call
+from .transport import get_transport
+
+logger = logging.getLogger(__name__)
+
+# A year of a tile is listed at once when its products are in at least this
+# number of months, each month is listed otherwise
+MIN_MONTHS_YEAR_LISTING = 4
+# Number of components of the year prefix of a tile: tiles/31/T/CJ/2021/ or
+# sentinel-s2-l2a-cogs/31/T/CJ/2021/ (the month prefix has one more)
+YEAR_PREFIX_DEPTH = 5
+# Number of threads checking the products of a tile (without the engine)
+CHECK_MAX_WORKERS = 16
+S3_BUCKET_REGIONS = {
+    "sentinel-s1-l1c": "eu-central-1",
+    "sentinel-s2-l1c": "eu-central-1",
+    "sentinel-s2-l2a": "eu-central-1",
+    "sentinel-cogs": "us-west-2",
+    "usgs-landsat": "us-west-2",
+}
+
+_s3_clients = {}
+_s3_clients_lock = threading.Lock()
+
+
+def get_s3_client(bucket_name, max_pool_connections=CHECK_MAX_WORKERS):
+    """
+    Get the S3 client of a bucket, shared by all the requests of the process
+    (boto3 clients are thread safe, creating one takes about 0.2 s)
+    :param bucket_name: bucket (e.g. sentinel-s2-l2a, sentinel-cogs, usgs-landsat)
+    :param max_pool_connections: size of the connection pool of the client, the
+        number of concurrent requests (10 connections by default in boto3)
+    """
+    import boto3
+    from botocore.config import Config
+
+    key = (bucket_name, max_pool_connections)
+    with _s3_clients_lock:
+        if key not in _s3_clients:
+            _s3_clients[key] = boto3.Session(
+                aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
+                aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
+                region_name=S3_BUCKET_REGIONS.get(bucket_name, "eu-central-1"),
+            ).client("s3", config=Config(max_pool_connections=max_pool_connections))
+        return _s3_clients[key]
+
+
+def get_listing_prefixes(prd_prefixes, min_months=MIN_MONTHS_YEAR_LISTING):
+    """
+    Get the prefixes to list to know the objects of S2 products of a tile
+    :param prd_prefixes: product prefixes (tiles/31/T/CJ/2021/1/5/0/ or
+        sentinel-s2-l2a-cogs/31/T/CJ/2021/1/S2A_31TCJ_20210105_0_L2A/)
+    :param min_months: minimum number of months of a year to list the whole year
+    :return: dictionary of listing prefix (year or month) and its product prefixes
+    """
+    months_per_year = {}
+    for prd_prefix in prd_prefixes:
+        components = prd_prefix.split("/")
+        year_prefix = "/".join(components[:YEAR_PREFIX_DEPTH]) + "/"
+        month_prefix = "/".join(components[: YEAR_PREFIX_DEPTH + 1]) + "/"
+        months_per_year.setdefault(year_prefix, {}).setdefault(month_prefix, []).append(
+            prd_prefix
+        )
+    listing_prefixes = {}
+    for year_prefix, months in months_per_year.items():
+        if len(months) >= min_months:
+            listing_prefixes[year_prefix] = [
+                prd_prefix for month_prd_prefixes in months.values()
+                for prd_prefix in month_prd_prefixes
+            ]
+        else:
+            listing_prefixes.update(months)
+    return listing_prefixes
+
+
+def list_objects_counts(s3_client, bucket_name, listing_prefix, depth, request_payer=False):
+    """
+    List the objects of a prefix of an S3 bucket and count them per product
+    :param s3_client: boto3 S3 client
+    :param bucket_name: bucket (sentinel-s2-l2a, sentinel-cogs)
+    :param listing_prefix: prefix listed (all the pages)
+    :param depth: number of components of the product prefixes
+    :param request_payer: requester pays bucket
+    :return: dictionary of product prefix and number of objects
+    """
+    kwargs = {"Bucket": bucket_name, "Prefix": listing_prefix}
+    if request_payer:
+        kwargs["RequestPayer"] = "requester"
+    counts = {}
+    for page in s3_client.get_paginator("list_objects_v2").paginate(**kwargs):
+        count_call("s3_list_page")
+        for s3_object in page.get("Contents", []):
+            prd_prefix = "/".join(s3_object["Key"].split("/")[:depth]) + "/"
+            counts[prd_prefix] = counts.get(prd_prefix, 0) + 1
+    return counts
+
+
+def list_keys(s3_client, bucket_name, listing_prefix, suffix="", request_payer=False):
+    """
+    List the keys of the objects of a prefix of an S3 bucket
+    :param s3_client: boto3 S3 client
+    :param bucket_name: bucket (sentinel-s2-l2a, sentinel-cogs)
+    :param listing_prefix: prefix listed (all the pages)
+    :param suffix: suffix of the keys kept (e.g. "tileInfo.json")
+    :param request_payer: requester pays bucket
+    :return: list of keys
+    """
+    kwargs = {"Bucket": bucket_name, "Prefix": listing_prefix}
+    if request_payer:
+        kwargs["RequestPayer"] = "requester"
+    keys = []
+    for page in s3_client.get_paginator("list_objects_v2").paginate(**kwargs):
+        count_call("s3_list_page")
+        keys.extend(
+            s3_object["Key"]
+            for s3_object in page.get("Contents", [])
+            if s3_object["Key"].endswith(suffix)
+        )
+    return keys
+
+
+def check_product(s3_client, bucket_name, prd_prefix, threshold=1, request_payer=False):
+    """
+    Check that a product of an S3 bucket has at least threshold objects
+    (one page of threshold objects at most, as bucket._check_product)
+    :param s3_client: boto3 S3 client
+    :param bucket_name: bucket (sentinel-s2-l2a, sentinel-cogs)
+    :param prd_prefix: product prefix
+    :param threshold: minimum number of objects of the product
+    :param request_payer: requester pays bucket
+    """
+    kwargs = {"Bucket": bucket_name, "Prefix": prd_prefix, "MaxKeys": threshold}
+    if request_payer:
+        kwargs["RequestPayer"] = "requester"
+    count_call("s3_list_page")
+    return s3_client.list_objects_v2(**kwargs).get("KeyCount", 0) >= threshold
+
+
+def check_products(
+    bucket_name, kind, prd_prefixes, threshold=1, request_payer=False,
+    min_months=MIN_MONTHS_YEAR_LISTING, max_workers=CHECK_MAX_WORKERS
+):
+    """
+    Check the S2 products of a tile in an S3 bucket with one listing per year or
+    month instead of one check per product: a product is available when it has at
+    least threshold objects (as bucket._check_product)
+    The products alone in their month are still checked one by one (one request
+    instead of the pages of the month). The listings and the checks run
+    concurrently, with the engine or in a pool of max_workers threads, and share
+    one S3 client with a connection pool of this size.
+    :param bucket_name: bucket (sentinel-s2-l2a, sentinel-cogs)
+    :param kind: kind of the checks for the transport ({kind}_listing for the
+        listings, e.g. "s2_l2a_bucket" and "s2_l2a_bucket_listing")
+    :param prd_prefixes: product prefixes (same tile, same depth)
+    :param threshold: minimum number of objects of a product
+    :param request_payer: requester pays bucket
+    :param min_months: minimum number of months of a year to list the whole year
+    :param max_workers: number of threads running the requests without the engine
+    :return: list of booleans, in the order of the product prefixes
+    """
+    if not prd_prefixes:
+        return []
+    depth = len(prd_prefixes[0].rstrip("/").split("/"))
+    listing_prefixes = get_listing_prefixes(prd_prefixes, min_months=min_months)
+    pool_size = get_limit(bucket_name, max_workers)
+
+    def list_prefix(listing_prefix):
+        return get_transport().call(
+            f"{kind}_listing",
+            listing_prefix,
+            lambda: list_objects_counts(
+                get_s3_client(bucket_name, pool_size),
+                bucket_name,
+                listing_prefix,
+                depth,
+                request_payer,
+            ),
+        )
+
+    def check_prefix(prd_prefix):
+        found = get_transport().call(
+            kind,
+            prd_prefix,
+            lambda: check_product(
+                get_s3_client(bucket_name, pool_size),
+                bucket_name,
+                prd_prefix,
+                threshold,
+                request_payer,
+            ),
+        )
+        return {prd_prefix: threshold if found else 0}
+
+    funcs = []
+    for listing_prefix, listed_prd_prefixes in listing_prefixes.items():
+        if len(listed_prd_prefixes) == 1:
+            funcs.append(lambda prefix=listed_prd_prefixes[0]: check_prefix(prefix))
+        else:
+            funcs.append(lambda prefix=listing_prefix: list_prefix(prefix))
+    counts = {}
+    for prefix_counts in run_blocking(bucket_name, funcs, max_workers=max_workers):
+        counts.update(prefix_counts)
+    logger.debug(
+        "%s products checked with %s requests", len(prd_prefixes), len(funcs)
+    )
+    return [counts.get(prd_prefix, 0) >= threshold for prd_prefix in prd_prefixes]
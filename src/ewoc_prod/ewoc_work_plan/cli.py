@@ -5,7 +5,6 @@ import click
 
 from ewoc_prod import __version__
 from .utils import set_logger, MutuallyExclusiveOption
-from .workplan import WorkPlan
 
 __author__ = "Mathis Germa"
 __copyright__ = "CS Group France"
@@ -102,6 +101,8 @@ def generate(
     :param only_s1: extract only S1 products
     :param only_l8: extract only L8 products
     """
+    from .workplan import WorkPlan
+
     ctx.ensure_object(dict)
 
     if "." in input_data:
@@ -209,6 +210,8 @@ def load(ctx, file):
     """
     Load the workplan
     """
+    from .workplan import WorkPlan
+
     ctx.ensure_object(dict)
     ctx.obj["wp"] = WorkPlan.load(Path(file))
 
@@ -256,6 +259,29 @@ def reproc(ctx, bucket, path):
     ctx.obj["wp"] = ctx.obj["wp"].reproc(bucket, path)
 
 
+@click.command()
+@click.pass_context
+@click.option(
+    "-wp_processing_end", help="New workplan processing end date, format YYYY-mm-dd"
+)
+@click.option("-strategy", help="Fusion strategy (L2A,L1C)", multiple=True)
+@click.option(
+    "-eodag_config_filepath", default=None, help="Path to the Eodag yml config file"
+)
+@click.option("-cloudcover", default=90, help="Cloudcover parameter")
+def extend(ctx, wp_processing_end, strategy, eodag_config_filepath, cloudcover):
+    """
+    Extend the workplan to a later processing end date, only the new dates are searched
+    """
+    check_wp(ctx)
+    ctx.obj["wp"] = ctx.obj["wp"].extend(
+        wp_processing_end,
+        strategy=list(strategy),
+        eodag_config_filepath=eodag_config_filepath,
+        cloudcover=cloudcover,
+    )
+
+
 @click.group(chain=True)
 @click.version_option(__version__)
 @click.option(
@@ -272,5 +298,8 @@ run.add_command(generate)
 run.add_command(load)
 run.add_command(write)
 run.add_command(reproc)
+run.add_command(extend)
 run.add_command(display)
-run(obj={})
+
+if __name__ == "__main__":
+    run(obj={})
@@ -0,0 +1,164 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import logging
+import threading
+
+from .stats import attach_stats, current_stats
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of requests in flight per catalogue, the S3 buckets use the
+# default limit of the engine
+PROVIDER_LIMITS = {
+    "creodias": 8,
+    "earth_search": 16,
+    "astraea_eod": 8,
+    "usgs_satapi_aws": 8,
+}
+
+
+class AsyncEngine:
+    """
+    Engine running the remote calls of the workplans (catalogue searches, S3
+    bucket checks, manifests) as coroutines of one event loop, shared by all the
+    tiles of the process
+    The number of calls in flight is limited per provider (catalogue or bucket)
+    with semaphores. eodag and boto3 are blocking, their calls run in one thread
+    pool of the engine instead of the threads of each tile.
+    Synchronous code (WorkPlan) uses run or run_blocking, from any thread.
+    """
+
+    def __init__(self, max_threads=64, default_limit=32, limits=None):
+        """
+        :param max_threads: Number of threads running the blocking calls
+        :param default_limit: Maximum number of calls in flight for a provider
+            missing from limits
+        :param limits: Maximum number of calls in flight per provider
+            (PROVIDER_LIMITS by default)
+        """
+        self.max_threads = max_threads
+        self.default_limit = default_limit
+        self.limits = dict(PROVIDER_LIMITS if limits is None else limits)
+        self._semaphores = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_threads, thread_name_prefix="ewoc_engine"
+        )
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="ewoc_engine_loop", daemon=True
+        )
+        self._thread.start()
+        logger.debug("Engine started with %s threads", max_threads)
+
+    def _semaphore(self, provider):
+        # Only called in the loop thread
+        if provider not in self._semaphores:
+            self._semaphores[provider] = asyncio.Semaphore(
+                self.limits.get(provider, self.default_limit)
+            )
+        return self._semaphores[provider]
+
+    async def call(self, provider, func, stats=None):
+        """
+        Run a blocking remote call
+        :param provider: Provider of the call (eodag provider or bucket)
+        :param func: Function doing the call (through the transport)
+        :param stats: Stats where the call is counted
+        """
+
+        def request():
+            with attach_stats(stats):
+                return func()
+
+        async with self._semaphore(provider):
+            return await self._loop.run_in_executor(self._executor, request)
+
+    async def gather(self, provider, funcs, stats=None):
+        """
+        Run blocking remote calls of a provider concurrently
+        :param provider: Provider of the calls
+        :param funcs: Functions doing the calls
+        :return: list of responses, in the order of the functions
+        """
+        return await asyncio.gather(*(self.call(provider, func, stats) for func in funcs))
+
+    def run(self, coroutine):
+        """
+        Run a coroutine in the loop of the engine and wait for its result
+        Must not be called from the loop or the threads of the engine
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def run_blocking(self, provider, funcs):
+        """
+        Synchronous facade of gather, the calls are counted in the stats of the
+        current thread
+        """
+        return self.run(self.gather(provider, funcs, stats=current_stats()))
+
+    def close(self):
+        """
+        Stop the loop and the threads of the engine
+        """
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._executor.shutdown(wait=True)
+
+
+_engine = None
+
+
+def get_engine():
+    """
+    Get the engine of the remote calls (None if the calls are done in the calling thread)
+    """
+    return _engine
+
+
+def set_engine(engine):
+    """
+    Set the engine of the remote calls
+    :param engine: AsyncEngine or None to do the calls in the calling thread
+    """
+    global _engine
+    _engine = engine
+
+
+def get_limit(provider, max_workers=1):
+    """
+    Get the maximum number of calls of a provider in flight (e.g. to size the
+    connection pool of a client shared by the calls)
+    :param provider: Provider of the calls (eodag provider or bucket)
+    :param max_workers: Number of threads running the calls without the engine
+    """
+    if _engine is None:
+        return max_workers
+    return _engine.limits.get(provider, _engine.default_limit)
+
+
+def _attached(stats, func):
+    with attach_stats(stats):
+        return func()
+
+
+def run_blocking(provider, funcs, max_workers=1):
+    """
+    Run blocking remote calls, concurrently with the engine if it is set,
+    in a pool of max_workers threads otherwise
+    :param provider: Provider of the calls (eodag provider or bucket)
+    :param funcs: Functions doing the calls
+    :param max_workers: Number of threads running the calls without the engine
+        (one after the other in the calling thread by default)
+    :return: list of responses, in the order of the functions
+    """
+    funcs = list(funcs)
+    if _engine is None or not funcs:
+        if max_workers <= 1 or len(funcs) <= 1:
+            return [func() for func in funcs]
+        with ThreadPoolExecutor(
+            max_workers=min(max_workers, len(funcs)), thread_name_prefix=provider
+        ) as executor:
+            return list(executor.map(partial(_attached, current_stats()), funcs))
+    return _engine.run_blocking(provider, funcs)
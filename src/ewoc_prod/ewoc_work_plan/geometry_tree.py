@@ -0,0 +1,69 @@
+import shapely
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+
+# shapely >= 2.0: STRtree.query returns indices and accepts a predicate
+SHAPELY_2 = int(shapely.__version__.split(".")[0]) >= 2
+
+
+class GeometryTree:
+    """
+    STRtree of geometries queried by position, with shapely 1.8 (the query
+    returns the geometries) or shapely 2 (the query returns their positions)
+    """
+
+    def __init__(self, geometries):
+        """
+        :param geometries: shapely geometries
+        """
+        self.geometries = list(geometries)
+        self._tree = STRtree(self.geometries)
+        if not SHAPELY_2:
+            self._tree_index = {id(geometry): i for i, geometry in enumerate(self.geometries)}
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def query(self, geometry, exact=True):
+        """
+        Get the positions of the geometries that intersect a geometry
+        :param geometry: shapely geometry
+        :param exact: if False, only the bounding boxes are compared
+        :return: list of positions (not sorted)
+        """
+        if SHAPELY_2:
+            predicate = "intersects" if exact else None
+            return self._tree.query(geometry, predicate=predicate).tolist()
+        positions = [self._tree_index[id(candidate)] for candidate in self._tree.query(geometry)]
+        if exact and positions:
+            prepared_geometry = prep(geometry)
+            positions = [
+                position
+                for position in positions
+                if prepared_geometry.intersects(self.geometries[position])
+            ]
+        return positions
+
+    def query_many(self, geometries, exact=True):
+        """
+        Get the positions of the geometries that intersect at least one geometry
+        :param geometries: shapely geometries
+        :param exact: if False, only the bounding boxes are compared
+        :return: set of positions
+        """
+        geometries = list(geometries)
+        if not geometries:
+            return set()
+        if SHAPELY_2:
+            import numpy as np
+
+            predicate = "intersects" if exact else None
+            return set(
+                self._tree.query(np.array(geometries, dtype=object), predicate=predicate)[
+                    1
+                ].tolist()
+            )
+        positions = set()
+        for geometry in geometries:
+            positions.update(self.query(geometry, exact=exact))
+        return positions
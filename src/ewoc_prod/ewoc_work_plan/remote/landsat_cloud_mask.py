@@ -1,4 +1,6 @@
-import boto3
+from ..bucket_listing import CHECK_MAX_WORKERS, get_s3_client
+from ..engine import get_limit
+from ..transport import get_transport
 
 
 class Landsat_Cloud_Mask:
@@ -52,41 +54,53 @@ class Landsat_Cloud_Mask:
                 self.bucket = "usgs-landsat"
             if self.prefix is None:
                 self.prefix = "collection02/level-2/standard/oli-tirs/"
-            s3 = boto3.client("s3")
-            file_keys = []
-            year = self.date[:4]
-            prod_dir = f"{year}/{self.path}/{self.row}/"
-            response = s3.list_objects_v2(
-                Bucket=self.bucket,
-                Prefix=self.prefix + prod_dir,
-                MaxKeys=1000,
-                RequestPayer=self.payer,
-                Delimiter="/",
+            self.exists, self.cloud_key, self.tirs_10_key = get_transport().call(
+                "landsat_cloud_mask",
+                f"{self.bucket}/{self.prefix}{self.path}/{self.row}/{self.date}",
+                self._find_aws_mask,
             )
-            resp = response["CommonPrefixes"]
-            for prefix in resp:
-                file_keys.append(prefix["Prefix"])
-            cloud_mask = [
-                file
-                for file in file_keys
-                if self.date in file.split("/")[7].split("_")[3]
-            ]
-            if len(cloud_mask) > 0:
-                self.cloud_key = (
-                    cloud_mask[0] + cloud_mask[0].split("/")[7] + "_SR_QA_AEROSOL.TIF"
-                )
-                self.tirs_10_key = (
-                    cloud_mask[0] + cloud_mask[0].split("/")[7] + "_ST_B10.TIF"
-                )
-                self.exists = True
-                return True
-            else:
-                return False
+            return self.exists
         else:
             # TODO add more providers or local folders
             # returns false for now
             return False
 
+    def _find_aws_mask(self):
+        """
+        Find the cloud mask in the AWS bucket
+        :return: mask found, cloud mask key and thermal band key
+        :rtype: tuple
+        """
+        # One client shared by all the threads, sized to the checks in flight
+        s3 = get_s3_client(self.bucket, get_limit(self.bucket, CHECK_MAX_WORKERS))
+        file_keys = []
+        year = self.date[:4]
+        prod_dir = f"{year}/{self.path}/{self.row}/"
+        response = s3.list_objects_v2(
+            Bucket=self.bucket,
+            Prefix=self.prefix + prod_dir,
+            MaxKeys=1000,
+            RequestPayer=self.payer,
+            Delimiter="/",
+        )
+        resp = response["CommonPrefixes"]
+        for prefix in resp:
+            file_keys.append(prefix["Prefix"])
+        cloud_mask = [
+            file
+            for file in file_keys
+            if self.date in file.split("/")[7].split("_")[3]
+        ]
+        if len(cloud_mask) > 0:
+            cloud_key = (
+                cloud_mask[0] + cloud_mask[0].split("/")[7] + "_SR_QA_AEROSOL.TIF"
+            )
+            tirs_10_key = (
+                cloud_mask[0] + cloud_mask[0].split("/")[7] + "_ST_B10.TIF"
+            )
+            return True, cloud_key, tirs_10_key
+        return False, self.cloud_key, self.tirs_10_key
+
     def download_aws(self, out_file):
         """
         Download cloud mask to local storage
@@ -95,10 +109,11 @@ class Landsat_Cloud_Mask:
         :return: True if success else return False
         :rtype: bool
         """
-        s3 = boto3.resource("s3")
         if self.mask_exists():
-            s3_object = s3.Object(self.bucket, self.cloud_key)
-            resp = s3_object.get(RequestPayer="requester")
+            s3 = get_s3_client(self.bucket, get_limit(self.bucket, CHECK_MAX_WORKERS))
+            resp = s3.get_object(
+                Bucket=self.bucket, Key=self.cloud_key, RequestPayer="requester"
+            )
             with open(out_file, "wb") as f:
                 for chunk in iter(lambda: resp["Body"].read(4096), b""):
                     f.write(chunk)
@@ -2,8 +2,6 @@ import json
 import logging
 from pathlib import Path
 
-from ewoc_dag.legacy.pid_to_ard import l2a_to_ard, l8_to_ard, to_ewoc_s1_ard
-from ewoc_dag.legacy.s3man import get_s3_client
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -29,6 +27,8 @@ def reproc_list(bucket, in_plans, path=""):
     return return_list
 
 def fetch_bucket(bucket, path):
+    from ewoc_dag.legacy.s3man import get_s3_client
+
     s3c = get_s3_client()
     paginator = s3c.get_paginator("list_objects")
 
@@ -50,6 +50,8 @@ def fetch_bucket(bucket, path):
     return bucket_prods
 
 def search_json_and_dump(bucket_prods, plan, path):
+    from ewoc_dag.legacy.pid_to_ard import l2a_to_ard, l8_to_ard, to_ewoc_s1_ard
+
     # Band counts
     l8_tirs_band_count = 2
     s2_band_count = 10
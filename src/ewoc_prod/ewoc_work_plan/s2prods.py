@@ -1,20 +1,47 @@
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from datetime import date, datetime, timedelta
+from functools import partial
 import json
 import logging
-import os
 from typing import List
 import re
-
-import boto3
-import botocore
-from eotile.eotile_module import main
-from ewoc_dag.bucket.aws import AWSS2L2ABucket, AWSS2L2ACOGSBucket
-from ewoc_dag.eo_prd_id.s2_prd_id import S2PrdIdInfo
-
+import time
+
+from .bucket_listing import (
+    CHECK_MAX_WORKERS,
+    check_products,
+    get_listing_prefixes,
+    get_s3_client,
+    list_keys,
+)
+from .engine import get_limit, run_blocking
+from .stats import attach_stats, count_discarded, current_stats, merge_stats, new_stats
+from .tile_index import get_s2_tile
+from .transport import get_transport
 from .utils import eodag_prods, remove_duplicates
 
 _logger = logging.getLogger(__name__)
 
+# eodag search of each S2 provider and level: eodag provider, product type and
+# property of the product id (that contains the tile id)
+S2_SEARCHES = {
+    ("aws", "L2A"): ("earth_search", "sentinel-s2-l2a-cogs", "sentinel:product_id"),
+    ("aws_sng", "L1C"): ("earth_search", "sentinel-s2-l1c", "sentinel:product_id"),
+    ("aws_sng", "L2A"): ("earth_search", "sentinel-s2-l2a", "sentinel:product_id"),
+    ("creodias", "L1C"): ("creodias", "S2_MSI_L1C", "title"),
+    ("creodias", "L2A"): ("creodias", "S2_MSI_L2A", "title"),
+}
+
+# Tiles missing or wrong in the STAC API of earth_search: their aws_sng products
+# are read from the tile infos of the sentinel-s2 buckets
+STAC_UNRELIABLE_TILES = {"01KAB"}
+SENTINEL_S2_BUCKETS = {"L1C": "sentinel-s2-l1c", "L2A": "sentinel-s2-l2a"}
+
+# A year of the sentinel-s2-l2a bucket is listed at once only if all its months
+# are needed (a page of 1000 objects per month)
+L2A_MIN_MONTHS_YEAR_LISTING = 12
+
 def test_pattern(pattern, mylist):
     # if re.search(r'%s' % pattern, "".join(mylist)) is not None:
     if re.search(pattern, "".join(mylist)) is not None:
@@ -23,7 +50,9 @@ def test_pattern(pattern, mylist):
         return False
 
 def get_e84_ids(s2_tile, start, end, creds, cloudcover=100, level="L2A"):
-    poly = main(s2_tile)[0]
+    from ewoc_dag.eo_prd_id.s2_prd_id import S2PrdIdInfo
+
+    poly = get_s2_tile(s2_tile)
 
     if level == "L1C":
         product_type = "sentinel-s2-l1c"
@@ -45,8 +74,9 @@ def get_e84_ids(s2_tile, start, end, creds, cloudcover=100, level="L2A"):
     for el in s2_prods_e84_all:
         if s2_tile in el.properties["sentinel:product_id"]:
             s2_prods_e84_filtered.append(el)
+    count_discarded("other_tile", len(s2_prods_e84_all) - len(s2_prods_e84_filtered))
     # Check bucket
-    s2_prods_e84 = []
+    prd_prefixes = []
     for el in s2_prods_e84_filtered:
         pid = el.properties["sentinel:product_id"]
 
@@ -61,11 +91,19 @@ def get_e84_ids(s2_tile, start, end, creds, cloudcover=100, level="L2A"):
             str(s2_prd_info.datatake_sensing_start_time.date().day).lstrip("0"),
             str(el.properties["id"].split('_')[-2]),
         ]
-        prd_prefix = "/".join(prefix_components) + "/"
-
-        my_bucket = AWSS2L2ABucket()
-        if my_bucket._check_product(prefix=prd_prefix, threshold=1, request_payer=True):
-            s2_prods_e84.append(el)
+        prd_prefixes.append("/".join(prefix_components) + "/")
+
+    # One listing per month (about 70 objects per product, one page per month)
+    in_bucket = check_products(
+        "sentinel-s2-l2a",
+        "s2_l2a_bucket",
+        prd_prefixes,
+        threshold=1,
+        request_payer=True,
+        min_months=L2A_MIN_MONTHS_YEAR_LISTING,
+    )
+    s2_prods_e84 = [el for el, found in zip(s2_prods_e84_filtered, in_bucket) if found]
+    count_discarded("missing_bucket", len(s2_prods_e84_filtered) - len(s2_prods_e84))
     # Filter and Clean
     e84 = {}
     for el in s2_prods_e84:
@@ -76,40 +114,98 @@ def get_e84_ids(s2_tile, start, end, creds, cloudcover=100, level="L2A"):
             e84[pid] = {"cc": float(cc), "date": date, "provider": "aws_sng", "level": level}
     return e84
 
-def get_e84_ids_01kab(start, end, level="L2A"):
-    key=os.environ['AWS_ACCESS_KEY_ID']
-    secret=os.environ["AWS_SECRET_ACCESS_KEY"]
-
-    s3_client = boto3.Session(aws_access_key_id=key,
-                            aws_secret_access_key=secret,
-                            region_name='eu-central-1').client('s3')
-
-    start_date=datetime.strptime(start, '%Y-%m-%d').date()
-    end_date=datetime.strptime(end, '%Y-%m-%d').date()
-    delta = timedelta(days=1)
-    e84={}
-    while start_date <= end_date:
-        start_date += delta
-        prd_prefix=f"tiles/1/K/AB/{start_date.year}/{start_date.month}/{start_date.day}/0/tileInfo.json"
+def get_e84_ids_from_bucket(s2_tile, start, end, level="L2A"):
+    """
+    Get the aws_sng products of a tile from the tile infos of the sentinel-s2
+    bucket (tiles where the STAC API is not reliable): the months of the period
+    are listed, then the tile infos of the products (first sequence of each day)
+    are read concurrently
+    :param s2_tile: S2 tile id
+    :param start: start date (included, YYYY-mm-dd)
+    :param end: end date (included, YYYY-mm-dd)
+    :param level: S2 level (L1C or L2A)
+    """
+    bucket_name = SENTINEL_S2_BUCKETS[level]
+    # One client for all the listings and tile infos, read concurrently
+    pool_size = get_limit(bucket_name, CHECK_MAX_WORKERS)
+
+    start_date = datetime.strptime(start, "%Y-%m-%d").date()
+    end_date = datetime.strptime(end, "%Y-%m-%d").date()
+    tile_prefix = f"tiles/{s2_tile[0:2].lstrip('0')}/{s2_tile[2]}/{s2_tile[3:5]}/"
+    month_prefixes = []
+    month = start_date.replace(day=1)
+    while month <= end_date:
+        month_prefixes.append(f"{tile_prefix}{month.year}/{month.month}/")
+        month = (month + timedelta(days=31)).replace(day=1)
+
+    def list_tile_infos(listing_prefix):
+        return get_transport().call(
+            "s2_tile_info_listing",
+            listing_prefix,
+            lambda: list_keys(
+                get_s3_client(bucket_name, pool_size),
+                bucket_name,
+                listing_prefix,
+                suffix="/tileInfo.json",
+                request_payer=True,
+            ),
+        )
+
+    # Same listings as the bucket checks of get_e84_ids: a year is listed at once
+    # only if all its months are needed
+    listing_prefixes = get_listing_prefixes(
+        month_prefixes, min_months=L2A_MIN_MONTHS_YEAR_LISTING
+    )
+    listings = run_blocking(
+        bucket_name,
+        [partial(list_tile_infos, prefix) for prefix in listing_prefixes],
+        max_workers=CHECK_MAX_WORKERS,
+    )
+    tile_info_keys = []
+    for keys in listings:
+        for key in keys:
+            # tiles/1/K/AB/2021/3/5/0/tileInfo.json, only the first sequence of a
+            # day as the products of the STAC API
+            year, month, day, sequence = key.split("/")[4:8]
+            if sequence == "0" and \
+                    start_date <= date(int(year), int(month), int(day)) <= end_date:
+                tile_info_keys.append(key)
+
+    def get_tile_info(key):
+        import botocore
+
         try:
-            response = s3_client.get_object(Bucket='sentinel-s2-l2a',
-                                Key=prd_prefix,
-                                RequestPayer='requester')
-            response_content = response['Body'].read().decode('utf-8')
-            pythonObject = json.loads(response_content)
+            response = get_s3_client(bucket_name, pool_size).get_object(
+                Bucket=bucket_name, Key=key, RequestPayer="requester"
+            )
+            tile_info = json.loads(response["Body"].read().decode("utf-8"))
         except botocore.exceptions.ClientError as e:
-            if e.response['Error']['Code'] == "404":
-                print("The object does not exist.")
-        else:
-            #Object exists
-            pid=pythonObject['productName']
-            cc=pythonObject['cloudyPixelPercentage']
-            date = datetime.strptime(pid.split("_")[2], "%Y%m%dT%H%M%S")
-            e84[pid] = {"cc": float(cc), "date": date, "provider": "aws_sng", "level": level}
+            _logger.warning("Failed to read %s: %s", key, e)
+            return None
+        return {"productName": tile_info["productName"],
+                "cloudyPixelPercentage": tile_info["cloudyPixelPercentage"]}
+
+    def read_tile_info(key):
+        return get_transport().call("s2_tile_info", key, lambda: get_tile_info(key))
+
+    tile_infos = run_blocking(
+        bucket_name,
+        [partial(read_tile_info, key) for key in tile_info_keys],
+        max_workers=CHECK_MAX_WORKERS,
+    )
+    e84 = {}
+    for tile_info in tile_infos:
+        if tile_info is not None:
+            pid = tile_info["productName"]
+            cc = tile_info["cloudyPixelPercentage"]
+            date_prd = datetime.strptime(pid.split("_")[2], "%Y%m%dT%H%M%S")
+            e84[pid] = {"cc": float(cc), "date": date_prd, "provider": "aws_sng", "level": level}
     return e84
 
 def get_e84_cogs_ids(s2_tile, start, end, creds, cloudcover=100, level="L2A"):
-    poly = main(s2_tile)[0]
+    from ewoc_dag.eo_prd_id.s2_prd_id import S2PrdIdInfo
+
+    poly = get_s2_tile(s2_tile)
     # Start search with element84 API
     s2_prods_e84_cogs_all = eodag_prods(
         poly,
@@ -125,8 +221,9 @@ def get_e84_cogs_ids(s2_tile, start, end, creds, cloudcover=100, level="L2A"):
     for el in s2_prods_e84_cogs_all:
         if s2_tile in el.properties["sentinel:product_id"]:
             s2_prods_e84_cogs_filtered.append(el)
+    count_discarded("other_tile", len(s2_prods_e84_cogs_all) - len(s2_prods_e84_cogs_filtered))
     # Check bucket
-    s2_prods_e84_cogs = []
+    prd_prefixes = []
     for el in s2_prods_e84_cogs_filtered:
         pid = el.properties["sentinel:product_id"]
 
@@ -140,11 +237,20 @@ def get_e84_cogs_ids(s2_tile, start, end, creds, cloudcover=100, level="L2A"):
             str(s2_prd_info.datatake_sensing_start_time.date().month).lstrip("0"),
             el.properties["id"]
         ]
-        prd_prefix = "/".join(prefix_components) + "/"
-
-        my_bucket = AWSS2L2ACOGSBucket()
-        if my_bucket._check_product(prefix=prd_prefix, threshold=15, request_payer=False):
-            s2_prods_e84_cogs.append(el)
+        prd_prefixes.append("/".join(prefix_components) + "/")
+
+    # One listing per year (about 20 objects per product, a few pages per year)
+    in_bucket = check_products(
+        "sentinel-cogs",
+        "s2_l2a_cogs_bucket",
+        prd_prefixes,
+        threshold=15,
+        request_payer=False,
+    )
+    s2_prods_e84_cogs = [
+        el for el, found in zip(s2_prods_e84_cogs_filtered, in_bucket) if found
+    ]
+    count_discarded("missing_bucket", len(s2_prods_e84_cogs_filtered) - len(s2_prods_e84_cogs))
     # Filter and Clean
     e84_cogs = {}
     for el in s2_prods_e84_cogs:
@@ -157,7 +263,8 @@ def get_e84_cogs_ids(s2_tile, start, end, creds, cloudcover=100, level="L2A"):
 
 
 def get_creodias_ids(s2_tile, start, end, creds, cloudcover=100, level="L2A"):
-    poly = main(s2_tile)[0]
+
+    poly = get_s2_tile(s2_tile)
     # Start search with creodias finder API
     if level == "L1C":
         product_type = "S2_MSI_L1C"
@@ -178,6 +285,7 @@ def get_creodias_ids(s2_tile, start, end, creds, cloudcover=100, level="L2A"):
     for el in s2_prods_creo:
         if s2_tile in el.properties["title"]:
             s2_prods_creo_filtered.append(el)
+    count_discarded("other_tile", len(s2_prods_creo) - len(s2_prods_creo_filtered))
     # Filter and Clean
     creo = {}
     for el in s2_prods_creo_filtered:
@@ -200,8 +308,8 @@ def get_s2_ids(s2_tile, provider, start, end, creds, cloudcover=100, level="L2A"
     if provider == "aws" and level == "L2A":
         return get_e84_cogs_ids(s2_tile, start, end, creds, cloudcover=cloudcover, level=level)
     elif provider == "aws_sng":
-        if s2_tile=='01KAB':
-            return get_e84_ids_01kab(start, end, level=level)
+        if s2_tile in STAC_UNRELIABLE_TILES:
+            return get_e84_ids_from_bucket(s2_tile, start, end, level=level)
         else:
             return get_e84_ids(s2_tile, start, end, creds, cloudcover=cloudcover, level=level)
     elif provider == "creodias":
@@ -214,20 +322,74 @@ def get_s2_ids(s2_tile, provider, start, end, creds, cloudcover=100, level="L2A"
 
 
 def merge_ids(ref, sec):
+    """
+    Replace the products of a reference provider by the products of a secondary
+    provider acquired at the same date with another level (last one of sec)
+    Products of sec without a product of ref at the same date are not added.
+    The products of sec are indexed by date, so the merge is linear.
+    :param ref: products of the reference provider (dictionary of id and info)
+    :param sec: products of the secondary provider
+    :return: merged products, in the order of ref
+    """
+    return _merge_by_date(ref, sec)[0]
+
+
+def _merge_by_date(ref, sec, first_provider=None, first_level=None):
+    """
+    merge_ids that also counts the merged products of a provider and a level
+    :return: merged products and number of products of first_provider and first_level
+    """
+    sec = sec or {}
+    sec_by_date = {}
+    for pid_s, info_s in sec.items():
+        sec_by_date.setdefault(info_s["date"], []).append(pid_s)
+
+    def is_first(info):
+        return info["provider"] == first_provider and info["level"] == first_level
+
     fusion = {}
-    for pid_r in ref:
-        found = False
-        for pid_s in sec:
-            if ref[pid_r]["date"] == sec[pid_s]["date"] and \
-                ref[pid_r]["level"] != sec[pid_s]["level"]:
-                found = True
-                sec_id = pid_s
+    nb_first = 0
+    for pid_r, info_r in ref.items():
+        key, info = pid_r, info_r
+        for pid_s in reversed(sec_by_date.get(info_r["date"], ())):
+            if sec[pid_s]["level"] != info_r["level"]:
                 _logger.info("Found match between ref and sec %s -- %s", pid_r, pid_s)
-        if found:
-            fusion[sec_id] = sec[sec_id]
-        else:
-            fusion[pid_r] = ref[pid_r]
-    return fusion
+                key, info = pid_s, sec[pid_s]
+                break
+        if key in fusion:
+            nb_first -= is_first(fusion[key])
+        fusion[key] = info
+        nb_first += is_first(info)
+    return fusion, nb_first
+
+
+def merge_providers_ids(ref, sec_searches, first_provider, first_level):
+    """
+    N-way merge of the products of several providers: the products of ref are
+    replaced by the products of each secondary provider in turn (see merge_ids)
+    The merge stops when no product of the first provider and level is left, the
+    next searches are then not done.
+    :param ref: products of the reference provider (dictionary of id and info)
+    :param sec_searches: functions returning the products of each secondary
+        provider (None to skip a provider)
+    :param first_provider: reference provider
+    :param first_level: reference level
+    :return: merged products
+    """
+    ref = ref or {}
+    nb_first = sum(
+        info["provider"] == first_provider and info["level"] == first_level
+        for info in ref.values()
+    )
+    for search in sec_searches:
+        if nb_first == 0:
+            _logger.info("No need to check the other providers of the list, \
+                all products are already done")
+            break
+        if search is None:
+            continue
+        ref, nb_first = _merge_by_date(ref, search(), first_provider, first_level)
+    return ref
 
 
 def get_best_prds(s2_prds: dict, cloudcover: float, min_nb_prods: int, rm_l1c: bool) -> List:
@@ -240,9 +402,12 @@ def get_best_prds(s2_prds: dict, cloudcover: float, min_nb_prods: int, rm_l1c: b
     min_nb_prods = round((n_months * min_nb_prods) / 12)
     # Remove duplicates
     s2_prds_set = remove_duplicates(list(s2_prds.keys()))
+    count_discarded("duplicates", len(s2_prds) - len(s2_prds_set))
     # Remove L1C products
     if rm_l1c:
+        nb_prds = len(s2_prds_set)
         s2_prds_set = [item for item in s2_prds_set if 'MSIL1C' not in item]
+        count_discarded("l1c", nb_prds - len(s2_prds_set))
     # Filter produtcs by cloud cover
     cc_filter = [
         [s2_prds[prd]["provider"], prd]
@@ -260,6 +425,7 @@ def get_best_prds(s2_prds: dict, cloudcover: float, min_nb_prods: int, rm_l1c: b
             len(cc_filter),
             min_nb_prods,
         )
+        count_discarded("cloud_cover", len(s2_prds_set) - len(cc_filter))
         return cc_filter
     elif s2_prds:
         _logger.warning(
@@ -277,15 +443,74 @@ def get_best_prds(s2_prds: dict, cloudcover: float, min_nb_prods: int, rm_l1c: b
         return list(s2_prds.keys())
 
 
-def check_s2_prds_prov_level(ref, first_provider, first_level):
-    found = False
-    for pid_r in ref:
-        _logger.debug(ref[pid_r]["provider"], ref[pid_r]["level"])
-        if (ref[pid_r]["provider"] == first_provider) and (ref[pid_r]["level"] == first_level):
-            found = True
-            # print(f"{pid_r} should be checked with another provider")
-            _logger.debug("%s should be checked with another provider", pid_r)
-    return found
+class ProviderSearch:
+    """
+    Search of the products of a provider and a level run in a thread, with a
+    timeout: a provider that does not answer in time is skipped (None)
+    The search collects its stats apart, added to the stats of the calling thread
+    only when its products are used: an abandoned search may still be running
+    """
+
+    def __init__(self, executor, search, provider, level, timeout=None):
+        """
+        :param executor: executor running the search
+        :param search: function returning the products of the provider
+        :param timeout: maximum time of the search in seconds (None: no limit)
+        """
+        self.provider = provider
+        self.level = level
+        self.timeout = timeout
+        self._executor = executor
+        self._search = search
+        self._future = None
+        self._started = None
+        self._stats = None
+        self._search_stats = None
+
+    def _run(self, stats):
+        with attach_stats(stats):
+            return self._search()
+
+    def start(self):
+        """
+        Start the search (in the stats of the calling thread) if not started
+        """
+        if self._future is None:
+            self._started = time.perf_counter()
+            self._stats = current_stats()
+            if self._stats is not None:
+                self._search_stats = new_stats()
+            self._future = self._executor.submit(self._run, self._search_stats)
+
+    def cancel(self):
+        """
+        Cancel the search if it is not running yet, its stats are dropped
+        """
+        if self._future is not None:
+            self._future.cancel()
+        self._search_stats = None
+
+    def __call__(self):
+        """
+        Wait for the products of the search (started if needed)
+        """
+        self.start()
+        timeout = None
+        if self.timeout is not None:
+            timeout = max(0.0, self.timeout - (time.perf_counter() - self._started))
+        try:
+            products = self._future.result(timeout=timeout)
+        except FuturesTimeoutError:
+            _logger.warning(
+                "No %s products from %s after %ss, the provider is skipped",
+                self.level, self.provider, self.timeout
+            )
+            self.cancel()
+            return None
+        if self._search_stats is not None:
+            merge_stats(self._stats, self._search_stats)
+            self._search_stats = None
+        return products
 
 
 def run_multiple_cross_provider(
@@ -299,107 +524,152 @@ def run_multiple_cross_provider(
     providers,
     strategy=None,
     rm_l1c=None,
+    fan_out=False,
+    provider_timeout=None,
 ):
-    if len(providers) != len(strategy):
-        _logger.error("Number of providers must match number of strategies")
+    """
+    Get the best S2 products of a tile from several providers and levels: the
+    products of the first provider are replaced by the ones of each secondary
+    provider acquired at the same date with another level (see merge_providers_ids)
+    With fan_out, the searches of all the providers start at once and are merged
+    when they complete (same precedence, the merge still stops when no product of
+    the first provider is left), otherwise a secondary provider is searched only
+    when the merge needs it.
+    :param fan_out: search all the providers concurrently
+    :param provider_timeout: maximum time of the search of a provider in seconds,
+        a provider that does not answer in time is skipped (None: no limit)
+    """
     if strategy is None:
         strategy = ["L2A"] * len(providers)
+    if len(providers) != len(strategy):
+        _logger.error("Number of providers must match number of strategies")
 
-    if s2_tile=='01KAB' and providers[0]!='aws_sng':
-        _logger.warning("For tile 01KAB, aws_sng provider must be used")
-
-    # Initilization
-    ref = get_s2_ids(
-        s2_tile,
-        providers[0],
-        start,
-        end,
-        creds,
-        cloudcover=cloudcover_max,
-        level=strategy[0],
-    )
-    first_provider = providers[0]
-    first_level = strategy[0]
-
-    # print(f'Number of {strategy[0]} products for {providers[0]} = {len(ref)}')
-    _logger.debug('Number of %s products for %s = %s', strategy[0], providers[0], len(ref))
-
-    nb_tests = len(providers)-1
-
-    while nb_tests>0:
-
-        # print(providers, strategy)
-        _logger.debug(providers, strategy)
-
-        ref_provider =  providers[0]
-        ref_level = strategy[0]
-        sec_provider =  providers[1]
-        sec_level = strategy[1]
-
-        if ref is not None:  #ref_level and ref_provider is a mix of values
-            # print(f'Number of reference products = {len(ref)}')
-            _logger.debug('Number of reference products = %s', len(ref))
-        else:
-            # print('Number of reference products = 0')
-            _logger.debug('Number of reference products = 0')
-
-        found = check_s2_prds_prov_level(ref, first_provider, first_level)
-        if found is False:
-            # print("No need to check the other providers of the list, \
-            #     all products are already done")
-            _logger.info("No need to check the other providers of the list, \
-                all products are already done")
-            break
+    if s2_tile in STAC_UNRELIABLE_TILES and providers[0]!='aws_sng':
+        _logger.warning("For tile %s, aws_sng provider must be used", s2_tile)
 
+    # Searches of the secondary providers, done only if needed by the merge
+    sec_searches = []
+    for (ref_provider, ref_level), (sec_provider, sec_level) in zip(
+        zip(providers, strategy), zip(providers[1:], strategy[1:])
+    ):
         # If the two providers are the same with same product level, only one provider is used
         if (ref_provider == sec_provider) and (ref_level == sec_level):
             _logger.info(
                 "One provider: %s will be used to get level: %s data",
                 ref_provider, ref_level
             )
+            sec_searches.append(None)
         else:
-            _logger.info(
-                "Reference provider: %s, level %s with secondary provider: %s, level %s",
-                ref_provider, ref_level, sec_provider, sec_level
-            )
-            ref = cross_provider_ids(
+            sec_searches.append(
+                partial(
+                    secondary_provider_ids,
                     s2_tile,
                     start,
                     end,
                     cloudcover_max,
                     creds,
-                    ref,
+                    ref_provider,
+                    ref_level,
                     sec_provider,
                     sec_level,
                 )
-        nb_tests -= 1
-        providers = providers[1:]
-        strategy = strategy[1:]
+            )
+    ref_search = partial(
+        reference_provider_ids, s2_tile, start, end, cloudcover_max, creds,
+        providers[0], strategy[0]
+    )
+    if fan_out or provider_timeout is not None:
+        ref = run_provider_searches(
+            ref_search,
+            sec_searches,
+            providers,
+            strategy,
+            fan_out=fan_out,
+            provider_timeout=provider_timeout,
+        )
+    else:
+        ref = ref_search()
+        ref = merge_providers_ids(ref, sec_searches, providers[0], strategy[0])
 
     if rm_l1c:
         _logger.debug('Number of prd before cc filter and l1c deletion= %s', len(ref))
     else:
-        # print(f'Number of prd before cc filter = {len(ref)}')
         _logger.debug('Number of prd before cc filter= %s', len(ref))
     if len(ref) == 0:
         res_prd = []
     else:
         res_prd = format_results(ref, cloudcover_min, min_nb_prods, rm_l1c)
-    # print(f'Number of prd after cc filter = {len(res_prd)}')
     _logger.debug('Number of prd after cc filter= %s', len(res_prd))
     return res_prd
 
 
-def cross_provider_ids(
+def run_provider_searches(
+    ref_search, sec_searches, providers, strategy, fan_out=False, provider_timeout=None
+):
+    """
+    Run the searches of the providers in threads (all at once with fan_out, when
+    the merge needs them otherwise) and merge their products
+    :param ref_search: function returning the products of the first provider
+    :param sec_searches: functions returning the products of each secondary
+        provider (None to skip a provider)
+    :return: merged products
+    """
+    executor = ThreadPoolExecutor(max_workers=len(providers), thread_name_prefix="s2_search")
+    searches = [
+        None if search is None else ProviderSearch(
+            executor, search, provider, level, timeout=provider_timeout
+        )
+        for search, provider, level in zip(
+            [ref_search] + sec_searches, providers, strategy
+        )
+    ]
+    try:
+        if fan_out:
+            for search in searches:
+                if search is not None:
+                    search.start()
+        ref = merge_providers_ids(searches[0](), searches[1:], providers[0], strategy[0])
+    finally:
+        # Searches not needed by the merge (or too slow) are not waited for
+        for search in searches:
+            if search is not None:
+                search.cancel()
+        executor.shutdown(wait=False)
+    return ref
+
+
+def reference_provider_ids(
+    s2_tile, start, end, cloudcover_max, creds, ref_provider, ref_level
+):
+    ref = get_s2_ids(
+        s2_tile,
+        ref_provider,
+        start,
+        end,
+        creds,
+        cloudcover=cloudcover_max,
+        level=ref_level,
+    )
+    _logger.debug('Number of %s products for %s = %s', ref_level, ref_provider,
+                  len(ref or {}))
+    return ref
+
+
+def secondary_provider_ids(
     s2_tile,
     start,
     end,
     cloudcover_max,
     creds,
-    ref,
+    ref_provider,
+    ref_level,
     sec_provider,
     sec_level,
 ):
+    _logger.info(
+        "Reference provider: %s, level %s with secondary provider: %s, level %s",
+        ref_provider, ref_level, sec_provider, sec_level
+    )
     sec = get_s2_ids(
         s2_tile,
         sec_provider,
@@ -409,17 +679,9 @@ def cross_provider_ids(
         cloudcover=cloudcover_max,
         level=sec_level,
     )
-
-    if sec is not None :
-        # print(f'Number of {sec_level} products for {sec_provider} = {len(sec)}')
-        _logger.debug('Number of %s products for %s = %s', sec_level, sec_provider, len(sec))
-    else:
-        # print(f'Number of {sec_level} products for {sec_provider} = 0')
-        _logger.debug('Number of %s products for %s = 0', sec_level, sec_provider)
-
-    # Merge two dictionaries
-    fusion = merge_ids(ref, sec)
-    return fusion
+    _logger.debug('Number of %s products for %s = %s', sec_level, sec_provider,
+                  len(sec or {}))
+    return sec
 
 
 def format_results(val, cloudcover_min, min_nb_prods, rm_l1c):
@@ -0,0 +1,189 @@
+from contextlib import contextmanager
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class CachedProduct(NamedTuple):
+    """
+    Compact record of a product found by a catalogue search
+    (the only attributes of the eodag products used by the workplan, geometry
+    is the footprint)
+    """
+
+    properties: Dict
+    assets: Dict
+    geometry: Optional[object] = None
+
+
+def products_to_records(products):
+    """
+    Convert products to JSON serializable records
+    :param products: Products found (eodag products or CachedProduct)
+    :return: List of [properties, assets, footprint WKT]
+    """
+    return [
+        [
+            dict(product.properties),
+            {name: dict(asset) for name, asset in (product.assets or {}).items()},
+            product.geometry.wkt if product.geometry is not None else None,
+        ]
+        for product in products
+    ]
+
+
+def records_to_products(records):
+    """
+    Convert records back to products
+    :param records: List of [properties, assets, footprint WKT]
+    :return: List of CachedProduct
+    """
+    from shapely import wkt
+
+    return [
+        CachedProduct(properties, assets, wkt.loads(geometry) if geometry else None)
+        for properties, assets, geometry in records
+    ]
+
+
+class SearchCache:
+    """
+    Persistent cache of catalogue search results (sqlite file)
+    Results are stored with a key computed from the search query, they expire
+    after ttl seconds and the least recently used ones are removed when the
+    cache is larger than max_size bytes
+    """
+
+    def __init__(self, filepath, ttl=7 * 86400, max_size=512 * 1024**2, refresh=False):
+        """
+        :param filepath: Path to the sqlite file, created if it does not exist
+        :type filepath: str
+        :param ttl: Time to live of the results in seconds
+        :type ttl: float
+        :param max_size: Maximum size of the stored results in bytes
+        :type max_size: int
+        :param refresh: Do not read the cache, searches are done again and stored
+        :type refresh: bool
+        """
+        self.filepath = str(filepath)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS searches (key TEXT PRIMARY KEY, "
+                "created REAL, accessed REAL, size INTEGER, products BLOB)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        # One connection per call: the cache is shared by threads and processes
+        connection = sqlite3.connect(self.filepath, timeout=60)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def get_key(**query):
+        """
+        Get the key of a search query
+        :param query: Search parameters (provider, product type, geometry, dates...)
+        :return: Hash of the query
+        """
+        return hashlib.sha256(
+            json.dumps(query, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def get(self, key) -> Optional[List[CachedProduct]]:
+        """
+        Get the products of a search if they are in the cache and not expired
+        :param key: Key of the search query
+        :return: List of products or None
+        """
+        if self.refresh:
+            self._count(hit=False)
+            return None
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT products FROM searches WHERE key = ? AND created > ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE searches SET accessed = ? WHERE key = ?", (now, key)
+                )
+        self._count(hit=row is not None)
+        if row is None:
+            return None
+        return records_to_products(json.loads(zlib.decompress(row[0])))
+
+    def put(self, key, products):
+        """
+        Store the products of a search, then remove the expired and least
+        recently used results if needed
+        :param key: Key of the search query
+        :param products: Products found (eodag products or CachedProduct)
+        """
+        records = products_to_records(products)
+        blob = zlib.compress(json.dumps(records, default=str).encode())
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?)",
+                (key, now, now, len(blob), blob),
+            )
+            connection.execute(
+                "DELETE FROM searches WHERE created <= ?", (now - self.ttl,)
+            )
+            total_size = connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM searches"
+            ).fetchone()[0]
+            if total_size > self.max_size:
+                evicted = 0
+                for old_key, size in connection.execute(
+                    "SELECT key, size FROM searches WHERE key != ? ORDER BY accessed",
+                    (key,),
+                ).fetchall():
+                    if total_size <= self.max_size:
+                        break
+                    connection.execute("DELETE FROM searches WHERE key = ?", (old_key,))
+                    total_size -= size
+                    evicted += 1
+                logger.debug("%s searches removed from the cache", evicted)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        """
+        Get the counters of the cache
+        :return: Dictionary with the number of hits, misses, stored searches and size
+        """
+        with self._connect() as connection:
+            nb_searches, size = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM searches"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "searches": nb_searches,
+            "size": size,
+        }
@@ -0,0 +1,148 @@
+from contextlib import contextmanager
+import threading
+import time
+
+SENSORS = ("s1", "s2", "l8")
+
+_local = threading.local()
+# Stats of a thread may be updated by the threads of the engine
+_lock = threading.Lock()
+
+
+def new_stats():
+    """
+    Get empty stats: time (s), remote calls per kind, search time per provider (s)
+    and products discarded per filter
+    """
+    return {"time": 0.0, "calls": {}, "providers": {}, "discarded": {}}
+
+
+@contextmanager
+def collect_stats():
+    """
+    Collect the stats of the work done by the current thread
+    (identification of the products of a sensor for a tile)
+    :return: stats (see new_stats), filled when the context exits
+    """
+    stats = new_stats()
+    previous = getattr(_local, "stats", None)
+    _local.stats = stats
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats["time"] = round(time.perf_counter() - start, 3)
+        _local.stats = previous
+
+
+def current_stats():
+    """
+    Get the stats collected by the current thread (None if not collected)
+    """
+    return getattr(_local, "stats", None)
+
+
+@contextmanager
+def attach_stats(stats):
+    """
+    Collect the stats of the current thread in the stats of another thread
+    (remote calls run by the engine for this thread)
+    :param stats: stats of the other thread or None
+    """
+    previous = getattr(_local, "stats", None)
+    _local.stats = stats
+    try:
+        yield stats
+    finally:
+        _local.stats = previous
+
+
+def count_call(kind):
+    """
+    Count a remote call in the stats of the current thread (if collected)
+    :param kind: Kind of call (e.g. "search", "s2_l2a_bucket_listing")
+    """
+    stats = getattr(_local, "stats", None)
+    if stats is not None:
+        with _lock:
+            stats["calls"][kind] = stats["calls"].get(kind, 0) + 1
+
+
+def add_provider_time(provider, seconds):
+    """
+    Add the time of a search to the stats of the current thread (if collected)
+    :param provider: eodag provider
+    :param seconds: time of the search
+    """
+    stats = getattr(_local, "stats", None)
+    if stats is not None:
+        with _lock:
+            stats["providers"][provider] = round(
+                stats["providers"].get(provider, 0.0) + seconds, 3
+            )
+
+
+def count_discarded(filter_name, nb_products):
+    """
+    Count the products discarded by a filter in the stats of the current thread
+    (if collected)
+    :param filter_name: Name of the filter (e.g. "cloud_cover", "invalid_sar")
+    :param nb_products: Number of discarded products
+    """
+    stats = getattr(_local, "stats", None)
+    if stats is not None and nb_products > 0:
+        with _lock:
+            stats["discarded"][filter_name] = (
+                stats["discarded"].get(filter_name, 0) + nb_products
+            )
+
+
+def add_stats(total, stats):
+    """
+    Add stats to a total
+    :param total: stats updated in place
+    :param stats: stats to add
+    """
+    total["time"] = round(total["time"] + stats.get("time", 0.0), 3)
+    for key in ("calls", "providers", "discarded"):
+        for name, value in stats.get(key, {}).items():
+            total[key][name] = round(total[key].get(name, 0) + value, 3)
+    return total
+
+
+def merge_stats(stats, other):
+    """
+    Add the stats collected in another thread (see attach_stats) to the stats
+    of the current thread, which may be updated by the threads of the engine
+    :param stats: stats updated in place
+    :param other: stats to add
+    """
+    with _lock:
+        return add_stats(stats, other)
+
+
+def aggregate_stats(tile_plans, nb_slowest=10):
+    """
+    Aggregate the stats of tiles (e.g. all the tiles of an AEZ)
+    :param tile_plans: tile plans of workplans generated with stats
+    :param nb_slowest: number of slowest tiles reported
+    :return: dictionary with the total per sensor and the slowest tiles
+    """
+    sensors = {sensor: new_stats() for sensor in SENSORS}
+    tile_times = {}
+    for tile_plan in tile_plans:
+        tile_stats = tile_plan.get("_stats")
+        if not tile_stats:
+            continue
+        for sensor, stats in tile_stats.items():
+            add_stats(sensors.setdefault(sensor, new_stats()), stats)
+        tile_times[tile_plan["tile_id"]] = round(
+            sum(stats.get("time", 0.0) for stats in tile_stats.values()), 3
+        )
+    slowest_tiles = sorted(tile_times.items(), key=lambda item: item[1], reverse=True)
+    return {
+        "nb_tiles": len(tile_times),
+        "time": round(sum(tile_times.values()), 3),
+        "sensors": sensors,
+        "slowest_tiles": slowest_tiles[:nb_slowest],
+    }
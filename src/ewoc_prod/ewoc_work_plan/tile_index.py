@@ -0,0 +1,131 @@
+from functools import lru_cache
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Geometry covering the whole S2 grid
+WORLD_WKT = "POLYGON ((-180 -90, 180 -90, 180 90, -180 90, -180 -90))"
+
+_s2_tile_index = None
+_s2_tile_index_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _read_s2_tile(tile_id):
+    # Cached GeoDataFrame, shared by all the threads: only copies are returned
+    if _s2_tile_index is not None:
+        return _s2_tile_index.get(tile_id)
+
+    from eotile import eotile_module
+
+    return eotile_module.main(tile_id)[0]
+
+
+def get_s2_tile(tile_id):
+    """
+    Get the S2 tile of an id, as eotile_module.main(tile_id)[0]
+    Tiles are read once per process, each call returns a copy
+    :param tile_id: S2 tile id (e.g. "31TCJ")
+    :return: GeoDataFrame with one row
+    """
+    return _read_s2_tile(tile_id).copy()
+
+
+def get_s2_tiles(tile_ids):
+    """
+    Get the S2 tiles of a list of ids
+    :param tile_ids: list of S2 tile ids
+    :return: list of GeoDataFrame, one per tile
+    """
+    return [get_s2_tile(tile_id) for tile_id in tile_ids]
+
+
+class S2TileIndex:
+    """
+    Index of the S2 grid: tile lookup by id and spatial query (STRtree) of the
+    tiles that intersect a geometry
+    """
+
+    def __init__(self, s2_grid):
+        """
+        :param s2_grid: S2 tiles with their id and geometry (EPSG:4326)
+        :type s2_grid: GeoDataFrame
+        """
+        from .geometry_tree import GeometryTree
+
+        self._grid = s2_grid.reset_index(drop=True)
+        self._positions = {tile_id: position for position, tile_id in enumerate(self._grid["id"])}
+        self._tree = GeometryTree(self._grid.geometry)
+        logger.debug("%s S2 tiles indexed", len(self._tree))
+
+    @classmethod
+    def from_eotile(cls):
+        """
+        Build the index of the whole S2 grid of eotile
+        """
+        from eotile import eotile_module
+
+        return cls(eotile_module.main(WORLD_WKT)[0])
+
+    def __len__(self):
+        return len(self._tree)
+
+    def __contains__(self, tile_id):
+        return tile_id in self._positions
+
+    def get(self, tile_id):
+        """
+        Get an S2 tile
+        :param tile_id: S2 tile id
+        :return: GeoDataFrame with one row
+        """
+        return self.get_many([tile_id])
+
+    def get_many(self, tile_ids):
+        """
+        Get several S2 tiles at once
+        :param tile_ids: list of S2 tile ids
+        :return: GeoDataFrame with one row per tile, in the order of the ids
+        """
+        unknown = [tile_id for tile_id in tile_ids if tile_id not in self._positions]
+        if unknown:
+            raise ValueError(f"Unknown S2 tiles: {unknown}")
+        positions = [self._positions[tile_id] for tile_id in tile_ids]
+        return self._grid.iloc[positions].reset_index(drop=True)
+
+    def query(self, geometry):
+        """
+        Get the S2 tiles that intersect a geometry
+        :param geometry: geometry in EPSG:4326 (shapely geometry or WKT)
+        :return: list of S2 tile ids, in grid order
+        """
+        from shapely import wkt
+
+        if isinstance(geometry, str):
+            geometry = wkt.loads(geometry)
+        positions = self._tree.query(geometry)
+        return [self._grid["id"].iloc[position] for position in sorted(positions)]
+
+
+def get_s2_tile_index():
+    """
+    Get the index of the whole S2 grid, built once per process
+    """
+    global _s2_tile_index
+    with _s2_tile_index_lock:
+        if _s2_tile_index is None:
+            _s2_tile_index = S2TileIndex.from_eotile()
+    return _s2_tile_index
+
+
+def set_s2_tile_index(s2_tile_index):
+    """
+    Set the index of the S2 grid, used instead of eotile by get_s2_tile and
+    get_s2_tile_index (e.g. a synthetic grid for the benchmarks)
+    :param s2_tile_index: S2TileIndex or None to go back to eotile
+    """
+    global _s2_tile_index
+    with _s2_tile_index_lock:
+        _s2_tile_index = s2_tile_index
+    _read_s2_tile.cache_clear()
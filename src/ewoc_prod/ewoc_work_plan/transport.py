@@ -0,0 +1,162 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from .stats import count_call
+
+logger = logging.getLogger(__name__)
+
+TRANSPORT_MODES = ("live", "record", "replay")
+
+
+class ReplayError(LookupError):
+    """
+    Provider response missing from the archive in replay mode
+    """
+
+
+class LiveTransport:
+    """
+    Access to the providers (catalogue searches, S3 buckets)
+    Each remote call of the workplan goes through call, with a kind (e.g. "search",
+    "is_descending") and a key that identifies the request
+    """
+
+    mode = "live"
+
+    def call(self, kind, key, func, encode=None, decode=None):
+        """
+        Get the response of a provider
+        :param kind: Kind of request
+        :param key: Key of the request (str)
+        :param func: Function doing the request
+        :param encode: Conversion of the response to a JSON serializable value
+        :param decode: Conversion of the JSON value back to a response
+        """
+        count_call(kind)
+        return self._request(kind, key, func, encode=encode, decode=decode)
+
+    def _request(self, kind, key, func, encode=None, decode=None):
+        """
+        Do the request (the record and replay transports change how)
+        """
+        return func()
+
+
+class RecordTransport(LiveTransport):
+    """
+    Access to the providers, each response is recorded in an archive (sqlite file)
+    Failed requests (exceptions) are not recorded
+    """
+
+    mode = "record"
+
+    def __init__(self, filepath):
+        """
+        :param filepath: Path to the archive, created if it does not exist
+        :type filepath: str
+        """
+        self.filepath = str(filepath)
+        self.nb_calls = 0
+        self._lock = threading.Lock()
+        connection = sqlite3.connect(self.filepath, timeout=60)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS responses (kind TEXT, key TEXT, "
+                    "recorded REAL, response TEXT, PRIMARY KEY (kind, key))"
+                )
+        finally:
+            connection.close()
+
+    def _request(self, kind, key, func, encode=None, decode=None):
+        response = func()
+        value = encode(response) if encode is not None else response
+        connection = sqlite3.connect(self.filepath, timeout=60)
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                    (kind, key, time.time(), json.dumps(value, default=str)),
+                )
+        finally:
+            connection.close()
+        with self._lock:
+            self.nb_calls += 1
+        return response
+
+
+class ReplayTransport(LiveTransport):
+    """
+    Responses read from an archive written by RecordTransport, without network access
+    """
+
+    mode = "replay"
+
+    def __init__(self, filepath):
+        """
+        :param filepath: Path to the archive
+        :type filepath: str
+        """
+        self.filepath = str(filepath)
+        self.nb_calls = 0
+        self._lock = threading.Lock()
+        connection = sqlite3.connect(self.filepath)
+        try:
+            self._responses = {
+                (kind, key): response
+                for kind, key, response in connection.execute(
+                    "SELECT kind, key, response FROM responses"
+                )
+            }
+        finally:
+            connection.close()
+        logger.info("%s responses read from %s", len(self._responses), self.filepath)
+
+    def _request(self, kind, key, func, encode=None, decode=None):
+        response = self._responses.get((kind, key))
+        if response is None:
+            raise ReplayError(f"No {kind} response recorded for {key} in {self.filepath}")
+        with self._lock:
+            self.nb_calls += 1
+        value = json.loads(response)
+        return decode(value) if decode is not None else value
+
+
+_transport = LiveTransport()
+
+
+def get_transport():
+    """
+    Get the transport used for the remote calls of the workplan
+    """
+    return _transport
+
+
+def set_transport(transport):
+    """
+    Set the transport used for the remote calls of the workplan
+    :param transport: LiveTransport, RecordTransport or ReplayTransport
+    """
+    global _transport
+    _transport = transport
+
+
+def create_transport(mode, filepath=None):
+    """
+    Create the transport of a mode
+    :param mode: live, record or replay
+    :param filepath: Path to the archive (record and replay modes)
+    """
+    if mode not in TRANSPORT_MODES:
+        raise ValueError(f"Incorrect transport mode: {mode} (not in {TRANSPORT_MODES})")
+    if mode == "live":
+        return LiveTransport()
+    if not filepath:
+        raise ValueError(f"An archive file is needed in {mode} mode")
+    if mode == "record":
+        return RecordTransport(filepath)
+    return ReplayTransport(filepath)
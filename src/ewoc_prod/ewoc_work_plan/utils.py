@@ -1,18 +1,38 @@
 from datetime import datetime, timedelta
+from functools import partial
 import logging
 import os
 import re
+import threading
+import time
 from typing import List
 import xml.etree.ElementTree as et
 
-import boto3
 from click import Option, UsageError
-from eodag.api.core import EODataAccessGateway
-from ewoc_dag.eo_prd_id.s1_prd_id import S1PrdIdInfo
-from shapely.wkt import dumps
+
+from .bucket_listing import get_s3_client
+from .engine import run_blocking
+from .search_cache import SearchCache, products_to_records, records_to_products
+from .stats import add_provider_time, count_call, count_discarded
+from .transport import get_transport
 
 _logger = logging.getLogger(__name__)
 
+# Environment variable used by eodag to restrict the providers it loads
+EODAG_PROVIDERS_ENV = "EODAG_PROVIDERS_WHITELIST"
+# eodag providers searched for each data provider of the workplan
+EODAG_S1_PROVIDERS = {"creodias": "creodias", "astraea_eod": "astraea_eod"}
+EODAG_S2_PROVIDERS = {"aws": "earth_search", "aws_sng": "earth_search", "creodias": "creodias"}
+EODAG_L8_PROVIDER = "usgs_satapi_aws"
+
+# EODataAccessGateway instances, per process and per thread
+_eodag_gateways = threading.local()
+# Cache of the catalogue searches, disabled by default
+_search_cache = None
+# Products of the tiles searched by prefetch_eodag_prods, by search key
+_prefetched = {}
+_prefetched_lock = threading.Lock()
+
 
 def set_logger(verbose_v):
     """
@@ -28,23 +48,102 @@ def set_logger(verbose_v):
     logging.getLogger().setLevel(loglevel)
 
 
-def eodag_prods(
-        df, start_date, end_date, provider, product_type, creds, cloud_cover=None
-):
+def get_eodag_providers(s1_data_provider, s2_data_provider):
+    """
+    Get the eodag providers searched to build a workplan
+    :param s1_data_provider: s1 provider of the workplan
+    :param s2_data_provider: list of s2 providers of the workplan
+    :return: sorted list of eodag providers
+    """
+    providers = {EODAG_L8_PROVIDER}
+    if s1_data_provider in EODAG_S1_PROVIDERS:
+        providers.add(EODAG_S1_PROVIDERS[s1_data_provider])
+    for provider in s2_data_provider:
+        if provider in EODAG_S2_PROVIDERS:
+            providers.add(EODAG_S2_PROVIDERS[provider])
+    return sorted(providers)
+
+
+def set_eodag_providers(providers):
+    """
+    Restrict the providers loaded by the gateways created afterwards
+    (EODAG_PROVIDERS_WHITELIST, inherited by the worker processes)
+    :param providers: list of eodag providers, all the providers are loaded if empty
+    """
+    if providers:
+        os.environ[EODAG_PROVIDERS_ENV] = ",".join(providers)
+    else:
+        os.environ.pop(EODAG_PROVIDERS_ENV, None)
+
+
+def _create_eodag_gateway(creds, provider):
+    from eodag.api.core import EODataAccessGateway
+
+    start = time.perf_counter()
     dag = EODataAccessGateway(user_conf_file_path=creds)
     dag.set_preferred_provider(provider)
-    poly = dumps(df.geometry[0])
+    _logger.debug(
+        "EODataAccessGateway for %s created in %.2fs",
+        provider,
+        time.perf_counter() - start,
+    )
+    return dag
+
+
+def get_eodag_gateway(creds, provider):
+    """
+    Get the gateway of a configuration file and a preferred provider
+    Gateways are created once per process and per thread, since loading the
+    providers configurations and product types is slow. They are not shared by
+    the threads: the search plugins of eodag keep the state of the current query.
+    :param creds: eodag configuration file
+    :param provider: preferred provider
+    """
+    # Gateways are not inherited by the worker processes
+    if getattr(_eodag_gateways, "pid", None) != os.getpid():
+        _eodag_gateways.pid = os.getpid()
+        _eodag_gateways.gateways = {}
+    key = (creds, provider, os.getenv(EODAG_PROVIDERS_ENV))
+    dag = _eodag_gateways.gateways.get(key)
+    if dag is None:
+        dag = _create_eodag_gateway(creds, provider)
+        _eodag_gateways.gateways[key] = dag
+    return dag
+
+
+def set_search_cache(search_cache):
+    """
+    Set the cache of the catalogue searches done by eodag_prods
+    :param search_cache: SearchCache or None to disable the cache
+    """
+    global _search_cache
+    _search_cache = search_cache
+
+
+def get_search_cache():
+    """
+    Get the cache of the catalogue searches (None if disabled)
+    """
+    return _search_cache
+
+
+def get_search_kwargs(poly, start_date, end_date, product_type, cloud_cover=None):
+    """
+    Get the parameters of the eodag search done by eodag_prods
+    :param poly: WKT of the search geometry
+    :return: dictionary of search_all parameters
+    """
     max_items = 500
     if cloud_cover is None:
-        products = dag.search_all(
+        return dict(
             productType=product_type,
             start=start_date,
             end=end_date,
             geom=poly,
             items_per_page=max_items,
         )
-    elif product_type == "LANDSAT_C2L2_SR":
-        products = dag.search_all(
+    if product_type == "LANDSAT_C2L2_SR":
+        return dict(
             productType=product_type,
             geom=poly,
             start=start_date,
@@ -52,47 +151,182 @@ def eodag_prods(
             platformSerialIdentifier="LANDSAT_8",
             cloudCover=cloud_cover,
         )
+    return dict(
+        productType=product_type,
+        start=start_date,
+        end=end_date,
+        geom=poly,
+        items_per_page=max_items,
+        cloudCover=cloud_cover,
+    )
 
-    else:
-        products = dag.search_all(
-            productType=product_type,
-            start=start_date,
-            end=end_date,
-            geom=poly,
-            items_per_page=max_items,
-            cloudCover=cloud_cover,
-        )
+
+def get_search_key(provider, search_kwargs):
+    """
+    Get the key of an eodag search (search cache and prefetched products)
+    :param provider: eodag provider
+    :param search_kwargs: search parameters (see get_search_kwargs)
+    """
+    return SearchCache.get_key(provider=provider, **search_kwargs)
+
+
+def search_prods(provider, creds, search_kwargs):
+    """
+    Search products with eodag, or read them from the search cache
+    :param provider: eodag provider
+    :param creds: eodag configuration file
+    :param search_kwargs: search parameters (see get_search_kwargs)
+    """
+    key = get_search_key(provider, search_kwargs)
+    if _search_cache is not None:
+        products = _search_cache.get(key)
+        if products is not None:
+            _logger.debug(
+                "%s %s products read from the cache", len(products), search_kwargs["productType"]
+            )
+            count_call("search_cache")
+            return products
+
+    start = time.perf_counter()
+    products = run_blocking(
+        provider,
+        [
+            lambda: get_transport().call(
+                "search",
+                key,
+                lambda: get_eodag_gateway(creds, provider).search_all(**search_kwargs),
+                encode=products_to_records,
+                decode=records_to_products,
+            )
+        ],
+    )[0]
+    add_provider_time(provider, time.perf_counter() - start)
+
+    # Empty results are not stored, they may come from a provider failure
+    if _search_cache is not None and len(products) > 0:
+        _search_cache.put(key, products)
 
     return products
 
 
+def prefetch_eodag_prods(
+        tiles, start_date, end_date, provider, product_type, creds, cloud_cover=None,
+        tile_id_property=None
+):
+    """
+    Search the products of several tiles at once, over their bounding box, and
+    dispatch them to the tiles: the next eodag_prods calls of these tiles return
+    the same products as a search over each tile, without searching again
+    :param tiles: dictionary of tile id and tile GeoDataFrame (as given to eodag_prods)
+    :param tile_id_property: property of the S2 product id, products are dispatched
+        by tile id if given, by footprint intersection otherwise
+    :return: number of products found
+    """
+    from shapely.geometry import box
+    from shapely.wkt import dumps
+
+    geometries = {tile_id: df.geometry[0] for tile_id, df in tiles.items()}
+    bounds = [geometry.bounds for geometry in geometries.values()]
+    region = box(
+        min(bound[0] for bound in bounds),
+        min(bound[1] for bound in bounds),
+        max(bound[2] for bound in bounds),
+        max(bound[3] for bound in bounds),
+    )
+    products = search_prods(
+        provider,
+        creds,
+        get_search_kwargs(dumps(region), start_date, end_date, product_type, cloud_cover),
+    )
+    for tile_id, geometry in geometries.items():
+        if tile_id_property is None:
+            tile_products = [product for product in products if product.geometry.intersects(geometry)]
+        else:
+            tile_products = [
+                product for product in products if tile_id in product.properties[tile_id_property]
+            ]
+        search_kwargs = get_search_kwargs(
+            dumps(geometry), start_date, end_date, product_type, cloud_cover
+        )
+        with _prefetched_lock:
+            _prefetched[get_search_key(provider, search_kwargs)] = tile_products
+    _logger.debug(
+        "%s %s products found for %s tiles", len(products), product_type, len(tiles)
+    )
+    return len(products)
+
+
+def clear_prefetched_prods():
+    """
+    Remove the prefetched products that were not used
+    :return: number of tiles searches removed
+    """
+    with _prefetched_lock:
+        nb_searches = len(_prefetched)
+        _prefetched.clear()
+    return nb_searches
+
+
+def eodag_prods(
+        df, start_date, end_date, provider, product_type, creds, cloud_cover=None
+):
+    from shapely.wkt import dumps
+
+    search_kwargs = get_search_kwargs(
+        dumps(df.geometry[0]), start_date, end_date, product_type, cloud_cover
+    )
+    if _prefetched:
+        with _prefetched_lock:
+            products = _prefetched.pop(get_search_key(provider, search_kwargs), None)
+        if products is not None:
+            count_call("search_prefetched")
+            return products
+
+    return search_prods(provider, creds, search_kwargs)
+
+
 def is_descending(s1_product, provider):
     if provider.lower() == "creodias":
         if s1_product.properties["orbitDirection"] == "descending":
             return True
     else:
-        manifest_key = os.path.split(s1_product.assets["vv"]["href"])[0].replace(
-            "measurement", "manifest.safe"
+        return get_transport().call(
+            "is_descending",
+            s1_product.properties["id"],
+            lambda: is_descending_from_manifest(s1_product),
         )
-        bucket = "sentinel-s1-l1c"
-        key = manifest_key.replace("s3://sentinel-s1-l1c/", "")
-        s3_client = boto3.client("s3")
-        try:
-            obj = s3_client.get_object(Bucket=bucket, Key=key, RequestPayer="requester")
-            xml_string = obj["Body"].read()
-            tree = et.ElementTree(et.fromstring(xml_string))
-            root = tree.getroot()
-            orbit = root.iter("{http://www.esa.int/safe/sentinel-1.0/sentinel-1}pass")
-            orbit = list(orbit)[0]
-            if orbit.text == "ASCENDING":
-                return False
-            else:
-                return True
-        except RuntimeError:
-            _logger.error("Could not determine orbit direction")
+
+
+def is_descending_from_manifest(s1_product):
+    """
+    Read the orbit direction of a S1 product in its manifest (sentinel-s1-l1c bucket)
+    :param s1_product: S1 product with a vv asset
+    """
+    manifest_key = os.path.split(s1_product.assets["vv"]["href"])[0].replace(
+        "measurement", "manifest.safe"
+    )
+    bucket = "sentinel-s1-l1c"
+    key = manifest_key.replace("s3://sentinel-s1-l1c/", "")
+    # One client shared by all the threads
+    s3_client = get_s3_client(bucket)
+    try:
+        obj = s3_client.get_object(Bucket=bucket, Key=key, RequestPayer="requester")
+        xml_string = obj["Body"].read()
+        tree = et.ElementTree(et.fromstring(xml_string))
+        root = tree.getroot()
+        orbit = root.iter("{http://www.esa.int/safe/sentinel-1.0/sentinel-1}pass")
+        orbit = list(orbit)[0]
+        if orbit.text == "ASCENDING":
+            return False
+        else:
+            return True
+    except RuntimeError:
+        _logger.error("Could not determine orbit direction")
 
 
 def is_valid_sar(s1_product, provider):
+    from ewoc_dag.eo_prd_id.s1_prd_id import S1PrdIdInfo
+
     # Get some info from the eoproduct propeties
     pid = s1_product.properties["id"]
     if provider == 'creodias':
@@ -118,12 +352,25 @@ def is_valid_sar(s1_product, provider):
 def sort_sar_products(s1_products, provider):
     ascending = []
     descending = []
+    valid_products = []
     for s1_product in s1_products:
         if is_valid_sar(s1_product, provider):
-            if is_descending(s1_product, provider):
-                descending.append(s1_product)
-            else:
-                ascending.append(s1_product)
+            valid_products.append(s1_product)
+        else:
+            count_discarded("invalid_sar", 1)
+    if provider.lower() == "creodias":
+        orbits = [is_descending(s1_product, provider) for s1_product in valid_products]
+    else:
+        # The manifests are read concurrently with the engine
+        orbits = run_blocking(
+            "sentinel-s1-l1c",
+            [partial(is_descending, s1_product, provider) for s1_product in valid_products],
+        )
+    for s1_product, descending_orbit in zip(valid_products, orbits):
+        if descending_orbit:
+            descending.append(s1_product)
+        else:
+            ascending.append(s1_product)
     return descending, ascending
 
 
@@ -224,6 +471,47 @@ def remove_duplicates(prd_list_ids: List) -> List:
         res.append(pids_list[-1])
     return res
 
+
+def merge_s1_ids(s1_ids: List, new_s1_ids: List) -> List:
+    """
+    Merge S1 products grouped by acquisition date
+    :param s1_ids: List of groups of S1 ids of a workplan
+    :param new_s1_ids: List of groups of S1 ids to add
+    """
+    dic = {}
+    for pid in (pid for group in s1_ids + new_s1_ids for pid in group):
+        date = re.split("_|T", pid)[4]
+        if pid not in dic.setdefault(date, []):
+            dic[date].append(pid)
+    return list(dic.values())
+
+
+def merge_s2_ids(s2_ids: List, new_s2_ids: List) -> List:
+    """
+    Merge S2 products ([provider, id]), keeping the most recent reprocessing
+    :param s2_ids: List of S2 products of a workplan
+    :param new_s2_ids: List of S2 products to add
+    """
+    s2_prds = {}
+    for provider, pid in s2_ids + new_s2_ids:
+        s2_prds.setdefault(pid, [provider, pid])
+    kept = set(remove_duplicates(list(s2_prds)))
+    return [s2_prd for pid, s2_prd in s2_prds.items() if pid in kept]
+
+
+def merge_l8_ids(l8_ids: List, new_l8_ids: List) -> List:
+    """
+    Merge L8 products grouped by path and acquisition date
+    :param l8_ids: List of groups of L8 ids of a workplan
+    :param new_l8_ids: List of groups of L8 ids to add
+    """
+    dic = {}
+    for pid in (pid for group in l8_ids + new_l8_ids for pid in group):
+        key = pid.split("_")[2][:3] + pid.split("_")[3]
+        if pid not in dic.setdefault(key, []):
+            dic[key].append(pid)
+    return list(dic.values())
+
 class MutuallyExclusiveOption(Option):
     def __init__(self, *args, **kwargs):
         self.mutually_exclusive = set(kwargs.pop('mutually_exclusive', []))
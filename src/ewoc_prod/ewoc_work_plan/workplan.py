@@ -1,28 +1,140 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+import copy
 import csv
 from datetime import datetime
 import json
 import logging
 import re
 
-from eotile import eotile_module
-import geopandas as gpd
-from shapely.wkt import dumps
-
 from ewoc_prod import __version__
+from .engine import run_blocking
 from .remote.landsat_cloud_mask import Landsat_Cloud_Mask
 from .reproc import reproc_wp
-from .s2prods import run_multiple_cross_provider
+from .s2prods import S2_SEARCHES, STAC_UNRELIABLE_TILES, run_multiple_cross_provider
+from .stats import collect_stats, count_discarded
+from .tile_index import get_s2_tile, get_s2_tile_index, get_s2_tiles
 from .utils import (
+    EODAG_L8_PROVIDER,
     eodag_prods,
     get_path_row,
     greatest_timedelta,
+    merge_l8_ids,
+    merge_s1_ids,
+    merge_s2_ids,
+    prefetch_eodag_prods,
     sort_sar_products,
 )
 
 logger = logging.getLogger(__name__)
 
+# eodag product type of each S1 provider
+S1_PRODUCT_TYPES = {
+    "peps": "S1_SAR_GRD",
+    "astraea_eod": "sentinel1_l1c_grd",
+    "creodias": "S1_SAR_GRD",
+}
+
+
+def cluster_tiles(tile_ids, cell_size=5.0):
+    """
+    Group S2 tiles by cells of the lat/lon grid (tile centroid)
+    Tiles larger than a cell (crossing the antimeridian) are not grouped
+    :param tile_ids: list of S2 tiles
+    :param cell_size: size of the cells in degrees
+    :return: list of dictionaries of tile id and tile GeoDataFrame
+    """
+    clusters = {}
+    for tile_id, s2_tile in zip(tile_ids, get_s2_tiles(tile_ids)):
+        geometry = s2_tile.geometry[0]
+        min_x, _, max_x, _ = geometry.bounds
+        if max_x - min_x > cell_size:
+            continue
+        cell = (
+            int(geometry.centroid.x // cell_size),
+            int(geometry.centroid.y // cell_size),
+        )
+        clusters.setdefault(cell, {})[tile_id] = s2_tile
+    return list(clusters.values())
+
+
+def prefetch_searches(
+    tile_ids,
+    wp_processing_start,
+    wp_processing_end,
+    s1_data_provider,
+    s2_data_provider,
+    strategy,
+    eodag_config_filepath=None,
+    cloudcover=90,
+    only_s2=False,
+    only_s1=False,
+    only_l8=False,
+    cell_size=5.0,
+):
+    """
+    Search the products of tiles with the same processing dates once per cluster
+    of tiles and provider instead of once per tile, the WorkPlan of these tiles
+    then use them (same products as the searches per tile)
+    S2 products are dispatched to the tiles with their id, S1 and L8 products
+    with their footprint
+    :param tile_ids: list of S2 tiles
+    :param cell_size: size of the clusters in degrees
+    :return: number of searches done
+    """
+    searches = []
+    if not only_s2 and not only_l8:
+        searches.append((s1_data_provider, S1_PRODUCT_TYPES[s1_data_provider], None, None, ()))
+    if not only_s1 and not only_l8:
+        for provider, level in dict.fromkeys(zip(s2_data_provider, strategy)):
+            if (provider, level) in S2_SEARCHES:
+                eodag_provider, product_type, tile_id_property = S2_SEARCHES[(provider, level)]
+                # Tiles read from the buckets are not searched with eodag for aws_sng
+                skipped_tiles = (
+                    tuple(STAC_UNRELIABLE_TILES) if provider == "aws_sng" else ()
+                )
+                searches.append(
+                    (eodag_provider, product_type, 100, tile_id_property, skipped_tiles)
+                )
+    if not only_s1 and not only_s2:
+        searches.append((EODAG_L8_PROVIDER, "LANDSAT_C2L2_SR", cloudcover, None, ()))
+
+    nb_searches = 0
+    for tiles in cluster_tiles(tile_ids, cell_size=cell_size):
+        for provider, product_type, cloud_cover, tile_id_property, skipped_tiles in searches:
+            cluster = {
+                tile_id: s2_tile
+                for tile_id, s2_tile in tiles.items()
+                if tile_id not in skipped_tiles
+            }
+            if not cluster:
+                continue
+            prefetch_eodag_prods(
+                cluster,
+                wp_processing_start,
+                wp_processing_end,
+                provider,
+                product_type,
+                eodag_config_filepath,
+                cloud_cover=cloud_cover,
+                tile_id_property=tile_id_property,
+            )
+            nb_searches += 1
+    logger.info(
+        "%s searches done for %s tiles instead of %s",
+        nb_searches,
+        len(tile_ids),
+        len(tile_ids) * len(searches),
+    )
+    return nb_searches
+
 
 class WorkPlan:
+    # Search of the S2 providers (see run_multiple_cross_provider), also used by
+    # the workplans created by extend and reproc
+    _s2_fan_out = False
+    _s2_provider_timeout = None
+
     def __init__(
         self,
         tile_ids,
@@ -47,9 +159,16 @@ class WorkPlan:
         only_s2=False,
         only_s1=False,
         only_l8=False,
+        max_workers=1,
+        stats=False,
+        s2_fan_out=False,
+        s2_provider_timeout=None,
     ) -> None:
+        from shapely.wkt import dumps
 
         self._cloudcover = cloudcover
+        self._s2_fan_out = s2_fan_out
+        self._s2_provider_timeout = s2_provider_timeout
         self.strategy = strategy
         if s1_data_provider not in ["creodias", "astraea_eod"]:
             raise ValueError(f"Incorrect s1 data provider: {s1_data_provider}")
@@ -84,7 +203,7 @@ class WorkPlan:
         self._plan["s1_provider"] = s1_data_provider
         self._plan["s2_provider"] = s2_data_provider
         # Only L8 C2L2 provider supported for now is aws usgs
-        self._plan["l8_provider"] = "usgs_satapi_aws"
+        self._plan["l8_provider"] = EODAG_L8_PROVIDER
         self._plan["yearly_prd_threshold"] = min_nb_prods
         self._plan["rm_l1c"] = rm_l1c
         self._plan["only_s2"] = only_s2
@@ -93,80 +212,191 @@ class WorkPlan:
         # Addind tiles
         tiles_plan = list()
 
-        for i, tile_id in enumerate(tile_ids):
-            tile_plan = dict()
-            tile_plan["tile_id"] = tile_id
-            s2_tile = eotile_module.main(tile_id)[0]
-            s1_prd_ids = []
-            s2_prd_ids = []
-            l8_prd_ids = []
-
-            if only_s1:
-                s1_prd_ids, orbit_dir = self._identify_s1(
-                    s2_tile, orbit_dir=orbit_dir, eodag_config_filepath=eodag_config_filepath
-                )
-            elif only_s2:
-                s2_prd_ids = self._identify_s2(
-                    tile_id, s2_tile, eodag_config_filepath=eodag_config_filepath, rm_l1c=rm_l1c
-                )
-            elif only_l8:
-                l8_prd_ids = self._identify_l8(
-                    s2_tile, l8_sr=l8_sr, eodag_config_filepath=eodag_config_filepath
-                )
-            else:
-                s1_prd_ids, orbit_dir = self._identify_s1(
-                    s2_tile, orbit_dir=orbit_dir, eodag_config_filepath=eodag_config_filepath
-                )
-                s2_prd_ids = self._identify_s2(
-                    tile_id, s2_tile, eodag_config_filepath=eodag_config_filepath, rm_l1c=rm_l1c
-                )
-                l8_prd_ids = self._identify_l8(
-                    s2_tile, l8_sr=l8_sr, eodag_config_filepath=eodag_config_filepath
-                )
-            tile_plan["s1_ids"] = s1_prd_ids
-            tile_plan["s1_orbit_dir"] = orbit_dir
-            tile_plan["s1_nb"] = len(s1_prd_ids)
-            tile_plan["s2_ids"] = s2_prd_ids
-            tile_plan["s2_nb"] = len(s2_prd_ids)
-            tile_plan["l8_ids"] = l8_prd_ids
-            tile_plan["l8_nb"] = len(l8_prd_ids)
-            tile_plan["geometry"] = dumps(s2_tile.iloc[0]["geometry"])
-            tile_plan["epsg"] = "epsg:4326"
-            if isinstance(l8_sr, list) and len(l8_sr) == len(tile_ids):
-                tile_plan["l8_enable_sr"] = l8_sr[i]
-            elif isinstance(l8_sr, list):
-                logger.error("Input l8_sr should be of size %s", len(tile_ids))
-                raise ValueError(f"Input l8_sr should be of size {len(tile_ids)}")
-            else:
-                tile_plan["l8_enable_sr"] = l8_sr
-
-            if len(s2_prd_ids) == 0 and not only_s1 and not only_l8:
-                logger.critical("No relevant S2 product found for %s", tile_id)
-                raise ValueError(f"No relevant S2 product found for {tile_id}")
-            if len(s1_prd_ids) == 0 and not only_s2 and not only_l8:
-                logger.error("No relevant S1 product found for %s", tile_id)
-            if len(l8_prd_ids) == 0 and not only_s2 and not only_s1:
-                logger.warning("No relevant L8 product found for %s", tile_id)
+        if only_s1:
+            sensors = ("s1",)
+        elif only_s2:
+            sensors = ("s2",)
+        elif only_l8:
+            sensors = ("l8",)
+        else:
+            sensors = ("s1", "s2", "l8")
+        identified_tiles = self._identify_tiles(
+            tile_ids,
+            sensors,
+            orbit_dir=orbit_dir,
+            l8_sr=l8_sr,
+            eodag_config_filepath=eodag_config_filepath,
+            rm_l1c=rm_l1c,
+            max_workers=max_workers,
+        )
 
-            tiles_plan.append(tile_plan)
+        with closing(identified_tiles):
+            for i, (tile_id, identified_tile) in enumerate(zip(tile_ids, identified_tiles)):
+                s2_tile, s1_prd_ids, orbit_dir, s2_prd_ids, l8_prd_ids, tile_stats = identified_tile
+                tile_plan = dict()
+                tile_plan["tile_id"] = tile_id
+                tile_plan["s1_ids"] = s1_prd_ids
+                tile_plan["s1_orbit_dir"] = orbit_dir
+                tile_plan["s1_nb"] = len(s1_prd_ids)
+                tile_plan["s2_ids"] = s2_prd_ids
+                tile_plan["s2_nb"] = len(s2_prd_ids)
+                tile_plan["l8_ids"] = l8_prd_ids
+                tile_plan["l8_nb"] = len(l8_prd_ids)
+                tile_plan["geometry"] = dumps(s2_tile.iloc[0]["geometry"])
+                tile_plan["epsg"] = "epsg:4326"
+                if isinstance(l8_sr, list) and len(l8_sr) == len(tile_ids):
+                    tile_plan["l8_enable_sr"] = l8_sr[i]
+                elif isinstance(l8_sr, list):
+                    logger.error("Input l8_sr should be of size %s", len(tile_ids))
+                    raise ValueError(f"Input l8_sr should be of size {len(tile_ids)}")
+                else:
+                    tile_plan["l8_enable_sr"] = l8_sr
+                if stats:
+                    tile_plan["_stats"] = tile_stats
+
+                if len(s2_prd_ids) == 0 and not only_s1 and not only_l8:
+                    logger.critical("No relevant S2 product found for %s", tile_id)
+                    raise ValueError(f"No relevant S2 product found for {tile_id}")
+                if len(s1_prd_ids) == 0 and not only_s2 and not only_l8:
+                    logger.error("No relevant S1 product found for %s", tile_id)
+                if len(l8_prd_ids) == 0 and not only_s2 and not only_s1:
+                    logger.warning("No relevant L8 product found for %s", tile_id)
+
+                tiles_plan.append(tile_plan)
 
         self._plan["tiles"] = tiles_plan
 
     def __str__(self):
         return json.dumps(self._plan, indent=4, sort_keys=False)
 
+    def _identify_tiles(
+        self,
+        tile_ids,
+        sensors,
+        orbit_dir=None,
+        l8_sr=False,
+        eodag_config_filepath=None,
+        rm_l1c=None,
+        max_workers=1,
+    ):
+        """
+        Identify the products of each tile, tile by tile or concurrently
+        The orbit direction selected for a tile is forced for the next ones, so in
+        concurrent mode the S1 identification of the first tile is done before
+        the S1 identification of the other tiles (S2 and L8 run meanwhile)
+        :param tile_ids: list of S2 tiles
+        :param sensors: sensors to identify ("s1", "s2", "l8")
+        :param orbit_dir: forced S1 orbit direction (ASC/DES) or None
+        :param max_workers: maximum number of identifications running at the same time
+        :return: generator of (s2 tile, s1 ids, s1 orbit dir, s2 ids, l8 ids, stats per
+            sensor), in tile order
+        """
+        if max_workers <= 1:
+            for tile_id in tile_ids:
+                s2_tile = get_s2_tile(tile_id)
+                s1_prd_ids, s2_prd_ids, l8_prd_ids = [], [], []
+                tile_stats = {}
+                if "s1" in sensors:
+                    (s1_prd_ids, orbit_dir), tile_stats["s1"] = self._with_stats(
+                        self._identify_s1,
+                        s2_tile,
+                        orbit_dir=orbit_dir,
+                        eodag_config_filepath=eodag_config_filepath,
+                    )
+                if "s2" in sensors:
+                    s2_prd_ids, tile_stats["s2"] = self._with_stats(
+                        self._identify_s2,
+                        tile_id,
+                        s2_tile,
+                        eodag_config_filepath=eodag_config_filepath,
+                        rm_l1c=rm_l1c,
+                    )
+                if "l8" in sensors:
+                    l8_prd_ids, tile_stats["l8"] = self._with_stats(
+                        self._identify_l8,
+                        s2_tile,
+                        l8_sr=l8_sr,
+                        eodag_config_filepath=eodag_config_filepath,
+                    )
+                yield s2_tile, s1_prd_ids, orbit_dir, s2_prd_ids, l8_prd_ids, tile_stats
+            return
+
+        s2_tiles = get_s2_tiles(tile_ids)
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        s1_futures, s2_futures, l8_futures = {}, {}, {}
+        try:
+            if "s1" in sensors and tile_ids:
+                s1_futures[0] = executor.submit(
+                    self._with_stats,
+                    self._identify_s1,
+                    s2_tiles[0],
+                    orbit_dir=orbit_dir,
+                    eodag_config_filepath=eodag_config_filepath,
+                )
+            for i, tile_id in enumerate(tile_ids):
+                if "s2" in sensors:
+                    s2_futures[i] = executor.submit(
+                        self._with_stats,
+                        self._identify_s2,
+                        tile_id,
+                        s2_tiles[i],
+                        eodag_config_filepath=eodag_config_filepath,
+                        rm_l1c=rm_l1c,
+                    )
+                if "l8" in sensors:
+                    l8_futures[i] = executor.submit(
+                        self._with_stats,
+                        self._identify_l8,
+                        s2_tiles[i],
+                        l8_sr=l8_sr,
+                        eodag_config_filepath=eodag_config_filepath,
+                    )
+            if s1_futures and len(tile_ids) > 1:
+                # A forced orbit direction is kept, otherwise the first tile selects it
+                if orbit_dir not in ("ASC", "DES"):
+                    orbit_dir = s1_futures[0].result()[0][1]
+                for i in range(1, len(tile_ids)):
+                    s1_futures[i] = executor.submit(
+                        self._with_stats,
+                        self._identify_s1,
+                        s2_tiles[i],
+                        orbit_dir=orbit_dir,
+                        eodag_config_filepath=eodag_config_filepath,
+                    )
+            for i, s2_tile in enumerate(s2_tiles):
+                s1_prd_ids, tile_orbit_dir, s2_prd_ids, l8_prd_ids = [], orbit_dir, [], []
+                tile_stats = {}
+                if i in s1_futures:
+                    (s1_prd_ids, tile_orbit_dir), tile_stats["s1"] = s1_futures[i].result()
+                if i in s2_futures:
+                    s2_prd_ids, tile_stats["s2"] = s2_futures[i].result()
+                if i in l8_futures:
+                    l8_prd_ids, tile_stats["l8"] = l8_futures[i].result()
+                yield s2_tile, s1_prd_ids, tile_orbit_dir, s2_prd_ids, l8_prd_ids, tile_stats
+        finally:
+            for future in (*s1_futures.values(), *s2_futures.values(), *l8_futures.values()):
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    @staticmethod
+    def _with_stats(identify, *args, **kwargs):
+        """
+        Run the identification of a sensor and collect its stats (time, remote
+        calls, discarded products)
+        :param identify: _identify_s1, _identify_s2 or _identify_l8
+        :return: result of the identification and its stats
+        """
+        with collect_stats() as stats:
+            result = identify(*args, **kwargs)
+        return result, stats
+
     def _identify_s1(self, s2_tile, orbit_dir=None, eodag_config_filepath=None):
-        s1_prods_types = {
-            "peps": "S1_SAR_GRD",
-            "astraea_eod": "sentinel1_l1c_grd",
-            "creodias": "S1_SAR_GRD",
-        }
         s1_prods_request = eodag_prods(
             s2_tile,
             self._plan["wp_processing_start"],
             self._plan["wp_processing_end"],
             self._plan["s1_provider"],
-            s1_prods_types[self._plan["s1_provider"]],
+            S1_PRODUCT_TYPES[self._plan["s1_provider"]],
             eodag_config_filepath,
         )
         # filter out undesirable products
@@ -177,9 +407,11 @@ class WorkPlan:
         if orbit_dir == 'ASC':
             logger.info("The orbit direction is forced to ASC")
             s1_prods = s1_prods_asc
+            count_discarded("orbit_dir", len(s1_prods_desc))
         elif orbit_dir == 'DES':
             logger.info("The orbit direction is forced to DES")
             s1_prods = s1_prods_desc
+            count_discarded("orbit_dir", len(s1_prods_asc))
         else:
             logger.debug("ASCENDING:")
             td_asc = greatest_timedelta(
@@ -203,10 +435,12 @@ class WorkPlan:
                 logger.info("Descending products where selected due to their repartition")
                 s1_prods = s1_prods_desc
                 orbit_dir = "DES"
+                count_discarded("orbit_dir", len(s1_prods_asc))
             else:
                 logger.info("Ascending products where selected due to their repartition")
                 s1_prods = s1_prods_asc
                 orbit_dir = "ASC"
+                count_discarded("orbit_dir", len(s1_prods_desc))
 
         # Group by same acquisition date
         dic = {}
@@ -232,6 +466,8 @@ class WorkPlan:
             providers=self._plan["s2_provider"],
             strategy=self.strategy,
             rm_l1c = rm_l1c,
+            fan_out=self._s2_fan_out,
+            provider_timeout=self._s2_provider_timeout,
         )
         return s2_prods_ids
 
@@ -251,33 +487,45 @@ class WorkPlan:
         logger.debug(l8_prods)
 
         # Filter with land cloud cover
+        nb_prods = len(l8_prods)
         l8_prods = [prod for prod in l8_prods if
                 (prod.properties['landsat:cloud_cover_land']!=-1) and (prod.properties['landsat:cloud_cover_land']<=self._cloudcover)]
 
         logger.debug("Found %s result(s) after land cloud cover filtering", len(l8_prods))
+        count_discarded("cloud_cover", nb_prods - len(l8_prods))
 
         # Remove L2SR products
+        nb_prods = len(l8_prods)
         l8_prods = [prod for prod in l8_prods if
                 (prod.properties['landsat:correction']!='L2SR')]
+        count_discarded("l2sr", nb_prods - len(l8_prods))
 
         logger.debug("Found %s result(s) after L2SR filtering", len(l8_prods))
 
-        # Group by same path & date
-        dic = {}
-        for l8_prod in l8_prods:
-            # Prevent LE07 and LC09 to be randomly included
-            if l8_prod.properties["id"][:4] != 'LC08':
-                continue
+        # Prevent LE07 and LC09 to be randomly included
+        nb_prods = len(l8_prods)
+        l8_prods = [prod for prod in l8_prods if prod.properties["id"][:4] == 'LC08']
+        count_discarded("not_lc08", nb_prods - len(l8_prods))
 
+        keys, l8_masks = [], []
+        for l8_prod in l8_prods:
             date = (
                 l8_prod.properties["startTimeFromAscendingNode"]
                 .split("T")[0]
                 .replace("-", "")
             )
             path, row = get_path_row(l8_prod, self._plan["l8_provider"].lower())
-            key = path + date
-            l8_mask = Landsat_Cloud_Mask(path, row, date)
-            if l8_mask.mask_exists():
+            keys.append(path + date)
+            l8_masks.append(Landsat_Cloud_Mask(path, row, date))
+        # The cloud masks are checked concurrently with the engine
+        masks_exist = run_blocking(
+            "usgs-landsat", [l8_mask.mask_exists for l8_mask in l8_masks]
+        )
+
+        # Group by same path & date
+        dic = {}
+        for l8_prod, key, mask_exists in zip(l8_prods, keys, masks_exist):
+            if mask_exists:
                 l8_id = l8_prod.properties["id"]
                 if l8_id.endswith("_SR"):
                     l8_id = l8_id[:-3]
@@ -288,6 +536,7 @@ class WorkPlan:
                     dic[key] = [l8_id]
             else:
                 logger.warning("Missing product %s", l8_prod.properties["id"])
+                count_discarded("missing_mask", 1)
 
         return list(dic.values())
 
@@ -316,6 +565,8 @@ class WorkPlan:
         only_s1=False,
         only_l8=False,
     ):
+        import geopandas as gpd
+
         supported_format = [".shp", ".geojson", ".gpkg"]
         if aoi_filepath.suffix in supported_format:
             # Vector file to get bbox
@@ -323,10 +574,10 @@ class WorkPlan:
             # Re-project geometry if needed
             if geometries.crs.to_epsg() != 4326:
                 geometries = geometries.to_crs(4326)
+            s2_tile_index = get_s2_tile_index()
             s2_tiles = []
             for geometry in geometries.geometry:
-                current_s2_tiles = eotile_module.main(str(geometry))[0]
-                for s2_tile in current_s2_tiles["id"]:
+                for s2_tile in s2_tile_index.query(geometry):
                     if s2_tile not in s2_tiles:
                         s2_tiles.append(s2_tile)
             return WorkPlan(
@@ -429,3 +680,90 @@ class WorkPlan:
         new_wp = WorkPlan.__new__(WorkPlan)
         new_wp._plan = reproc_wp(bucket, self._plan, path)
         return new_wp
+
+    def extend(
+        self,
+        wp_processing_end,
+        strategy=None,
+        eodag_config_filepath=None,
+        cloudcover=90,
+    ):
+        """
+        Extend the workplan to a later processing end date
+        Only the products between the current and the new end dates are searched,
+        then they are merged with the products of the workplan (same grouping by
+        date for S1, by path and date for L8, latest reprocessing for S2). The S1
+        orbit direction of each tile is kept.
+        :param wp_processing_end: New workplan processing end date, format YYYY-mm-dd
+        :param strategy: Fusion strategy of the S2 providers (L2A for each one by default)
+        :param eodag_config_filepath: Path to the eodag yml config file
+        :param cloudcover: Cloudcover parameter
+        :return: Extended WorkPlan
+        """
+        current_end = self._plan["wp_processing_end"]
+        if wp_processing_end <= current_end:
+            raise ValueError(
+                f"New processing end date {wp_processing_end} must be after {current_end}"
+            )
+        new_wp = WorkPlan.__new__(WorkPlan)
+        new_wp._cloudcover = cloudcover
+        new_wp.strategy = strategy or ["L2A"] * len(self._plan["s2_provider"])
+        # Search window of the new products, the current end date is searched again
+        # since products of this day may be missing
+        new_wp._plan = copy.deepcopy(self._plan)
+        new_wp._plan["wp_processing_start"] = current_end
+        new_wp._plan["wp_processing_end"] = wp_processing_end
+
+        only_s2 = self._plan.get("only_s2", False)
+        only_s1 = self._plan.get("only_s1", False)
+        only_l8 = self._plan.get("only_l8", False)
+        for tile_plan in new_wp._plan["tiles"]:
+            tile_id = tile_plan["tile_id"]
+            s2_tile = get_s2_tile(tile_id)
+            # Stats of the extension replace the ones of the generation
+            tile_stats = {}
+            if not only_s2 and not only_l8:
+                (s1_prd_ids, tile_plan["s1_orbit_dir"]), tile_stats["s1"] = new_wp._with_stats(
+                    new_wp._identify_s1,
+                    s2_tile,
+                    orbit_dir=tile_plan["s1_orbit_dir"],
+                    eodag_config_filepath=eodag_config_filepath,
+                )
+                tile_plan["s1_ids"] = merge_s1_ids(tile_plan["s1_ids"], s1_prd_ids)
+                tile_plan["s1_nb"] = len(tile_plan["s1_ids"])
+            if not only_s1 and not only_l8:
+                s2_prd_ids, tile_stats["s2"] = new_wp._with_stats(
+                    new_wp._identify_s2,
+                    tile_id,
+                    s2_tile,
+                    eodag_config_filepath=eodag_config_filepath,
+                    rm_l1c=self._plan.get("rm_l1c"),
+                )
+                tile_plan["s2_ids"] = merge_s2_ids(tile_plan["s2_ids"], s2_prd_ids)
+                tile_plan["s2_nb"] = len(tile_plan["s2_ids"])
+            if not only_s1 and not only_s2:
+                l8_prd_ids, tile_stats["l8"] = new_wp._with_stats(
+                    new_wp._identify_l8,
+                    s2_tile,
+                    l8_sr=tile_plan["l8_enable_sr"],
+                    eodag_config_filepath=eodag_config_filepath,
+                )
+                tile_plan["l8_ids"] = merge_l8_ids(tile_plan["l8_ids"], l8_prd_ids)
+                tile_plan["l8_nb"] = len(tile_plan["l8_ids"])
+            if "_stats" in tile_plan:
+                tile_plan["_stats"] = tile_stats
+            logger.info(
+                "Tile %s extended to %s: %s S1, %s S2, %s L8 products",
+                tile_id,
+                wp_processing_end,
+                tile_plan["s1_nb"],
+                tile_plan["s2_nb"],
+                tile_plan["l8_nb"],
+            )
+
+        new_wp._plan["wp_processing_start"] = self._plan["wp_processing_start"]
+        new_wp._plan["version"] = str(__version__)
+        new_wp._plan["generated"] = (
+            datetime.now().astimezone().strftime("%Y-%m-%d %H:%M:%S %Z")
+        )
+        return new_wp
@@ -20,10 +20,10 @@ import time
 from collections import defaultdict
 from datetime import datetime
 from itertools import repeat
-from osgeo import ogr
 from pathlib import Path
 from typing import List
 
+from ewoc_prod.aez_tile_catalog import AezTileCatalog
 from ewoc_prod.tiles_2_workplan import ewoc_s3_upload
 
 _logger = logging.getLogger(__name__)
@@ -113,21 +113,11 @@ def main(args: List[str])->None:
     args = parse_args(args)
     setup_logging(args.loglevel)
 
-    # Open geojson
-    driver = ogr.GetDriverByName('GeoJSON')
-    data_source = driver.Open(args.input_file, 1)
-    tiles_layer = data_source.GetLayer()
-
-    # Apply filter
-    tiles_layer.SetAttributeFilter(f"zoneID = {args.aez_id}")
+    # Load the MGRS/AEZ grid (from its cache when up to date)
+    aez_catalog = AezTileCatalog.from_file(args.input_file)
 
     # List tiles
-    tiles_id = []
-    for tile in tiles_layer:
-        tiles_id.append(tile.GetField('tile'))
-
-    # Remove filter
-    tiles_layer.SetAttributeFilter(None)
+    tiles_id = [tile.tile_id for tile in aez_catalog.get_aez_tiles(args.aez_id)]
 
     # Create log folder
     # log_directory = pa.join(args.output_path, str(int(args.aez_id)), 'log')
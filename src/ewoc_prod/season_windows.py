@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+'''
+:author: Marjorie Battude <marjorie.battude@csgroup.eu>
+:organization: CS Group
+:copyright: 2023 CS Group. All rights reserved.
+:license: see LICENSE file
+:created: 2023
+'''
+
+import csv
+import logging
+from datetime import date
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+import numpy as np
+
+from ewoc_prod.aez_tile_catalog import AezTileCatalog
+from ewoc_prod.utils import conversion_doy_to_datetime64
+
+logger = logging.getLogger(__name__)
+
+# Start/end fields of each season type
+SEASON_FIELDS = {
+    'winter': ('wwsos_min', 'wweos_max'),
+    'summer1': ('m1sos_min', 'm1eos_max'),
+    'summer2': ('m2sos_min', 'm2eos_max'),
+}
+
+# Buffer (days) added before crop emergence
+SEASON_BUFFERS = {
+    'winter': 15,
+    'summer1': 15,
+    'summer2': 15,
+}
+
+# Dates computed for each tile by compute_season_windows
+WINDOW_KEYS = ('season_start', 'season_end',
+               'season_processing_start', 'season_processing_end',
+               'annual_processing_start', 'annual_processing_end',
+               'wp_processing_start', 'wp_processing_end')
+
+# AEZ with a summer2 season ending on the 1st of January
+METASEASON_M2_END_AEZ = 19093
+
+# Columns of the metaseason table file
+METASEASON_TABLE_HEADER = ('tile', 'year', 'wp_processing_start', 'wp_processing_end', 'm2_exists')
+
+MetaseasonTable = Dict[Tuple[str, int], Tuple[date, date, int]]
+
+def to_doy_array(values: Iterable, field_name: str = 'doy')->np.ndarray:
+    """
+    Convert a column of day of year to integers (null values are not allowed)
+    :param values: days of year
+    :param field_name: field name used in the error message
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if np.isnan(values).any():
+        raise TypeError(f"Null value found in {field_name}")
+    return values.astype(np.int64)
+
+def shift_years(dates: np.ndarray, years: int)->np.ndarray:
+    """
+    Shift dates by a number of years, same rules as relativedelta(years=...)
+    (the day is clipped to the end of the month, e.g. 29/02 -> 28/02)
+    :param dates: dates (datetime64[D], NaT allowed)
+    :param years: number of years to add
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    months = dates.astype('datetime64[M]')
+    days = (dates - months.astype('datetime64[D]')).astype(np.int64)
+    new_months = months + np.timedelta64(12 * years, 'M')
+    month_length = ((new_months + np.timedelta64(1, 'M')).astype('datetime64[D]') -
+                    new_months.astype('datetime64[D]')).astype(np.int64)
+    return new_months.astype('datetime64[D]') + np.minimum(days, month_length - 1)
+
+def to_bool_array(values: Iterable, field_name: str)->np.ndarray:
+    """
+    Convert a 0/1 field to booleans
+    :param values: field values
+    :param field_name: field name used in the error message
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not np.isin(values, (0, 1)).all():
+        raise ValueError(f"{field_name} different than 0, 1 is not possible!")
+    return values == 1
+
+def datetime64_to_date(value: np.datetime64)->Optional[date]:
+    """
+    Convert a datetime64 to a date (None for NaT)
+    :param value: datetime64 value
+    """
+    if np.isnat(value):
+        return None
+    return value.astype('datetime64[D]').astype(date)
+
+def compute_season_windows(columns: Mapping[str, np.ndarray],
+                           season_type: str,
+                           prod_start_date: date)->Dict[str, np.ndarray]:
+    """
+    Compute the season windows of several tiles at once
+    Vectorized version of get_tiles_infos_from_tiles, dates are NaT when
+    the season does not exist for a tile (start and end doy equal to 0)
+    :param columns: grid fields (e.g. 'wwsos_min') for each tile
+    :param season_type: season type (winter, summer1, summer2)
+    :param prod_start_date: production start date
+    """
+    if season_type not in SEASON_FIELDS:
+        raise ValueError("Season type different than winter, summer1, summer2 is not possible!")
+    start_key, end_key = SEASON_FIELDS[season_type]
+    start_doy = to_doy_array(columns[start_key], start_key)
+    end_doy = to_doy_array(columns[end_key], end_key)
+    nb_tiles = len(start_doy)
+
+    #Get dates
+    windows = {key: np.full(nb_tiles, np.datetime64('NaT'), dtype='datetime64[D]')
+               for key in WINDOW_KEYS}
+    in_season = ~((start_doy == 0) & (end_doy == 0))
+    year = prod_start_date.year
+    year_start = np.where(start_doy > end_doy, year - 1, year)[in_season]
+    season_start = conversion_doy_to_datetime64(start_doy[in_season], year_start)
+    season_end = conversion_doy_to_datetime64(end_doy[in_season], year)
+    # The buffer is a shift in days, whatever the year of the processing start
+    season_processing_start = season_start - np.timedelta64(SEASON_BUFFERS[season_type], 'D')
+    annual_processing_start = shift_years(season_end, -1)
+    windows['season_start'][in_season] = season_start
+    windows['season_end'][in_season] = season_end
+    windows['season_processing_start'][in_season] = season_processing_start
+    windows['season_processing_end'][in_season] = season_end
+    windows['annual_processing_start'][in_season] = annual_processing_start
+    windows['annual_processing_end'][in_season] = season_end
+
+    #Get L8 and spring wheat info
+    l8_enable_sr = to_bool_array(columns['L8'], 'L8')
+    enable_sw = to_bool_array(columns['trigger_sw'], 'trigger_sw')
+
+    #Get detector_set
+    if season_type == 'winter':
+        detector_set = np.full(nb_tiles, 'winterwheat, irrigation', dtype=object)
+        with_cropland = np.zeros(nb_tiles, dtype=bool)
+    elif season_type == 'summer1':
+        m2_start_doy = to_doy_array(columns['m2sos_min'], 'm2sos_min')
+        m2_end_doy = to_doy_array(columns['m2eos_max'], 'm2eos_max')
+        with_cropland = (m2_start_doy == 0) & (m2_end_doy == 0)
+        detector_set = np.array(
+            [', '.join(['maize', 'irrigation'] +
+                       (['cropland'] if cropland else []) +
+                       (['springwheat'] if sw else []))
+             for cropland, sw in zip(with_cropland, enable_sw)], dtype=object)
+    else:
+        detector_set = np.full(nb_tiles, 'cropland, maize, irrigation', dtype=object)
+        with_cropland = np.ones(nb_tiles, dtype=bool)
+
+    #Get wp_processing_dates
+    windows['wp_processing_start'] = np.where(with_cropland,
+                                              windows['annual_processing_start'],
+                                              windows['season_processing_start'])
+    windows['wp_processing_end'] = np.where(with_cropland,
+                                            windows['annual_processing_end'],
+                                            windows['season_processing_end'])
+    windows['l8_enable_sr'] = l8_enable_sr
+    windows['enable_sw'] = enable_sw
+    windows['detector_set'] = detector_set
+    return windows
+
+def get_tiles_season_windows(aez_catalog: AezTileCatalog,
+                             tiles_id: Iterable[str],
+                             season_type: str,
+                             prod_start_date: date)->Dict[str, np.ndarray]:
+    """
+    Compute the season windows of tiles of the MGRS/AEZ grid
+    :param aez_catalog: MGRS grid that contains for each included tile
+        the associated aez information
+    :param tiles_id: list of s2 tiles
+    :param season_type: season type (winter, summer1, summer2)
+    :param prod_start_date: production start date
+    """
+    tiles_id = list(tiles_id)
+    windows = compute_season_windows(aez_catalog.get_columns(tiles_id),
+                                     season_type, prod_start_date)
+    windows['tile'] = np.array(tiles_id, dtype=object)
+    return windows
+
+def compute_metaseason_windows(columns: Mapping[str, np.ndarray],
+                               year: int)->Dict[str, np.ndarray]:
+    """
+    Compute the metaseason dates of several tiles at once
+    Vectorized version of retrieve_custom_dates_new_version, tiles with
+    inconsistent days of year (null or out of range) are flagged as not valid
+    and their dates are NaT
+    :param columns: grid fields (e.g. 'wwsos_min') for each tile
+    :param year: season to process (e.g. 2021 to process 2020/2021)
+    """
+    def get_doy(field_name):
+        values = columns.get(field_name)
+        if values is None:
+            return np.zeros(nb_tiles)
+        return np.asarray(values, dtype=np.float64)
+
+    nb_tiles = len(columns['zoneID'])
+    zone_id = np.asarray(columns['zoneID'], dtype=np.float64)
+    ww_start_doy, ww_end_doy = get_doy('wwsos_min'), get_doy('wweos_max')
+    m1_start_doy, m1_end_doy = get_doy('m1sos_min'), get_doy('m1eos_max')
+    # Null m2 fields are considered as no summer2 season
+    m2_start_doy = np.nan_to_num(get_doy('m2sos_min'))
+    m2_end_doy = np.nan_to_num(get_doy('m2eos_max'))
+    # To avoid doy = doy + 1 in conversion_doy_to_date
+    m2_end_doy[zone_id == METASEASON_M2_END_AEZ] = 1
+    m2_exists = ~((m2_start_doy == 0) & (m2_end_doy == 0))
+
+    def is_doy(values):
+        return ~np.isnan(values) & (values >= 1) & (values <= 366)
+
+    valid = ~np.isnan(zone_id) & is_doy(ww_start_doy) & is_doy(ww_end_doy) & \
+        is_doy(m1_start_doy) & is_doy(m1_end_doy) & \
+        (~m2_exists | (is_doy(m2_start_doy) & is_doy(m2_end_doy)))
+
+    def season_dates(start_doy, end_doy, season_type, mask):
+        start = np.full(nb_tiles, np.datetime64('NaT'), dtype='datetime64[D]')
+        end = start.copy()
+        start_doy, end_doy = start_doy[mask].astype(np.int64), end_doy[mask].astype(np.int64)
+        end[mask] = conversion_doy_to_datetime64(end_doy, year)
+        start_year = np.where(start_doy > end_doy, year - 1, year)
+        start[mask] = conversion_doy_to_datetime64(start_doy, start_year) \
+            - np.timedelta64(SEASON_BUFFERS[season_type], 'D')
+        return start, end
+
+    ww_start, ww_end = season_dates(ww_start_doy, ww_end_doy, 'winter', valid)
+    m1_start, m1_end = season_dates(m1_start_doy, m1_end_doy, 'summer1', valid)
+    m2_start, m2_end = season_dates(m2_start_doy, m2_end_doy, 'summer2', valid & m2_exists)
+
+    #Get custom dates
+    wp_processing_end = np.maximum(ww_end, m1_end)
+    wp_processing_end = np.where(m2_exists, np.maximum(wp_processing_end, m2_end),
+                                 wp_processing_end)
+    wp_processing_start = np.minimum(shift_years(wp_processing_end, -1), ww_start)
+    wp_processing_start = np.minimum(wp_processing_start, m1_start)
+    wp_processing_start = np.where(m2_exists, np.minimum(wp_processing_start, m2_start),
+                                   wp_processing_start)
+    return {'wp_processing_start': wp_processing_start,
+            'wp_processing_end': wp_processing_end,
+            'm2_exists': m2_exists.astype(np.int64),
+            'valid': valid}
+
+def get_metaseason_table(aez_catalog: AezTileCatalog,
+                         years: Iterable[int],
+                         tiles_id: Optional[Iterable[str]] = None)->MetaseasonTable:
+    """
+    Compute the metaseason dates of tiles of the MGRS/AEZ grid for one or several years
+    Tiles with inconsistent days of year are not in the table
+    :param aez_catalog: MGRS grid that contains for each included tile
+        the associated aez information
+    :param years: seasons to process (e.g. 2021 to process 2020/2021)
+    :param tiles_id: list of s2 tiles (all the tiles of the grid by default)
+    """
+    tiles_id = aez_catalog.tile_ids if tiles_id is None else list(tiles_id)
+    columns = aez_catalog.get_columns(tiles_id)
+    table = {}
+    for year in years:
+        windows = compute_metaseason_windows(columns, int(year))
+        wp_processing_start = windows['wp_processing_start'].astype(date)
+        wp_processing_end = windows['wp_processing_end'].astype(date)
+        for index in np.flatnonzero(windows['valid']):
+            table[(tiles_id[index], int(year))] = (wp_processing_start[index],
+                                                   wp_processing_end[index],
+                                                   int(windows['m2_exists'][index]))
+        nb_invalid = len(tiles_id) - int(windows['valid'].sum())
+        if nb_invalid:
+            logger.warning("%s tiles without metaseason dates for year %s", nb_invalid, year)
+    return table
+
+def write_metaseason_table(table: MetaseasonTable, filepath: str)->None:
+    """
+    Write the metaseason table to a csv file
+    :param table: metaseason dates per tile and year
+    :param filepath: output csv file
+    """
+    with open(filepath, 'w', encoding='utf8', newline='') as csv_file:
+        writer = csv.writer(csv_file, delimiter=';')
+        writer.writerow(METASEASON_TABLE_HEADER)
+        for (tile_id, year), (wp_start, wp_end, m2_exists) in table.items():
+            writer.writerow([tile_id, year, wp_start.isoformat(), wp_end.isoformat(), m2_exists])
+    logger.info("Metaseason table written to %s (%s rows)", filepath, len(table))
+
+def read_metaseason_table(filepath: str)->MetaseasonTable:
+    """
+    Read a metaseason table written by write_metaseason_table
+    :param filepath: csv file
+    """
+    table = {}
+    with open(filepath, 'r', encoding='utf8', newline='') as csv_file:
+        reader = csv.reader(csv_file, delimiter=';')
+        if tuple(next(reader, ())) != METASEASON_TABLE_HEADER:
+            raise ValueError(f"{filepath} is not a metaseason table")
+        for tile_id, year, wp_start, wp_end, m2_exists in reader:
+            table[(tile_id, int(year))] = (date.fromisoformat(wp_start),
+                                           date.fromisoformat(wp_end),
+                                           int(m2_exists))
+    return table
@@ -16,7 +16,8 @@ import subprocess
 import sys
 from typing import List
 
-from osgeo import ogr
+from ewoc_prod.aez_tile_catalog import AezTileCatalog
+from ewoc_prod.season_windows import get_metaseason_table, write_metaseason_table
 
 _logger = logging.getLogger(__name__)
 
@@ -85,25 +86,17 @@ def setup_logging(loglevel: int)->None:
         level=loglevel, stream=sys.stdout, format=logformat, datefmt="%Y-%m-%d %H:%M:%S"
     )
 
-def extract_s2tiles_list_from_aez(s2tiles_aez_file: str, aez_id: str)->List[str]:
+def extract_s2tiles_list_from_aez(aez_catalog: AezTileCatalog, aez_id: str)->List[str]:
     """
     Extraction of s2 tiles list from aez id
-    :param s2tiles_aez_file: MGRS grid that contains for each included tile
-        the associated aez information (geojson file)
+    :param aez_catalog: MGRS grid that contains for each included tile
+        the associated aez information
     :param aez_id: aez id (e.g. '46172')
     """
-    # Open geosjon
-    driver = ogr.GetDriverByName('GeoJSON')
-    data_source = driver.Open(s2tiles_aez_file, 1)
-    s2tiles_layer = data_source.GetLayer()
-
     # Identify the tiles corresponding to the AEZ
     logging.debug("Extract tiles corresponding to the aez region id: %s", aez_id)
 
-    tiles_id = []
-    for tile in s2tiles_layer:
-        if int(tile.GetField('zoneID')) == aez_id:
-            tiles_id.append(tile.GetField('tile'))
+    tiles_id = [tile.tile_id for tile in aez_catalog.get_aez_tiles(aez_id)]
 
     logging.debug("Number of tiles selected = %s", len(tiles_id))
     return tiles_id
@@ -115,6 +108,23 @@ def main(args: List[str])->None:
     args = parse_args(args)
     setup_logging(args.loglevel)
 
+    # Load the MGRS/AEZ grid once (from its cache when up to date)
+    aez_catalog = AezTileCatalog.from_file(args.s2tiles_aez_file)
+
+    # Compute the metaseason dates of all the tiles once, reused by each ewoc_prod run
+    if not pa.exists(args.output_path):
+        os.makedirs(args.output_path)
+    metaseason_table_file = pa.join(args.output_path,
+                                    f'metaseason_table_{args.metaseason_year}.csv')
+    # Catalogue searches shared by the runs, the retries only search the missing tiles
+    search_cache_file = pa.join(args.output_path, 'search_cache.sqlite')
+    tiles_all_aez = [tile.tile_id for aez_id in args.aez_list
+                     for tile in aez_catalog.get_aez_tiles(aez_id)]
+    write_metaseason_table(get_metaseason_table(aez_catalog,
+                                                [args.metaseason_year],
+                                                tiles_all_aez),
+                           metaseason_table_file)
+
     # Loop on AEZ to process
     for aez_id in args.aez_list:
         logging.info("Current AEZ = %s", str(aez_id))
@@ -125,7 +135,7 @@ def main(args: List[str])->None:
             os.makedirs(json_path)
 
         # Number of tiles to process
-        tiles_to_do = extract_s2tiles_list_from_aez(args.s2tiles_aez_file, aez_id)
+        tiles_to_do = extract_s2tiles_list_from_aez(aez_catalog, aez_id)
         nb_tiles_to_do = len(tiles_to_do)
         logging.info("Number of tiles to process = %s", str(nb_tiles_to_do))
 
@@ -182,13 +192,13 @@ def main(args: List[str])->None:
             #     #             -o {args.output_path} -k _WP_PHASE_II_/{args.output_s3_bucket_folder}"
             if args.orbit_file:
                 cmd_ewoc_prod = f"ewoc_prod -v -in {args.s2tiles_aez_file} -aid '{aez_id}' \
-                    -m -m_yr {args.metaseason_year} -s2prov aws aws_sng -strategy L2A L2A \
-                        -s1prov astraea_eod -orbit {args.orbit_file} -u c728b264-5c97-4f4c-81fe-1500d4c4dfbd  \
+                    -m -m_yr {args.metaseason_year} -m_table {metaseason_table_file} -cache {search_cache_file} \
+                        -s2prov aws aws_sng -strategy L2A L2A -s1prov astraea_eod -orbit {args.orbit_file} -u c728b264-5c97-4f4c-81fe-1500d4c4dfbd  \
                             -o {args.output_path} -no_s3"
             else:
                 cmd_ewoc_prod = f"ewoc_prod -v -in {args.s2tiles_aez_file} -aid '{aez_id}' \
-                    -m -m_yr {args.metaseason_year} -s2prov aws aws_sng -strategy L2A L2A \
-                        -s1prov astraea_eod -u c728b264-5c97-4f4c-81fe-1500d4c4dfbd  \
+                    -m -m_yr {args.metaseason_year} -m_table {metaseason_table_file} -cache {search_cache_file} \
+                        -s2prov aws aws_sng -strategy L2A L2A -s1prov astraea_eod -u c728b264-5c97-4f4c-81fe-1500d4c4dfbd  \
                             -o {args.output_path} -no_s3"
             logging.info(cmd_ewoc_prod)
 
@@ -236,13 +246,13 @@ def main(args: List[str])->None:
             logging.info("Merge json files")
             if args.orbit_file:
                 cmd_ewoc_prod = f"ewoc_prod -v -in {args.s2tiles_aez_file} -aid '{aez_id}' \
-                    -m -m_yr {args.metaseason_year} -s2prov aws aws_sng -strategy L2A L2A \
-                        -s1prov astraea_eod -orbit {args.orbit_file} -u c728b264-5c97-4f4c-81fe-1500d4c4dfbd  \
+                    -m -m_yr {args.metaseason_year} -m_table {metaseason_table_file} -cache {search_cache_file} \
+                        -s2prov aws aws_sng -strategy L2A L2A -s1prov astraea_eod -orbit {args.orbit_file} -u c728b264-5c97-4f4c-81fe-1500d4c4dfbd  \
                             -o {args.output_path} -no_s3"
             else:
                 cmd_ewoc_prod = f"ewoc_prod -v -in {args.s2tiles_aez_file} -aid '{aez_id}' \
-                    -m -m_yr {args.metaseason_year} -s2prov aws aws_sng -strategy L2A L2A \
-                        -s1prov astraea_eod -u c728b264-5c97-4f4c-81fe-1500d4c4dfbd  \
+                    -m -m_yr {args.metaseason_year} -m_table {metaseason_table_file} -cache {search_cache_file} \
+                        -s2prov aws aws_sng -strategy L2A L2A -s1prov astraea_eod -u c728b264-5c97-4f4c-81fe-1500d4c4dfbd  \
                             -o {args.output_path} -no_s3"
             logging.info(cmd_ewoc_prod)
 
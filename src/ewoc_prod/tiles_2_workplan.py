@@ -7,16 +7,17 @@
 :created: 2022
 '''
 
+import csv
 import logging
 from datetime import date
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
-import boto3
 from dateutil.relativedelta import relativedelta
-from ewoc_dag.bucket.ewoc import EWOCBucket
-from osgeo import ogr
 
+from ewoc_prod.aez_tile_catalog import AezTileCatalog
+from ewoc_prod.season_windows import (MetaseasonTable, WINDOW_KEYS, datetime64_to_date,
+    get_tiles_season_windows)
 from ewoc_prod.utils import conversion_doy_to_date
 
 def get_tiles_from_tile(tile_id: str)->List[str]:
@@ -28,32 +29,14 @@ def get_tiles_from_tile(tile_id: str)->List[str]:
     tiles_id.append(tile_id)
     return tiles_id
 
-def get_tiles_from_aez(s2tiles_layer: str, aez_id: str)->List[str]:
+def get_tiles_from_aez(aez_catalog: AezTileCatalog, aez_id: str)->List[str]:
     """
     Get s2 tiles list from aez chosen by user
-    :param s2tiles_layer: MGRS grid that contains for each included tile
+    :param aez_catalog: MGRS grid that contains for each included tile
          the associated aez information
     :param aez_id: aez id (e.g. '46172')
     """
-    tiles_id = []
-    for tile in s2tiles_layer:
-        if int(tile.GetField('zoneID')) == aez_id:
-            tiles_id.append(tile.GetField('tile'))
-    return tiles_id
-
-def get_tiles_from_aoi(s2tiles_layer: str, aoi_geom: str)->List[str]:
-    """
-    Get s2 tiles list from aoi provided by user
-    :param s2tiles_layer: MGRS grid that contains for each included tile
-        the associated aez information
-    :param aoi_geom: area of interest geometry
-    """
-    tiles_id = []
-    s2tiles_layer.SetSpatialFilter(aoi_geom)
-    for tile in s2tiles_layer:
-        tiles_id.append(tile.GetField('tile'))
-    s2tiles_layer.SetSpatialFilter(None)
-    return tiles_id
+    return [tile.tile_id for tile in aez_catalog.get_aez_tiles(aez_id)]
 
 def get_tiles_from_user(tiles_layer: str)->List[str]:
     """
@@ -65,25 +48,17 @@ def get_tiles_from_user(tiles_layer: str)->List[str]:
         tiles_id.append(tile.GetField('tile'))
     return tiles_id
 
-def get_tiles_from_date(s2tiles_layer: str, prod_start_date: date)->List[str]:
+def get_tiles_from_date(aez_catalog: AezTileCatalog, prod_start_date: date)->List[str]:
     """
     Get s2 tiles list from date provided by user
-    :param s2tiles_layer: MGRS grid that contains for each included tile
+    :param aez_catalog: MGRS grid that contains for each included tile
         the associated aez information
     :param prod_start_date: production start date
     """
     end_doy = prod_start_date.strftime("%j")
-    tiles_id = []
-    for tile in s2tiles_layer:
-        if int(tile.GetField("wweos_max")) == int(end_doy):
-            tiles_id.append(tile.GetField('tile'))
-        elif int(tile.GetField("m1eos_max")) == int(end_doy):
-            tiles_id.append(tile.GetField('tile'))
-        elif int(tile.GetField("m2eos_max")) == int(end_doy):
-            tiles_id.append(tile.GetField('tile'))
-    return tiles_id
+    return [tile_id for tile_id, _, _ in aez_catalog.get_eos_triggers(int(end_doy))]
 
-def extract_s2tiles_list(s2tiles_aez_file: str,
+def extract_s2tiles_list(aez_catalog: AezTileCatalog,
                         tile_id: str,
                         aez_id: str,
                         user_aoi: str,
@@ -92,8 +67,8 @@ def extract_s2tiles_list(s2tiles_aez_file: str,
                         prod_start_date: date)->List[str]:
     """
     Extraction of s2 tiles list from different input provided by user
-    :param s2tiles_aez_file: MGRS grid that contains for each included tile
-        the associated aez information (geojson file)
+    :param aez_catalog: MGRS grid that contains for each included tile
+        the associated aez information
     :param tile_id: tile id (e.g. '31TCJ' Toulouse)
     :param user_tiles: tiles selected by user (geojson file)
     :param user_list_tiles: tiles selected by user (e.g. 38KKG 38KLF 38KLG)
@@ -101,31 +76,24 @@ def extract_s2tiles_list(s2tiles_aez_file: str,
     :param user_aoi: area of interest (geojson file)
     :param prod_start_date: production start date
     """
-    #Open geosjon
-    driver = ogr.GetDriverByName('GeoJSON')
-    data_source = driver.Open(s2tiles_aez_file, 1)
-    s2tiles_layer = data_source.GetLayer()
     #Identify the tiles of interest from the info provided by the user
     if tile_id is not None:
         logging.info("Extract tile : %s", tile_id)
         tiles_id = get_tiles_from_tile(tile_id)
     elif aez_id is not None:
         logging.info("Extract tiles corresponding to the aez region id: %s", aez_id)
-        tiles_id = get_tiles_from_aez(s2tiles_layer, aez_id)
+        tiles_id = get_tiles_from_aez(aez_catalog, aez_id)
     elif user_aoi is not None:
         logging.info("Extract tiles corresponding to the user aoi: %s", user_aoi)
-        tiles_id = []
-        driver = ogr.GetDriverByName('GeoJSON')
-        data_source2 = driver.Open(user_aoi, 1)
-        aoi_layer = data_source2.GetLayer()
-        for aoi in aoi_layer:
-            aoi_geom = aoi.GetGeometryRef()
-            tiles_id_geom = get_tiles_from_aoi(s2tiles_layer, aoi_geom)
-            tiles_id.extend(tiles_id_geom)
+        from ewoc_prod.aoi_tile_selector import AoiTileSelector, read_aoi_geometries
+
+        tiles_id = AoiTileSelector(aez_catalog).select(read_aoi_geometries(user_aoi))
     elif user_tiles is not None:
         logging.info("Extract tiles corresponding to the user tiles list: %s", user_tiles)
+        from osgeo import ogr
+
         driver = ogr.GetDriverByName('GeoJSON')
-        data_source3 = driver.Open(user_tiles, 1)
+        data_source3 = driver.Open(user_tiles, 0)
         tiles_layer = data_source3.GetLayer()
         tiles_id = get_tiles_from_user(tiles_layer)
     elif user_list_tiles is not None:
@@ -134,82 +102,68 @@ def extract_s2tiles_list(s2tiles_aez_file: str,
     else:
         logging.info("Extract tiles corresponding to the production date requested: %s",
              prod_start_date)
-        tiles_id = get_tiles_from_date(s2tiles_layer, prod_start_date)
+        tiles_id = get_tiles_from_date(aez_catalog, prod_start_date)
     logging.info("Number of tiles selected = %s", len(tiles_id))
     return tiles_id
 
-def check_number_of_aez_for_selected_tiles(s2tiles_aez_file: str, tiles_id: str)->List[str]:
+def check_number_of_aez_for_selected_tiles(aez_catalog: AezTileCatalog,
+                                           tiles_id: str)->List[str]:
     """
     Check the number of aez corresponding to the s2 tiles selected
-    :param s2tiles_aez_file: MGRS grid that contains for each included tile
-        the associated aez information (geojson file)
+    :param aez_catalog: MGRS grid that contains for each included tile
+        the associated aez information
     :param tiles_id: list of s2 tiles selected
     """
-    #Open geosjon
-    driver = ogr.GetDriverByName('GeoJSON')
-    data_source = driver.Open(s2tiles_aez_file, 1)
-    s2tiles_layer = data_source.GetLayer()
-    #Add filter
-    tiles_id_str = '(' + ','.join(f"'{tile_id}'" for tile_id in tiles_id) + ')'
-    s2tiles_layer.SetAttributeFilter(f"tile IN {tiles_id_str}")
-    #Get aez list
-    aez_list = []
-    for tile in s2tiles_layer:
-        aez_list.append(tile.GetField('zoneID'))
-    aez_list = list(set(aez_list))
-    #Remove filter
-    s2tiles_layer.SetAttributeFilter(None)
-    return aez_list
+    return list(group_tiles_by_aez(aez_catalog, tiles_id))
 
-def extract_s2tiles_list_per_aez(s2tiles_aez_file: str, tiles_id: str, aez_id: str)->List[str]:
+def extract_s2tiles_list_per_aez(aez_catalog: AezTileCatalog,
+                                 tiles_id: str,
+                                 aez_id: str)->List[str]:
     """
     Extraction of s2 tiles list for each aez
-    :param s2tiles_aez_file: MGRS grid that contains for each included tile
-        the associated aez information (geojson file)
+    :param aez_catalog: MGRS grid that contains for each included tile
+        the associated aez information
     :param tiles_id: list of s2 tiles selected
     :param aez_id: aez id (e.g. '46172')
     """
-    #Open geosjon
-    driver = ogr.GetDriverByName('GeoJSON')
-    data_source = driver.Open(s2tiles_aez_file, 1)
-    s2tiles_layer = data_source.GetLayer()
-    #Add filter
-    tiles_id_str = '(' + ','.join(f"'{tile_id}'" for tile_id in tiles_id) + ')'
-    s2tiles_layer.SetAttributeFilter(f"tile IN {tiles_id_str}")
-    #Get s2 tiles list
-    tiles_id_subset = []
-    for tile in s2tiles_layer:
-        if int(tile.GetField('zoneID')) == int(aez_id):
-            tiles_id_subset.append(tile.GetField('tile'))
-    #Remove filter
-    s2tiles_layer.SetAttributeFilter(None)
-    return tiles_id_subset
+    return group_tiles_by_aez(aez_catalog, tiles_id).get(int(aez_id), [])
 
-def get_aez_season_type_from_date(s2tiles_aez_file: str, aez_id: str, prod_start_date: date)->str:
+def group_tiles_by_aez(aez_catalog: AezTileCatalog,
+                       tiles_id: List[str])->Dict[int, List[str]]:
+    """
+    Group the s2 tiles selected by aez in a single pass
+    Tiles are in grid order, tiles that are not in the grid (or without aez) are ignored
+    :param aez_catalog: MGRS grid that contains for each included tile
+        the associated aez information
+    :param tiles_id: list of s2 tiles selected
+    """
+    indexes = sorted({aez_catalog.get_index(tile_id) for tile_id in tiles_id
+                      if tile_id in aez_catalog})
+    tiles_per_aez = {}
+    for index in indexes:
+        aez_id = aez_catalog.get_field(index, 'zoneID')
+        if aez_id is None:
+            logging.warning("Tile %s has no aez", aez_catalog.tile_ids[index])
+            continue
+        tiles_per_aez.setdefault(int(aez_id), []).append(aez_catalog.tile_ids[index])
+    return tiles_per_aez
+
+def get_aez_season_type_from_date(aez_catalog: AezTileCatalog,
+                                  aez_id: str,
+                                  prod_start_date: date)->str:
     """
     Get the season type from date provided by user
-    :param s2tiles_aez_file: MGRS grid that contains for each included tile
-        the associated aez information (geojson file)
+    :param aez_catalog: MGRS grid that contains for each included tile
+        the associated aez information
     :param aez_id: aez id (e.g. '46172')
     :param prod_start_date: production start date
     """
     end_doy = prod_start_date.strftime("%j")
-    #Open geosjon
-    driver = ogr.GetDriverByName('GeoJSON')
-    data_source = driver.Open(s2tiles_aez_file, 1)
-    s2tiles_layer = data_source.GetLayer()
-    #Add filter
-    s2tiles_layer.SetAttributeFilter(f"zoneID = {aez_id}")
-    aez = s2tiles_layer.GetNextFeature()
-    if int(aez.GetField("wweos_max")) == int(end_doy):
-        season_type = "winter"
-    elif int(aez.GetField("m1eos_max")) == int(end_doy):
-        season_type = "summer1"
-    elif int(aez.GetField("m2eos_max")) == int(end_doy):
-        season_type = "summer2"
-    #Remove filter
-    s2tiles_layer.SetAttributeFilter(None)
-    return season_type
+    aez_tile_id = aez_catalog.get_aez_tiles(aez_id)[0].tile_id
+    for tile_id, _, season_type in aez_catalog.get_eos_triggers(int(end_doy)):
+        if tile_id == aez_tile_id:
+            return season_type
+    raise ValueError(f"No season ending on {prod_start_date} for aez {aez_id}")
 
 def get_aez_dates_from_season_type(season_type: str)->Tuple[str,str]:
     """
@@ -279,27 +233,20 @@ def get_detector_set_from_season_type(season_type: str,
     detector_set = ', '.join(detector_set)
     return detector_set
 
-def get_tiles_infos_from_tiles(s2tiles_aez_file: str,
+def get_tiles_infos_from_tiles(aez_catalog: AezTileCatalog,
                                 tiles_id: str,
                                 season_type: str,
                                 prod_start_date: date)-> \
                                     Tuple[date,date,date,date,date,date,date,date,bool,bool,str]:
     """
     Get some tiles informations (dates, l8_sr)
-    :param s2tiles_aez_file: MGRS grid that contains for each included tile
-        the associated aez information (geojson file)
+    :param aez_catalog: MGRS grid that contains for each included tile
+        the associated aez information
     :param tiles_id: list of s2 tiles selected
     :param season_type: season type (winter, summer1, summer2)
     :param prod_start_date: production start date
     """
-    #Open geosjon
-    driver = ogr.GetDriverByName('GeoJSON')
-    data_source = driver.Open(s2tiles_aez_file, 1)
-    s2tiles_layer = data_source.GetLayer()
-    #Add filter
-    tiles_id_str = '(' + ','.join(f"'{tile_id}'" for tile_id in tiles_id) + ')'
-    s2tiles_layer.SetAttributeFilter(f"tile IN {tiles_id_str}")
-    tile = s2tiles_layer.GetNextFeature()
+    tile = aez_catalog.get_first_tile(tiles_id)
     #Get dates
     aez_start_date_key, aez_end_date_key = get_aez_dates_from_season_type(season_type)
     season_start_doy = int(tile.GetField(aez_start_date_key))
@@ -349,31 +296,25 @@ def get_tiles_infos_from_tiles(s2tiles_aez_file: str,
     else:
         wp_processing_start = season_processing_start
         wp_processing_end = season_processing_end
-    #Remove filter
-    s2tiles_layer.SetAttributeFilter(None)
     return season_start, season_end, season_processing_start, season_processing_end, \
         annual_processing_start, annual_processing_end, wp_processing_start, wp_processing_end,\
             l8_enable_sr, enable_sw, detector_set
 
-def get_tiles_metaseason_infos_from_tiles(s2tiles_aez_file: str,
+def get_tiles_metaseason_infos_from_tiles(aez_catalog: AezTileCatalog,
                                 tiles_id: str,
-                                year: int)-> \
+                                year: int,
+                                metaseason_table: Optional[MetaseasonTable] = None)-> \
                                     Tuple[str,str,str,str,str,str,str,date,date,bool,bool,str]:
     """
     Get some tiles informations for metaseason (dates, l8_sr)
-    :param s2tiles_aez_file: MGRS grid that contains for each included tile
-        the associated aez information (geojson file)
+    :param aez_catalog: MGRS grid that contains for each included tile
+        the associated aez information
     :param tiles_id: list of s2 tiles selected
     :param year: season to process (e.g. 2021 to process 2020/2021)
+    :param metaseason_table: precomputed metaseason dates per tile and year
+        (see get_metaseason_table), dates are computed for the tile if missing
     """
-    #Open geosjon
-    driver = ogr.GetDriverByName('GeoJSON')
-    data_source = driver.Open(s2tiles_aez_file, 1)
-    s2tiles_layer = data_source.GetLayer()
-    #Add filter
-    tiles_id_str = '(' + ','.join(f"'{tile_id}'" for tile_id in tiles_id) + ')'
-    s2tiles_layer.SetAttributeFilter(f"tile IN {tiles_id_str}")
-    tile = s2tiles_layer.GetNextFeature()
+    tile = aez_catalog.get_first_tile(tiles_id)
     #Get L8 info
     if tile.GetField('L8')==0:
         l8_enable_sr = False
@@ -386,8 +327,12 @@ def get_tiles_metaseason_infos_from_tiles(s2tiles_aez_file: str,
     #Get detector_set
     detector_set = 'None'
     #Get wp_processing_dates
-    wp_processing_start, wp_processing_end, m2_exists = \
-                retrieve_custom_dates_new_version(tile, year)
+    if metaseason_table and (tile.tile_id, year) in metaseason_table:
+        wp_processing_start, wp_processing_end, m2_exists = \
+            metaseason_table[(tile.tile_id, year)]
+    else:
+        wp_processing_start, wp_processing_end, m2_exists = \
+            retrieve_custom_dates_new_version(tile, year)
     #Get dates
     season_start = wp_processing_start
     season_end = wp_processing_end
@@ -400,12 +345,90 @@ def get_tiles_metaseason_infos_from_tiles(s2tiles_aez_file: str,
         season_type = 'metaseason, winter, summer1, summer2'
     else:
         season_type = 'metaseason, winter, summer1'
-    #Remove filter
-    s2tiles_layer.SetAttributeFilter(None)
     return season_type, season_start, season_end, season_processing_start, season_processing_end, \
         annual_processing_start, annual_processing_end, wp_processing_start, wp_processing_end,\
             l8_enable_sr, enable_sw, detector_set
 
+class TileInfos(NamedTuple):
+    """
+    Information needed to create the workplan of a tile
+    """
+    season_type: Optional[str]
+    season_start: Optional[date]
+    season_end: Optional[date]
+    season_processing_start: Optional[date]
+    season_processing_end: Optional[date]
+    annual_processing_start: Optional[date]
+    annual_processing_end: Optional[date]
+    wp_processing_start: Optional[date]
+    wp_processing_end: Optional[date]
+    l8_enable_sr: bool
+    enable_sw: bool
+    detector_set: str
+    orbit_dir: Optional[str]
+
+def read_orbit_file(orbit_file: Optional[str])->Dict[str, str]:
+    """
+    Read the s1 orbit directions forced for a list of tiles
+    (the last line of a tile is used if it appears several times)
+    :param orbit_file: csv file (tile;orbit_dir with a header line)
+    """
+    orbit_dirs = {}
+    if orbit_file:
+        with open(orbit_file, "r", encoding='utf8') as csv_file:
+            reader = csv.reader(csv_file, delimiter=';')
+            next(reader)
+            for row in reader:
+                orbit_dirs[row[0]] = row[1]
+    return orbit_dirs
+
+def get_aez_tiles_infos(aez_catalog: AezTileCatalog,
+                        tiles_id: List[str],
+                        season_type: Optional[str],
+                        prod_start_date: date,
+                        metaseason: bool = False,
+                        metaseason_year: Optional[int] = None,
+                        metaseason_table: Optional[MetaseasonTable] = None,
+                        orbit_dirs: Optional[Dict[str, str]] = None)->Dict[str, TileInfos]:
+    """
+    Get the information needed to create the workplans of the tiles of an aez at once
+    :param aez_catalog: MGRS grid that contains for each included tile
+        the associated aez information
+    :param tiles_id: list of s2 tiles of the aez
+    :param season_type: season type (winter, summer1, summer2), unused in metaseason mode
+    :param prod_start_date: production start date
+    :param metaseason: if True, dates cover all the seasons
+    :param metaseason_year: season to process in the metaseason mode
+    :param metaseason_table: precomputed metaseason dates (see get_metaseason_table)
+    :param orbit_dirs: s1 orbit direction forced for some tiles (see read_orbit_file)
+    """
+    orbit_dirs = orbit_dirs or {}
+    tiles_infos = {}
+    windows = None
+    if not metaseason:
+        try:
+            windows = get_tiles_season_windows(aez_catalog, tiles_id, season_type,
+                                               prod_start_date)
+        except (KeyError, TypeError, ValueError) as err:
+            # Same errors as before for the faulty tile
+            logging.debug("Tiles infos computed tile by tile: %s", err)
+    for index, tile_id in enumerate(tiles_id):
+        if metaseason:
+            tile_infos = get_tiles_metaseason_infos_from_tiles(
+                aez_catalog, [tile_id], year=metaseason_year,
+                metaseason_table=metaseason_table)
+        elif windows is not None:
+            tile_infos = (season_type,) + \
+                tuple(datetime64_to_date(windows[key][index]) for key in WINDOW_KEYS) + \
+                (bool(windows['l8_enable_sr'][index]), bool(windows['enable_sw'][index]),
+                 windows['detector_set'][index])
+        else:
+            tile_infos = (season_type,) + \
+                get_tiles_infos_from_tiles(aez_catalog, [tile_id], season_type,
+                                           prod_start_date)
+        tiles_infos[tile_id] = TileInfos(*tile_infos, orbit_dirs.get(tile_id))
+    return tiles_infos
+
 def retrieve_custom_dates_new_version(tile: str, year: int)->List[str]:
     """
     Get custom dates that will encompass all the seasons
@@ -560,6 +583,9 @@ def ewoc_s3_upload(filepath: Path, bucket_name: str, key: str)->None:
     :param bucket_name: Bucket name where store data
     :param key: Bucket key where store data
     """
+    import boto3
+    from ewoc_dag.bucket.ewoc import EWOCBucket
+
     try:
         s3_bucket = EWOCBucket(bucket_name)
         s3_bucket._upload_file(filepath, key)
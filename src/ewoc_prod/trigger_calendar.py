@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+'''
+:author: Marjorie Battude <marjorie.battude@csgroup.eu>
+:organization: CS Group
+:copyright: 2023 CS Group. All rights reserved.
+:license: see LICENSE file
+:created: 2023
+'''
+
+import argparse
+import csv
+from datetime import date, timedelta
+import logging
+import sys
+from typing import Dict, List, Tuple
+
+from ewoc_prod.aez_tile_catalog import AezTileCatalog
+
+_logger = logging.getLogger(__name__)
+
+def parse_args(args: List[str])->argparse.Namespace:
+    """Parse command line parameters
+
+    Args:
+      args (List[str]): command line parameters as list of strings
+          (for example  ``["--help"]``).
+
+    Returns:
+      :obj:`argparse.Namespace`: command line parameters namespace
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-in', "--s2tiles_aez_file",
+                        help="MGRS grid that contains for each included tile \
+                            the associated aez information (geojson file)")
+    parser.add_argument('-yr', "--year",
+                        help="Year of the calendar",
+                        type=int,
+                        default=date.today().year)
+    parser.add_argument('-o', "--output_file",
+                        help="Output csv file",
+                        type=str)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        dest="loglevel",
+        help="set loglevel to INFO",
+        action="store_const",
+        const=logging.INFO,
+    )
+    parser.add_argument(
+        "-vv",
+        "--very-verbose",
+        dest="loglevel",
+        help="set loglevel to DEBUG",
+        action="store_const",
+        const=logging.DEBUG,
+    )
+    return parser.parse_args(args)
+
+def setup_logging(loglevel: int)->None:
+    """Setup basic logging
+    Args:
+      loglevel (int): minimum loglevel for emitting messages
+    """
+    logformat = "[%(asctime)s] %(levelname)s:%(name)s:%(message)s"
+    logging.basicConfig(
+        level=loglevel, stream=sys.stdout, format=logformat, datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+def get_trigger_calendar(aez_catalog: AezTileCatalog,
+                         year: int)->List[Tuple[date, int, Dict[Tuple[str, str], int]]]:
+    """
+    Get the tiles triggered each day of a year in the continuous monitoring mode
+    (tiles with a season ending that day)
+    :param aez_catalog: MGRS grid that contains for each included tile
+        the associated aez information
+    :param year: year of the calendar
+    :return: for each day, date, number of tiles and number of tiles per (aez id, season type)
+    """
+    calendar = []
+    current_date = date(year, 1, 1)
+    while current_date.year == year:
+        triggers = aez_catalog.get_eos_triggers(int(current_date.strftime("%j")))
+        nb_tiles_per_aez = {}
+        for _, aez_id, season_type in triggers:
+            key = (str(int(aez_id)), season_type)
+            nb_tiles_per_aez[key] = nb_tiles_per_aez.get(key, 0) + 1
+        calendar.append((current_date, len(triggers), nb_tiles_per_aez))
+        current_date += timedelta(days=1)
+    return calendar
+
+def write_trigger_calendar(calendar: List[Tuple[date, int, Dict[Tuple[str, str], int]]],
+                           output_file: str)->None:
+    """
+    Write the trigger calendar to a csv file (one row per day)
+    :param calendar: trigger calendar (see get_trigger_calendar)
+    :param output_file: output csv file
+    """
+    with open(output_file, 'w', encoding='utf8', newline='') as csv_file:
+        writer = csv.writer(csv_file, delimiter=';')
+        writer.writerow(['date', 'doy', 'nb_tiles', 'nb_aez', 'triggers'])
+        for current_date, nb_tiles, nb_tiles_per_aez in calendar:
+            triggers = ' '.join(f'{aez_id}:{season_type}:{nb}'
+                                for (aez_id, season_type), nb in sorted(nb_tiles_per_aez.items()))
+            writer.writerow([current_date.isoformat(), current_date.strftime("%j"), nb_tiles,
+                             len({aez_id for aez_id, _ in nb_tiles_per_aez}), triggers])
+
+def main(args: List[str])->None:
+    """
+    Main script
+    """
+    args = parse_args(args)
+    setup_logging(args.loglevel)
+
+    if not args.s2tiles_aez_file:
+        raise ValueError("Argument s2tiles_aez_file is missing")
+    if not args.output_file:
+        raise ValueError("Argument output_file is missing")
+
+    aez_catalog = AezTileCatalog.from_file(args.s2tiles_aez_file)
+    calendar = get_trigger_calendar(aez_catalog, args.year)
+    write_trigger_calendar(calendar, args.output_file)
+
+    nb_tiles_max, date_max = max((nb_tiles, current_date)
+                                 for current_date, nb_tiles, _ in calendar)
+    _logger.info("Number of days with tiles to process = %s",
+                 sum(1 for _, nb_tiles, _ in calendar if nb_tiles))
+    _logger.info("Maximum number of tiles in a day = %s (%s)", nb_tiles_max, date_max)
+    _logger.info("Trigger calendar written to %s", args.output_file)
+
+def run()->None:
+    """Calls :func:`main` passing the CLI arguments extracted from :obj:`sys.argv`
+
+    This function can be used as entry point to create console scripts with setuptools.
+    """
+    main(sys.argv[1:])
+
+if __name__ == '__main__':
+    run()
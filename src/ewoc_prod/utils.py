@@ -8,18 +8,50 @@
 '''
 
 import logging
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
+from typing import Dict, Tuple
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Production years covered by the day of year lookup table
+DOY_TABLE_YEARS = range(2015, 2036)
+
+def build_doy_table(years: range)->Dict[int, Tuple[date, ...]]:
+    """
+    Build the day of year lookup table: for each year, dates of doy 1 to 366
+    (doy 366 of a non-leap year is the 1st of January of the next year, as strptime)
+    :param years: years of the table
+    """
+    return {year: tuple(date(year, 1, 1) + timedelta(days=doy) for doy in range(366))
+            for year in years}
+
+_DOY_TABLE = build_doy_table(DOY_TABLE_YEARS)
+
 def conversion_doy_to_date(doy: int, year: date = date.today().year)->date:
     """
     Convert day of year to date YYYY-mm-dd
     :param doy: day of year
     :param year: year
     """
+    if isinstance(doy, int) and isinstance(year, int) and \
+            year in _DOY_TABLE and 1 <= doy <= 366:
+        return _DOY_TABLE[year][doy - 1]
     year = str(year)
-    str(doy).rjust(3 + len(str(doy)), '0')
     date_string = datetime.strptime(year + "-" + str(doy), "%Y-%j").strftime("%Y-%m-%d")
     date_format = datetime.strptime(date_string, "%Y-%m-%d").date()
     return date_format
+
+def conversion_doy_to_datetime64(doys: np.ndarray, years: np.ndarray)->np.ndarray:
+    """
+    Convert days of year to dates (vectorized version of conversion_doy_to_date)
+    :param doys: days of year (1 to 366)
+    :param years: years (one for each doy or a single one)
+    """
+    doys = np.asarray(doys, dtype=np.int64)
+    years = np.broadcast_to(np.asarray(years, dtype=np.int64), doys.shape)
+    invalid = (doys < 1) | (doys > 366)
+    if invalid.any():
+        raise ValueError(f"Day of year {doys[invalid][0]} does not match format '%j'")
+    return (years - 1970).astype('datetime64[Y]').astype('datetime64[D]') + (doys - 1)
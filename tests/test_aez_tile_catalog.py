@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+
+from ewoc_prod import tiles_2_workplan
+from ewoc_prod.aez_tile_catalog import (AezTileCatalog, get_catalog_cache_paths,
+    read_catalog_cache, write_catalog_cache)
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+
+def build_catalog():
+    """Small grid with two AEZ"""
+    return AezTileCatalog(
+        ['31TCJ', '31TDJ', '38KKG'],
+        {'zoneID': [46172.0, 46172.0, 19093.0],
+         'wwsos_min': [15, 15, 300],
+         'wweos_max': [200, 200, 120],
+         'm2sos_min': [0, 0, np.nan],
+         'L8': [1, 1, 0]},
+        {'zoneID': 'f', 'wwsos_min': 'i', 'wweos_max': 'i', 'm2sos_min': 'i', 'L8': 'i'},
+        np.array([0, 2, 3, 3]),
+        b'abc')
+
+
+def test_catalog_index():
+    """Tiles are indexed by tile id and by aez id"""
+    catalog = build_catalog()
+    assert len(catalog) == 3
+    assert '31TDJ' in catalog and '32ABC' not in catalog
+    assert [tile.tile_id for tile in catalog.get_aez_tiles(46172)] == ['31TCJ', '31TDJ']
+    assert catalog.get_aez_id('38KKG') == 19093.0
+    assert catalog.get_first_tile(['38KKG', '31TDJ']).tile_id == '31TDJ'
+    with pytest.raises(ValueError):
+        catalog.get_first_tile(['32ABC'])
+
+
+def test_catalog_fields():
+    """GetField behaves as for an ogr feature"""
+    tile = build_catalog().get_tile('38KKG')
+    assert tile.GetField('tile') == '38KKG'
+    assert tile.GetField('wwsos_min') == 300
+    assert isinstance(tile.GetField('wwsos_min'), int)
+    assert tile.GetField('m2sos_min') is None
+    with pytest.raises(KeyError):
+        tile.GetField('trigger_sw')
+
+
+def test_catalog_cache(tmp_path):
+    """The sidecar cache is reused while the grid content is unchanged"""
+    grid = tmp_path / 's2tile_selection_aez.geojson'
+    grid.write_text('{"type": "FeatureCollection", "features": []}')
+    catalog = build_catalog()
+    write_catalog_cache(catalog, str(grid))
+    assert all(path.is_file() for path in get_catalog_cache_paths(str(grid)))
+
+    cached = read_catalog_cache(str(grid))
+    assert cached.tile_ids == catalog.tile_ids
+    assert cached.get_tile('31TDJ').GetField('wweos_max') == 200
+    assert cached.get_wkb(0) == b'ab' and cached.get_wkb(2) == b''
+
+    # Same content, new mtime: the hash validates the cache
+    stat = grid.stat()
+    os.utime(grid, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert read_catalog_cache(str(grid)) is not None
+
+    # New content: the cache is outdated
+    grid.write_text('{"type": "FeatureCollection", "features": [ ]}')
+    assert read_catalog_cache(str(grid)) is None
+
+
+def test_eos_doy_index():
+    """Tiles are indexed by end of season day, first season ending that day wins"""
+    catalog = AezTileCatalog(
+        ['31TCJ', '31TDJ', '38KKG'],
+        {'zoneID': [46172, 46172, 19093],
+         'wweos_max': [200, 120, 0],
+         'm1eos_max': [200, 250, 120],
+         'm2eos_max': [np.nan, 0, 366]})
+    assert catalog.get_eos_triggers(200) == [('31TCJ', 46172, 'winter')]
+    assert catalog.get_eos_triggers(120) == [('31TDJ', 46172, 'winter'),
+                                             ('38KKG', 19093, 'summer1')]
+    assert catalog.get_eos_triggers(366) == [('38KKG', 19093, 'summer2')]
+    assert catalog.get_eos_triggers(0) == [] and catalog.get_eos_triggers(1) == []
+
+
+def test_group_tiles_by_aez():
+    """Selected tiles are grouped by aez in grid order, unknown tiles are ignored"""
+    tiles_per_aez = tiles_2_workplan.group_tiles_by_aez(
+        build_catalog(), ['38KKG', '32ABC', '31TDJ', '31TCJ', '31TDJ'])
+    assert tiles_per_aez == {46172: ['31TCJ', '31TDJ'], 19093: ['38KKG']}
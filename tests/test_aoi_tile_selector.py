@@ -0,0 +1,42 @@
+import numpy as np
+from shapely.geometry import box
+
+from ewoc_prod.aez_tile_catalog import AezTileCatalog
+from ewoc_prod.aoi_tile_selector import AoiTileSelector
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+
+def build_catalog(nb_x=20, nb_y=10):
+    """Grid of 1 degree square tiles, plus a tile without geometry"""
+    tile_ids, wkb_list = [], []
+    for i in range(nb_x):
+        for j in range(nb_y):
+            tile_ids.append(f'T{i:02d}{j:02d}')
+            wkb_list.append(box(i, j, i + 1, j + 1).wkb)
+    tile_ids.append('TNONE')
+    wkb_list.append(b'')
+    wkb_offsets = np.cumsum([0] + [len(wkb) for wkb in wkb_list], dtype=np.int64)
+    return AezTileCatalog(tile_ids, {'zoneID': np.ones(len(tile_ids))}, None,
+                          wkb_offsets, b''.join(wkb_list))
+
+
+def test_select_deduplicated_grid_order():
+    """Tiles selected by several aoi are returned once, in grid order"""
+    catalog = build_catalog()
+    selector = AoiTileSelector(catalog)
+    aois = [box(5.2, 2.2, 5.8, 2.8), box(0.2, 0.2, 0.4, 0.4), box(5.5, 2.5, 6.5, 2.7)]
+    assert selector.select(aois) == ['T0000', 'T0502', 'T0602']
+    assert selector.select([]) == []
+
+
+def test_select_exact():
+    """Bounding box candidates are filtered with the exact geometries"""
+    catalog = build_catalog()
+    selector = AoiTileSelector(catalog)
+    # L shape: its bounding box covers 3x3 tiles, it only crosses 5 of them
+    l_shape = box(0.1, 0.1, 0.9, 2.9).union(box(0.1, 0.1, 2.9, 0.9))
+    assert len(selector.select([l_shape], exact=False)) == 9
+    assert selector.select([l_shape]) == ['T0000', 'T0001', 'T0002', 'T0100', 'T0200']
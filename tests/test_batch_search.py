@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+from shapely.geometry import box
+from shapely.wkt import dumps
+
+from ewoc_prod.ewoc_work_plan import utils
+from ewoc_prod.ewoc_work_plan.search_cache import CachedProduct, SearchCache
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+
+def tile(geometry):
+    """Tile as given to eodag_prods"""
+    return SimpleNamespace(geometry=[geometry])
+
+
+def test_prefetch_eodag_prods(tmp_path):
+    """Products of the region search are dispatched to the tiles"""
+    tiles = {'31TCJ': tile(box(0, 0, 1, 1)), '31TDJ': tile(box(1, 0, 2, 1)),
+             '31TEJ': tile(box(5, 5, 6, 6))}
+    products = [CachedProduct({'id': 'S2A_31TCJ'}, {}, box(0.1, 0.1, 0.5, 0.5)),
+                CachedProduct({'id': 'S2B_31TCJ'}, {}, box(0.1, 0.1, 1.5, 0.5)),
+                CachedProduct({'id': 'S2A_31TEJ'}, {}, box(5.1, 5.1, 5.5, 5.5))]
+    # Region search already in the cache: no search with eodag
+    cache = SearchCache(tmp_path / 'search_cache.sqlite')
+    region_kwargs = utils.get_search_kwargs(dumps(box(0, 0, 6, 6)), '2021-01-01',
+                                            '2021-12-31', 'S2_MSI_L2A', 100)
+    cache.put(utils.get_search_key('creodias', region_kwargs), products)
+    utils.set_search_cache(cache)
+    try:
+        for tile_id_property, expected in (('id', {'31TCJ': ['S2A_31TCJ', 'S2B_31TCJ'],
+                                                   '31TDJ': [],
+                                                   '31TEJ': ['S2A_31TEJ']}),
+                                           (None, {'31TCJ': ['S2A_31TCJ', 'S2B_31TCJ'],
+                                                   '31TDJ': ['S2B_31TCJ'],
+                                                   '31TEJ': ['S2A_31TEJ']})):
+            assert utils.prefetch_eodag_prods(tiles, '2021-01-01', '2021-12-31', 'creodias',
+                                              'S2_MSI_L2A', None, cloud_cover=100,
+                                              tile_id_property=tile_id_property) == 3
+            for tile_id, tile_df in tiles.items():
+                tile_products = utils.eodag_prods(tile_df, '2021-01-01', '2021-12-31',
+                                                  'creodias', 'S2_MSI_L2A', None,
+                                                  cloud_cover=100)
+                assert [product.properties['id'] for product in tile_products] == \
+                    expected[tile_id]
+        assert utils.clear_prefetched_prods() == 0
+    finally:
+        utils.set_search_cache(None)
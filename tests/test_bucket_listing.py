@@ -0,0 +1,130 @@
+import io
+import json
+
+import pytest
+
+from ewoc_prod.ewoc_work_plan import bucket_listing, s2prods
+from ewoc_prod.ewoc_work_plan.bucket_listing import check_products, get_listing_prefixes
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+KEYS = [f'tiles/31/T/CJ/2021/{month}/{day}/0/{name}'
+        for month in range(1, 13) for day in (5, 15, 25)
+        for name in ('B01.jp2', 'B02.jp2', 'tileInfo.json')] + \
+    ['tiles/31/T/CJ/2021/3/10/0/tileInfo.json', 'tiles/31/T/CJ/2021/4/15/1/tileInfo.json']
+
+
+class Paginator:
+    """list_objects_v2 paginator with pages of 10 objects"""
+
+    def __init__(self, requests):
+        self.requests = requests
+
+    def paginate(self, Bucket, Prefix, RequestPayer=None):
+        self.requests.append((Bucket, Prefix, RequestPayer))
+        keys = [key for key in KEYS if key.startswith(Prefix)]
+        for i in range(0, max(len(keys), 1), 10):
+            yield {'Contents': [{'Key': key} for key in keys[i:i + 10]]}
+
+
+class S3Client:
+    """S3 client that records the listings and the product checks"""
+
+    def __init__(self):
+        self.requests = []
+        self.checks = []
+        self.objects = []
+
+    def get_paginator(self, operation):
+        assert operation == 'list_objects_v2'
+        return Paginator(self.requests)
+
+    def list_objects_v2(self, Bucket, Prefix, MaxKeys, RequestPayer=None):
+        self.checks.append((Bucket, Prefix, MaxKeys, RequestPayer))
+        return {'KeyCount': min(len([key for key in KEYS if key.startswith(Prefix)]), MaxKeys)}
+
+
+    def get_object(self, Bucket, Key, RequestPayer=None):
+        assert Key in KEYS
+        self.objects.append(Key)
+        year, month, day = Key.split('/')[4:7]
+        tile_info = {'productName': f'S2A_MSIL2A_{year}{int(month):02d}{int(day):02d}T103021_'
+                                    'N0300_R108_T31TCJ_20210105T134325',
+                     'cloudyPixelPercentage': int(day)}
+        return {'Body': io.BytesIO(json.dumps(tile_info).encode('utf-8'))}
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    """Shared S3 client of the checks"""
+    client = S3Client()
+    monkeypatch.setattr(bucket_listing, 'get_s3_client', lambda *args: client)
+    monkeypatch.setattr(s2prods, 'get_s3_client', lambda *args: client)
+    return client
+
+
+def test_get_listing_prefixes():
+    """Years with products in enough months are listed at once"""
+    prd_prefixes = ['tiles/31/T/CJ/2020/12/5/0/', 'tiles/31/T/CJ/2021/1/5/0/',
+                    'tiles/31/T/CJ/2021/2/5/0/', 'tiles/31/T/CJ/2021/3/5/0/']
+    assert get_listing_prefixes(prd_prefixes, min_months=3) == {
+        'tiles/31/T/CJ/2020/12/': ['tiles/31/T/CJ/2020/12/5/0/'],
+        'tiles/31/T/CJ/2021/': prd_prefixes[1:]}
+    assert list(get_listing_prefixes(prd_prefixes, min_months=4)) == [
+        'tiles/31/T/CJ/2020/12/', 'tiles/31/T/CJ/2021/1/', 'tiles/31/T/CJ/2021/2/',
+        'tiles/31/T/CJ/2021/3/']
+
+
+def test_check_products(s3_client):
+    """Products are checked with the objects counts of the listings"""
+    prd_prefixes = [f'tiles/31/T/CJ/2021/{month}/{day}/0/'
+                    for month in range(1, 13) for day in (5, 10)]
+    expected = [day == 5 or month == 3 for month in range(1, 13) for day in (5, 10)]
+    assert check_products('sentinel-s2-l2a', 's2_l2a_bucket', prd_prefixes, threshold=1,
+                          request_payer=True) == expected
+    assert s3_client.requests == [('sentinel-s2-l2a', 'tiles/31/T/CJ/2021/', 'requester')]
+    # Month listings, the product of 2021/3/10 has less than 2 objects
+    s3_client.requests.clear()
+    assert check_products('sentinel-s2-l2a', 's2_l2a_bucket', prd_prefixes[4:6], threshold=2,
+                          min_months=12) == [True, False]
+    assert s3_client.requests == [('sentinel-s2-l2a', 'tiles/31/T/CJ/2021/3/', None)]
+    assert check_products('sentinel-s2-l2a', 's2_l2a_bucket', []) == []
+    assert not s3_client.checks
+
+
+def test_check_products_alone(s3_client):
+    """Products alone in their month are checked one by one, concurrently, in order"""
+    prd_prefixes = [f'tiles/31/T/CJ/2021/{month}/{day}/0/'
+                    for month in range(1, 13) for day in (5, 10, 15)]
+    expected = [day != 10 for month in range(1, 13) for day in (5, 10, 15)]
+    assert check_products('sentinel-s2-l2a', 's2_l2a_bucket', prd_prefixes, threshold=3,
+                          min_months=13, max_workers=4) == expected
+    assert len(s3_client.requests) == 12
+    s3_client.requests.clear()
+    prd_prefixes = [f'tiles/31/T/CJ/2021/{month}/10/0/' for month in range(1, 13)]
+    assert check_products('sentinel-s2-l2a', 's2_l2a_bucket', prd_prefixes, threshold=1,
+                          min_months=13, max_workers=4) == [month == 3 for month in range(1, 13)]
+    assert not s3_client.requests
+    assert sorted(s3_client.checks) == sorted(
+        ('sentinel-s2-l2a', prd_prefix, 1, None) for prd_prefix in prd_prefixes)
+
+
+def test_get_e84_ids_from_bucket(s3_client):
+    """Products of the period (both dates included) are read from the tile infos"""
+    e84 = s2prods.get_e84_ids_from_bucket('31TCJ', '2021-03-10', '2021-07-05')
+    assert sorted((info['date'].month, info['date'].day) for info in e84.values()) == [
+        (3, 10), (3, 15), (3, 25), (4, 5), (4, 15), (4, 25), (5, 5), (5, 15), (5, 25),
+        (6, 5), (6, 15), (6, 25), (7, 5)]
+    assert all(info['provider'] == 'aws_sng' and info['level'] == 'L2A'
+               for info in e84.values())
+    # Month listings as the bucket checks, the year is listed only if all its months are needed
+    assert s3_client.requests == [('sentinel-s2-l2a', f'tiles/31/T/CJ/2021/{month}/', 'requester')
+                                  for month in (3, 4, 5, 6, 7)]
+    # Only the first sequence of a day is read
+    assert 'tiles/31/T/CJ/2021/4/15/0/tileInfo.json' in s3_client.objects
+    assert 'tiles/31/T/CJ/2021/4/15/1/tileInfo.json' not in s3_client.objects
+    s3_client.requests.clear()
+    assert len(s2prods.get_e84_ids_from_bucket('31TCJ', '2021-01-01', '2021-12-31')) == 37
+    assert s3_client.requests == [('sentinel-s2-l2a', 'tiles/31/T/CJ/2021/', 'requester')]
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from ewoc_prod.ewoc_work_plan.engine import AsyncEngine, run_blocking, set_engine
+from ewoc_prod.ewoc_work_plan.stats import collect_stats
+from ewoc_prod.ewoc_work_plan.transport import get_transport
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+
+class InFlight:
+    """Blocking call that records the maximum number of calls in flight"""
+
+    def __init__(self):
+        self.nb_calls = 0
+        self.max_calls = 0
+        self.lock = threading.Lock()
+
+    def request(self, value):
+        with self.lock:
+            self.nb_calls += 1
+            self.max_calls = max(self.max_calls, self.nb_calls)
+        time.sleep(0.01)
+        with self.lock:
+            self.nb_calls -= 1
+        return get_transport().call('s2_l2a_bucket', str(value), lambda: value * 2)
+
+
+def test_run_blocking():
+    """Calls run concurrently with the engine, limited per provider, in order"""
+    in_flight = InFlight()
+    funcs = [lambda value=value: in_flight.request(value) for value in range(40)]
+    assert run_blocking('sentinel-s2-l2a', funcs) == [value * 2 for value in range(40)]
+    assert in_flight.max_calls == 1
+    # Without the engine, the calls may run in a pool of threads
+    with collect_stats() as stats:
+        assert run_blocking('sentinel-s2-l2a', funcs, max_workers=4) == \
+            [value * 2 for value in range(40)]
+    assert 1 < in_flight.max_calls <= 4
+    assert stats['calls'] == {'s2_l2a_bucket': 40}
+    in_flight.max_calls = 0
+
+    engine = AsyncEngine(max_threads=16, default_limit=8, limits={'creodias': 2})
+    set_engine(engine)
+    try:
+        with collect_stats() as stats:
+            assert run_blocking('sentinel-s2-l2a', funcs) == [value * 2 for value in range(40)]
+        assert 1 < in_flight.max_calls <= 8
+        # Calls run by the engine are counted in the stats of the calling thread
+        assert stats['calls'] == {'s2_l2a_bucket': 40}
+        in_flight.max_calls = 0
+        assert run_blocking('creodias', funcs[:10]) == [value * 2 for value in range(10)]
+        assert in_flight.max_calls == 2
+        assert run_blocking('creodias', []) == []
+    finally:
+        set_engine(None)
+        engine.close()
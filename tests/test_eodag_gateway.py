@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from ewoc_prod.ewoc_work_plan import utils
+from ewoc_prod.ewoc_work_plan.utils import get_eodag_gateway
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+
+def test_get_eodag_gateway(monkeypatch):
+    """One gateway per configuration, provider and thread"""
+    created = []
+
+    def create_eodag_gateway(creds, provider):
+        created.append((creds, provider, threading.get_ident()))
+        return object()
+
+    monkeypatch.setattr(utils, '_create_eodag_gateway', create_eodag_gateway)
+    monkeypatch.setattr(utils, '_eodag_gateways', threading.local())
+    creodias = get_eodag_gateway('eodag.yml', 'creodias')
+    assert get_eodag_gateway('eodag.yml', 'creodias') is creodias
+    assert get_eodag_gateway('eodag.yml', 'earth_search') is not creodias
+
+    barrier = threading.Barrier(4)
+
+    def thread_gateways(_):
+        barrier.wait()
+        return (threading.get_ident(), get_eodag_gateway('eodag.yml', 'creodias'),
+                get_eodag_gateway('eodag.yml', 'creodias'))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(thread_gateways, range(4)))
+    # Each thread gets its own gateway, reused by its next searches
+    assert all(first is second for _, first, second in results)
+    gateways = {id(first) for _, first, _ in results}
+    assert len(gateways) == 4 and id(creodias) not in gateways
+    assert len(created) == 6
+    assert len({ident for _, _, ident in created}) == 5
@@ -0,0 +1,21 @@
+from shapely.geometry import box
+
+from ewoc_prod.ewoc_work_plan.geometry_tree import GeometryTree
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+
+def test_query():
+    """Positions of the geometries intersecting one or several geometries"""
+    tree = GeometryTree([box(i, j, i + 1, j + 1) for i in range(3) for j in range(3)])
+    assert len(tree) == 9
+    # L shape: its bounding box covers the 9 squares, it only crosses 5 of them
+    l_shape = box(0.1, 0.1, 0.9, 2.9).union(box(0.1, 0.1, 2.9, 0.9))
+    assert sorted(tree.query(l_shape)) == [0, 1, 2, 3, 6]
+    assert sorted(tree.query(l_shape, exact=False)) == list(range(9))
+    assert tree.query(box(10, 10, 11, 11)) == []
+    assert tree.query_many([box(0.2, 0.2, 0.4, 0.4), box(2.2, 2.2, 2.4, 2.4),
+                            box(0.3, 0.3, 0.5, 0.5)]) == {0, 8}
+    assert tree.query_many([]) == set()
@@ -0,0 +1,22 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+HEAVY_MODULES = ('osgeo', 'boto3', 'eodag', 'eotile', 'geopandas', 'ewoc_dag')
+
+
+@pytest.mark.parametrize('module_name', ['ewoc_prod.cli', 'ewoc_prod.ewoc_work_plan.cli',
+                                         'ewoc_prod.supervisor', 'ewoc_prod.run_aez_by_tiles'])
+def test_entry_points_lazy_imports(module_name):
+    """Importing an entry point does not load the heavy dependencies"""
+    code = (f"import json, sys; import {module_name}; "
+            f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))")
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout.splitlines()[-1]) == []
@@ -0,0 +1,125 @@
+from datetime import datetime
+import threading
+import time
+
+from ewoc_prod.ewoc_work_plan import s2prods
+from ewoc_prod.ewoc_work_plan.s2prods import (
+    merge_ids,
+    merge_providers_ids,
+    run_multiple_cross_provider,
+)
+from ewoc_prod.ewoc_work_plan.stats import collect_stats, count_call
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+
+def prds(provider, level, days, reproc='T120000'):
+    """S2 products of a provider acquired at some days of January 2021"""
+    return {f'S2A_MSI{level}_202101{day:02d}T105441_N0400_R051_T31TCJ_202101{day:02d}{reproc}':
+            {'cc': 10.0, 'date': datetime(2021, 1, day, 10, 54, 41), 'provider': provider,
+             'level': level}
+            for day in days}
+
+
+def test_merge_ids():
+    """Products of ref are replaced by the products of sec with another level"""
+    ref = prds('creodias', 'L1C', [1, 6, 11])
+    sec = {**prds('aws', 'L2A', [6, 16]), **prds('aws', 'L2A', [6], reproc='T180000')}
+    fusion = merge_ids(ref, sec)
+    # Last product of sec at the same date, products of sec only are not added
+    assert list(fusion) == [list(ref)[0],
+                            'S2A_MSIL2A_20210106T105441_N0400_R051_T31TCJ_20210106T180000',
+                            list(ref)[2]]
+    # Same level: no replacement
+    assert merge_ids(ref, prds('aws_sng', 'L1C', [1, 6, 11])) == ref
+    assert merge_ids(ref, None) == ref
+
+
+def test_merge_providers_ids():
+    """Providers are merged in turn until no product of the reference is left"""
+    searches = []
+
+    def search(provider, level, days):
+        def run():
+            searches.append(provider)
+            return prds(provider, level, days)
+        return run
+
+    ref = prds('creodias', 'L1C', [1, 6, 11])
+    fusion = merge_providers_ids(ref, [search('aws', 'L2A', [1, 6]), None,
+                                       search('creodias', 'L2A', [11]),
+                                       search('aws_sng', 'L1C', [1])], 'creodias', 'L1C')
+    assert [info['provider'] for info in fusion.values()] == ['aws', 'aws', 'creodias']
+    # All the reference products are replaced after the third provider
+    assert searches == ['aws', 'creodias']
+    assert merge_providers_ids({}, [search('aws', 'L2A', [1])], 'creodias', 'L1C') == {}
+    assert searches == ['aws', 'creodias']
+
+
+def test_fan_out(monkeypatch):
+    """Providers searched at once give the same products, slow providers are skipped"""
+    searches = []
+    lock = threading.Lock()
+    days = {'creodias': [1, 6, 11, 16], 'aws': [1, 6, 11], 'aws_sng': [16, 21]}
+    delays = {'creodias': 0.05, 'aws': 0.05, 'aws_sng': 0.05}
+
+    def get_s2_ids(s2_tile, provider, start, end, creds, cloudcover=100, level='L2A'):
+        with lock:
+            searches.append(provider)
+        time.sleep(delays[provider])
+        return prds(provider, level, days[provider])
+
+    monkeypatch.setattr(s2prods, 'get_s2_ids', get_s2_ids)
+    providers, strategy = ['creodias', 'aws', 'aws_sng'], ['L1C', 'L2A', 'L2A']
+
+    def run(**kwargs):
+        searches.clear()
+        products = run_multiple_cross_provider('31TCJ', '2021-01-01', '2021-01-31', 100, 100,
+                                               0, None, providers, strategy, **kwargs)
+        return [provider for provider, _ in products]
+
+    assert run() == ['aws', 'aws', 'aws', 'aws_sng']
+    assert run(fan_out=True) == ['aws', 'aws', 'aws', 'aws_sng']
+    assert sorted(searches) == sorted(providers)
+    # No product of the first provider left after aws: aws_sng is not searched
+    days['aws'] = [1, 6, 11, 16]
+    assert run() == ['aws'] * 4
+    assert searches == ['creodias', 'aws']
+    assert run(fan_out=True) == ['aws'] * 4
+    # A slow provider is skipped after the timeout
+    delays['aws'] = 1.0
+    start = time.perf_counter()
+    assert run(fan_out=True, provider_timeout=0.3) == ['creodias'] * 3 + ['aws_sng']
+    assert time.perf_counter() - start < 0.9
+    assert run(provider_timeout=0.3) == ['creodias'] * 3 + ['aws_sng']
+
+
+def test_fan_out_stats(monkeypatch):
+    """Searches skipped after the timeout or not needed are not counted in the stats"""
+    delays = {'creodias': 0.05, 'aws': 0.5, 'aws_sng': 0.05}
+    days = {'creodias': [1, 6], 'aws': [1, 6], 'aws_sng': [1, 6]}
+
+    def get_s2_ids(s2_tile, provider, start, end, creds, cloudcover=100, level='L2A'):
+        time.sleep(delays[provider])
+        count_call(f'search_{provider}')
+        return prds(provider, level, days[provider])
+
+    monkeypatch.setattr(s2prods, 'get_s2_ids', get_s2_ids)
+    providers, strategy = ['creodias', 'aws', 'aws_sng'], ['L1C', 'L2A', 'L2A']
+    with collect_stats() as stats:
+        products = run_multiple_cross_provider('31TCJ', '2021-01-01', '2021-01-31', 100, 100,
+                                               0, None, providers, strategy, fan_out=True,
+                                               provider_timeout=0.2)
+    assert [provider for provider, _ in products] == ['aws_sng'] * 2
+    # Wait for the end of the skipped search
+    time.sleep(0.5)
+    assert stats['calls'] == {'search_creodias': 1, 'search_aws_sng': 1}
+    # No product of the first provider left after aws: aws_sng is not needed
+    delays['aws'] = 0.05
+    with collect_stats() as stats:
+        run_multiple_cross_provider('31TCJ', '2021-01-01', '2021-01-31', 100, 100, 0, None,
+                                    providers, strategy, fan_out=True)
+    time.sleep(0.1)
+    assert stats['calls'] == {'search_creodias': 1, 'search_aws': 1}
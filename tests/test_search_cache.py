@@ -0,0 +1,55 @@
+import time
+
+from ewoc_prod.ewoc_work_plan.search_cache import CachedProduct, SearchCache
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+
+def products(nb_products, prefix='S2'):
+    """Products with the attributes used by the workplan"""
+    return [CachedProduct({'id': f'{prefix}_{index}', 'cloudCover': index % 100},
+                          {'vv': {'href': f's3://bucket/{prefix}_{index}/vv.tiff'}})
+            for index in range(nb_products)]
+
+
+def test_search_cache(tmp_path):
+    """Searches are stored, read back by another instance and counted"""
+    filepath = tmp_path / 'search_cache.sqlite'
+    cache = SearchCache(filepath)
+    key = cache.get_key(provider='earth_search', productType='sentinel-s2-l2a',
+                        start='2020-09-01', end='2021-08-31', geom='POLYGON ((0 0, 1 0, 1 1, 0 0))')
+    assert key != cache.get_key(provider='creodias', productType='sentinel-s2-l2a',
+                                start='2020-09-01', end='2021-08-31',
+                                geom='POLYGON ((0 0, 1 0, 1 1, 0 0))')
+    assert cache.get(key) is None
+    cache.put(key, products(10))
+    assert cache.get(key) == products(10)
+    assert SearchCache(filepath).get(key) == products(10)
+    assert SearchCache(filepath, refresh=True).get(key) is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['searches'] == 1
+
+
+def test_search_cache_ttl(tmp_path):
+    """Expired searches are not read"""
+    cache = SearchCache(tmp_path / 'search_cache.sqlite', ttl=0.2)
+    cache.put('key', products(1))
+    assert cache.get('key') == products(1)
+    time.sleep(0.3)
+    assert cache.get('key') is None
+
+
+def test_search_cache_eviction(tmp_path):
+    """Least recently used searches are removed when the cache is too large"""
+    cache = SearchCache(tmp_path / 'search_cache.sqlite')
+    cache.put('first', products(500, 'first'))
+    cache.put('second', products(500, 'second'))
+    cache.get('first')
+    cache.max_size = int(cache.stats()['size'] * 1.2)
+    cache.put('third', products(500, 'third'))
+    assert cache.get('second') is None
+    assert cache.get('first') == products(500, 'first')
+    assert cache.get('third') == products(500, 'third')
@@ -0,0 +1,106 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from ewoc_prod import tiles_2_workplan
+from ewoc_prod.aez_tile_catalog import AezTileCatalog
+from ewoc_prod.season_windows import (WINDOW_KEYS, datetime64_to_date,
+    get_metaseason_table, get_tiles_season_windows,
+    read_metaseason_table, shift_years, write_metaseason_table)
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+SEASON_DOY_FIELDS = ('wwsos_min', 'wweos_max', 'm1sos_min', 'm1eos_max',
+                     'm2sos_min', 'm2eos_max')
+
+
+def random_catalog(nb_tiles=300, seed=42):
+    """Grid with random season days of year, including edge cases"""
+    rng = np.random.default_rng(seed)
+    columns = {field: rng.integers(1, 367, nb_tiles) for field in SEASON_DOY_FIELDS}
+    # No season, season start in the first days of the year, last day of the year
+    for start, end in (('wwsos_min', 'wweos_max'), ('m1sos_min', 'm1eos_max'),
+                       ('m2sos_min', 'm2eos_max')):
+        columns[start][rng.random(nb_tiles) < 0.1] = rng.integers(1, 16)
+        columns[end][rng.random(nb_tiles) < 0.05] = 366
+        no_season = rng.random(nb_tiles) < 0.15
+        columns[start][no_season] = 0
+        columns[end][no_season] = 0
+    columns['L8'] = rng.integers(0, 2, nb_tiles)
+    columns['trigger_sw'] = rng.integers(0, 2, nb_tiles)
+    columns['zoneID'] = rng.choice([19093, 46172, 37189], nb_tiles)
+    tile_ids = [f'T{index:04d}' for index in range(nb_tiles)]
+    return AezTileCatalog(tile_ids, columns)
+
+
+def test_shift_years():
+    """Shift of one year clips the 29th of february"""
+    dates = np.array(['2020-02-29', '2021-03-01', 'NaT'], dtype='datetime64[D]')
+    assert shift_years(dates, -1).astype(str).tolist() == ['2019-02-28', '2020-03-01', 'NaT']
+
+
+@pytest.mark.parametrize('season_type', ['winter', 'summer1', 'summer2'])
+@pytest.mark.parametrize('prod_start_date', [date(2021, 10, 10), date(2020, 2, 29),
+                                             date(2024, 1, 5)])
+def test_season_windows_match_scalar(season_type, prod_start_date):
+    """Vectorized windows are the same as the tile by tile computation"""
+    catalog = random_catalog()
+    windows = get_tiles_season_windows(catalog, catalog.tile_ids, season_type,
+                                       prod_start_date)
+    for index, tile_id in enumerate(catalog.tile_ids):
+        expected = tiles_2_workplan.get_tiles_infos_from_tiles(
+            catalog, [tile_id], season_type, prod_start_date)
+        result = tuple(datetime64_to_date(windows[key][index]) for key in WINDOW_KEYS) + \
+            (windows['l8_enable_sr'][index], windows['enable_sw'][index],
+             windows['detector_set'][index])
+        assert result == expected, tile_id
+
+
+@pytest.mark.parametrize('year', [2021, 2020, 2024])
+def test_metaseason_table_match_scalar(year):
+    """Metaseason table is the same as retrieve_custom_dates_new_version"""
+    catalog = random_catalog()
+    table = get_metaseason_table(catalog, [year])
+    for tile in catalog:
+        if (tile.tile_id, year) in table:
+            expected = tiles_2_workplan.retrieve_custom_dates_new_version(tile, year)
+            assert table[(tile.tile_id, year)] == tuple(expected), tile.tile_id
+        else:
+            with pytest.raises(ValueError):
+                tiles_2_workplan.retrieve_custom_dates_new_version(tile, year)
+
+
+def test_metaseason_table_file(tmp_path):
+    """Metaseason table is written and read back unchanged"""
+    catalog = random_catalog(nb_tiles=50)
+    table = get_metaseason_table(catalog, [2021, 2022])
+    assert {year for _, year in table} == {2021, 2022}
+    filepath = tmp_path / 'metaseason_table.csv'
+    write_metaseason_table(table, str(filepath))
+    assert read_metaseason_table(str(filepath)) == table
+
+
+@pytest.mark.parametrize('metaseason', [False, True])
+def test_aez_tiles_infos(tmp_path, metaseason):
+    """Tiles infos computed once per aez are the same as tile by tile"""
+    catalog = random_catalog(nb_tiles=100)
+    orbit_file = tmp_path / 'orbit.csv'
+    # Tiles with consistent days of year for all the seasons
+    tiles_id = [tile_id for tile_id, _ in get_metaseason_table(catalog, [2021])]
+    orbit_file.write_text(f'tile;orbit_dir\n{tiles_id[0]};ASCENDING\n{tiles_id[0]};DESCENDING\n')
+    tiles_infos = tiles_2_workplan.get_aez_tiles_infos(
+        catalog, tiles_id, 'summer1', date(2021, 10, 10), metaseason=metaseason,
+        metaseason_year=2021, orbit_dirs=tiles_2_workplan.read_orbit_file(str(orbit_file)))
+    for tile_id in tiles_id:
+        if metaseason:
+            expected = tiles_2_workplan.get_tiles_metaseason_infos_from_tiles(
+                catalog, [tile_id], 2021)
+        else:
+            expected = ('summer1',) + tiles_2_workplan.get_tiles_infos_from_tiles(
+                catalog, [tile_id], 'summer1', date(2021, 10, 10))
+        assert tiles_infos[tile_id][:-1] == expected
+    assert tiles_infos[tiles_id[0]].orbit_dir == 'DESCENDING'
+    assert tiles_infos[tiles_id[-1]].orbit_dir is None
@@ -0,0 +1,68 @@
+import pytest
+from shapely.geometry import box
+
+from ewoc_prod.ewoc_work_plan.tile_index import S2TileIndex, get_s2_tile, set_s2_tile_index
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+
+def build_grid(nb_x=10, nb_y=5):
+    """Grid of 1 degree square tiles"""
+    gpd = pytest.importorskip("geopandas")
+    tile_ids, geometries = [], []
+    for i in range(nb_x):
+        for j in range(nb_y):
+            tile_ids.append(f'T{i:02d}{j:02d}')
+            geometries.append(box(i, j, i + 1, j + 1))
+    return gpd.GeoDataFrame({'id': tile_ids}, geometry=geometries, crs='EPSG:4326')
+
+
+def test_get():
+    """Tiles are returned as one row GeoDataFrame, in the order of the ids"""
+    index = S2TileIndex(build_grid())
+    assert len(index) == 50
+    assert 'T0302' in index
+    tile = index.get('T0302')
+    assert tile['id'][0] == 'T0302'
+    assert tile.geometry[0].equals(box(3, 2, 4, 3))
+    assert list(index.get_many(['T0904', 'T0000'])['id']) == ['T0904', 'T0000']
+    with pytest.raises(ValueError):
+        index.get('T9999')
+
+
+def test_query():
+    """Tiles intersecting a geometry are returned in grid order"""
+    index = S2TileIndex(build_grid())
+    assert index.query(box(2.2, 1.2, 3.5, 1.8)) == ['T0201', 'T0301']
+    assert index.query('POLYGON ((0.1 0.1, 0.9 0.1, 0.9 0.9, 0.1 0.9, 0.1 0.1))') == ['T0000']
+    # L shape: its bounding box covers 3x3 tiles, it only crosses 5 of them
+    l_shape = box(0.1, 0.1, 0.9, 2.9).union(box(0.1, 0.1, 2.9, 0.9))
+    assert index.query(l_shape) == ['T0000', 'T0001', 'T0002', 'T0100', 'T0200']
+    assert index.query(box(20, 20, 21, 21)) == []
+
+
+class CountingIndex:
+    """Index returning tiles as dictionaries, counting the reads"""
+
+    def __init__(self):
+        self.nb_reads = 0
+
+    def get(self, tile_id):
+        self.nb_reads += 1
+        return {'id': [tile_id]}
+
+
+def test_get_s2_tile_copies():
+    """Tiles are read once, each caller gets its own copy"""
+    index = CountingIndex()
+    set_s2_tile_index(index)
+    try:
+        tile = get_s2_tile('31TCJ')
+        tile['geometry'] = None
+        assert get_s2_tile('31TCJ') == {'id': ['31TCJ']}
+        assert get_s2_tile('31TCJ') is not get_s2_tile('31TCJ')
+        assert index.nb_reads == 1
+    finally:
+        set_s2_tile_index(None)
@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import pytest
+from shapely.geometry import box
+from shapely.wkt import dumps
+
+from ewoc_prod.ewoc_work_plan import utils
+from ewoc_prod.ewoc_work_plan.search_cache import CachedProduct, products_to_records
+from ewoc_prod.ewoc_work_plan.transport import (RecordTransport, ReplayError,
+    ReplayTransport, create_transport, set_transport)
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+
+def fail():
+    """Remote call that must not be done in replay mode"""
+    raise AssertionError("No network access in replay mode")
+
+
+def test_record_replay(tmp_path):
+    """Recorded responses are replayed without calling the providers"""
+    archive = tmp_path / 'archive.sqlite'
+    recorder = RecordTransport(archive)
+    assert recorder.call('is_descending', 'S1A_1', lambda: True) is True
+    assert recorder.call('landsat_cloud_mask', 'L8_1', lambda: (False, None, None)) == \
+        (False, None, None)
+    assert recorder.call('s2_tile_info', 'tiles/1', lambda: None) is None
+    assert recorder.nb_calls == 3
+
+    replayer = ReplayTransport(archive)
+    assert replayer.call('is_descending', 'S1A_1', fail) is True
+    assert replayer.call('landsat_cloud_mask', 'L8_1', fail) == [False, None, None]
+    assert replayer.call('s2_tile_info', 'tiles/1', fail) is None
+    with pytest.raises(ReplayError):
+        replayer.call('is_descending', 'S1A_2', fail)
+    with pytest.raises(ValueError):
+        create_transport('replay')
+
+
+def test_replay_eodag_prods(tmp_path):
+    """Searches of eodag_prods are replayed"""
+    archive = tmp_path / 'archive.sqlite'
+    geometry = box(0, 0, 1, 1)
+    products = [CachedProduct({'id': 'S2A_31TCJ'}, {'B01': {'href': 's3://b/B01.tif'}}, geometry)]
+    search_kwargs = utils.get_search_kwargs(dumps(geometry), '2021-01-01', '2021-12-31',
+                                            'S2_MSI_L2A', 100)
+    RecordTransport(archive).call('search', utils.get_search_key('creodias', search_kwargs),
+                                  lambda: products, encode=products_to_records)
+    set_transport(ReplayTransport(archive))
+    try:
+        assert utils.eodag_prods(SimpleNamespace(geometry=[geometry]), '2021-01-01',
+                                 '2021-12-31', 'creodias', 'S2_MSI_L2A', None,
+                                 cloud_cover=100) == products
+        with pytest.raises(ReplayError):
+            utils.eodag_prods(SimpleNamespace(geometry=[geometry]), '2022-01-01',
+                              '2022-12-31', 'creodias', 'S2_MSI_L2A', None, cloud_cover=100)
+    finally:
+        set_transport(create_transport('live'))
@@ -0,0 +1,55 @@
+import csv
+from datetime import date
+
+import numpy as np
+
+from ewoc_prod.aez_tile_catalog import AezTileCatalog
+from ewoc_prod.trigger_calendar import get_trigger_calendar, write_trigger_calendar
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+
+def build_catalog():
+    """Small grid with two AEZ, seasons ending at days 120, 200 and 366"""
+    return AezTileCatalog(
+        ['31TCJ', '31TDJ', '31TEJ', '38KKG'],
+        {'zoneID': [46172.0, 46172.0, 46172.0, 19093.0],
+         'wweos_max': [200, 120, 200, 0],
+         'm1eos_max': [250, 250, 120, 120],
+         'm2eos_max': [np.nan, 0, 366, 200]})
+
+
+def test_trigger_calendar():
+    """Tiles and AEZ seasons ending each day of the year"""
+    calendar = get_trigger_calendar(build_catalog(), 2020)
+    # Leap year: one row per day up to doy 366
+    assert len(calendar) == 366
+    assert calendar[0][0] == date(2020, 1, 1) and calendar[-1][0] == date(2020, 12, 31)
+    triggers = {current_date.strftime('%j'): (nb_tiles, nb_tiles_per_aez)
+                for current_date, nb_tiles, nb_tiles_per_aez in calendar if nb_tiles}
+    assert triggers == {
+        '120': (3, {('46172', 'winter'): 1, ('46172', 'summer1'): 1,
+                    ('19093', 'summer1'): 1}),
+        '200': (3, {('46172', 'winter'): 2, ('19093', 'summer2'): 1}),
+        '250': (2, {('46172', 'summer1'): 2}),
+        '366': (1, {('46172', 'summer2'): 1})}
+    # No doy 366 in a common year
+    assert len(get_trigger_calendar(build_catalog(), 2021)) == 365
+    assert calendar[0][1:] == (0, {})
+
+
+def test_write_trigger_calendar(tmp_path):
+    """One csv row per day with the tiles, AEZ and season triggers"""
+    output_file = tmp_path / 'trigger_calendar.csv'
+    write_trigger_calendar(get_trigger_calendar(build_catalog(), 2021), str(output_file))
+    with open(output_file, encoding='utf8', newline='') as csv_file:
+        rows = list(csv.reader(csv_file, delimiter=';'))
+    assert rows[0] == ['date', 'doy', 'nb_tiles', 'nb_aez', 'triggers']
+    assert len(rows) == 1 + 365
+    assert rows[1] == ['2021-01-01', '001', '0', '0', '']
+    assert rows[120] == ['2021-04-30', '120', '3', '2',
+                         '19093:summer1:1 46172:summer1:1 46172:winter:1']
+    assert rows[200] == ['2021-07-19', '200', '3', '2', '19093:summer2:1 46172:winter:2']
+    assert rows[250] == ['2021-09-07', '250', '2', '1', '46172:summer1:2']
@@ -0,0 +1,37 @@
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from ewoc_prod.utils import (DOY_TABLE_YEARS, conversion_doy_to_date,
+    conversion_doy_to_datetime64)
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+
+def strptime_doy_to_date(doy, year):
+    """Reference conversion"""
+    return datetime.strptime(f"{year}-{doy}", "%Y-%j").date()
+
+
+@pytest.mark.parametrize('year', [DOY_TABLE_YEARS[0] - 1, 2020, 2021, DOY_TABLE_YEARS[-1] + 1])
+def test_conversion_doy_to_date(year):
+    """Lookup table gives the same dates as strptime, inside and outside the table years"""
+    for doy in range(1, 367):
+        assert conversion_doy_to_date(doy, year) == strptime_doy_to_date(doy, year)
+    assert conversion_doy_to_date('005', year) == date(year, 1, 5)
+    for doy in (0, 367):
+        with pytest.raises(ValueError):
+            conversion_doy_to_date(doy, year)
+
+
+def test_conversion_doy_to_datetime64():
+    """Vectorized conversion follows conversion_doy_to_date"""
+    doys = np.arange(1, 367)
+    for year in (2020, 2021):
+        dates = conversion_doy_to_datetime64(doys, year).astype(date).tolist()
+        assert dates == [conversion_doy_to_date(int(doy), year) for doy in doys]
+    with pytest.raises(ValueError):
+        conversion_doy_to_datetime64(np.array([0]), np.array([2021]))
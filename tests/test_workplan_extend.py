@@ -0,0 +1,145 @@
+import pytest
+from shapely.geometry import box
+
+from ewoc_prod.ewoc_work_plan import workplan
+from ewoc_prod.ewoc_work_plan.stats import count_discarded
+from ewoc_prod.ewoc_work_plan.utils import merge_l8_ids, merge_s1_ids, merge_s2_ids
+from ewoc_prod.ewoc_work_plan.workplan import WorkPlan
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+
+def s1_id(date, suffix='0001'):
+    """S1 product id acquired at a date"""
+    return f'S1A_IW_GRDH_1SDV_{date}T054500_{date}T054525_036000_043000_{suffix}'
+
+
+def s2_id(date, reproc_date):
+    """S2 product id acquired at a date"""
+    return f'S2A_MSIL2A_{date}T105441_N0214_R051_T31TCJ_{reproc_date}T120000'
+
+
+def test_merge_s1_ids():
+    """New products of the last date are added to its group"""
+    s1_ids = [[s1_id('20221001')], [s1_id('20221007'), s1_id('20221007', '0002')]]
+    new_s1_ids = [[s1_id('20221007', '0002'), s1_id('20221007', '0003')], [s1_id('20221013')]]
+    assert merge_s1_ids(s1_ids, new_s1_ids) == [
+        [s1_id('20221001')],
+        [s1_id('20221007'), s1_id('20221007', '0002'), s1_id('20221007', '0003')],
+        [s1_id('20221013')]]
+
+
+def test_merge_s2_ids():
+    """Products found again are kept once, with their latest reprocessing"""
+    s2_ids = [['aws', s2_id('20221001', '20221001')], ['aws', s2_id('20221006', '20221006')]]
+    new_s2_ids = [['aws_sng', s2_id('20221006', '20221006')],
+                  ['aws', s2_id('20221006', '20221107')],
+                  ['aws', s2_id('20221011', '20221011')]]
+    assert merge_s2_ids(s2_ids, new_s2_ids) == [['aws', s2_id('20221001', '20221001')],
+                                                ['aws', s2_id('20221006', '20221107')],
+                                                ['aws', s2_id('20221011', '20221011')]]
+
+
+def test_merge_l8_ids():
+    """L8 products are grouped by path and date"""
+    l8_ids = [['LC08_L2SP_198030_20221003_20221013_02_T1']]
+    new_l8_ids = [['LC08_L2SP_198031_20221003_20221013_02_T1'],
+                  ['LC08_L2SP_198030_20221019_20221031_02_T1']]
+    assert merge_l8_ids(l8_ids, new_l8_ids) == [
+        ['LC08_L2SP_198030_20221003_20221013_02_T1', 'LC08_L2SP_198031_20221003_20221013_02_T1'],
+        ['LC08_L2SP_198030_20221019_20221031_02_T1']]
+
+
+class Tile:
+    """S2 tile with the interface of the S2 grid GeoDataFrame used by WorkPlan"""
+
+    def __init__(self, tile_id):
+        self.tile_id = tile_id
+        self.iloc = [{'geometry': box(0, 0, 1, 1)}]
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    """Identification stubs answering per search window, the searches are recorded"""
+    windows = []
+    generation = {
+        's1': [[s1_id('20221001')], [s1_id('20221007')]],
+        's2': [['aws', s2_id('20221001', '20221001')], ['aws', s2_id('20221006', '20221006')]],
+        'l8': [['LC08_L2SP_198030_20221003_20221013_02_T1']],
+    }
+    extension = {
+        's1': [[s1_id('20221007', '0002')], [s1_id('20221013')]],
+        's2': [['aws', s2_id('20221006', '20221107')], ['aws', s2_id('20221011', '20221011')]],
+        'l8': [['LC08_L2SP_198030_20221019_20221031_02_T1']],
+    }
+
+    def products(plan, sensor, s2_tile, orbit_dir=None):
+        window = (plan['wp_processing_start'], plan['wp_processing_end'])
+        windows.append((sensor, s2_tile.tile_id, window, orbit_dir))
+        if window[0] == '2022-01-01':
+            return generation[sensor]
+        count_discarded('cloud_cover', 1)
+        return extension[sensor]
+
+    def identify_s1(self, s2_tile, orbit_dir=None, eodag_config_filepath=None):
+        return products(self._plan, 's1', s2_tile, orbit_dir), orbit_dir or 'DES'
+
+    def identify_s2(self, tile_id, s2_tile, eodag_config_filepath=None, rm_l1c=None):
+        return products(self._plan, 's2', s2_tile)
+
+    def identify_l8(self, s2_tile, l8_sr=False, eodag_config_filepath=None):
+        return products(self._plan, 'l8', s2_tile)
+
+    monkeypatch.setattr(workplan, 'get_s2_tile', Tile)
+    monkeypatch.setattr(WorkPlan, '_identify_s1', identify_s1)
+    monkeypatch.setattr(WorkPlan, '_identify_s2', identify_s2)
+    monkeypatch.setattr(WorkPlan, '_identify_l8', identify_l8)
+    return windows
+
+
+def test_extend(searches):
+    """Only the new window is searched, its products are merged with the workplan ones"""
+    wp = WorkPlan(['31TCJ'], {}, '2022-01-01', '2022-10-07', 'creodias', ['aws'], ['L2A'],
+                  stats=True)
+    generation_stats = wp._plan['tiles'][0]['_stats']
+    searches.clear()
+    new_wp = wp.extend('2022-10-31')
+    # The current end date is searched again, with the orbit direction of the tile
+    assert searches == [('s1', '31TCJ', ('2022-10-07', '2022-10-31'), 'DES'),
+                        ('s2', '31TCJ', ('2022-10-07', '2022-10-31'), None),
+                        ('l8', '31TCJ', ('2022-10-07', '2022-10-31'), None)]
+    plan = new_wp._plan
+    assert (plan['wp_processing_start'], plan['wp_processing_end']) == ('2022-01-01',
+                                                                        '2022-10-31')
+    tile_plan = plan['tiles'][0]
+    assert tile_plan['s1_orbit_dir'] == 'DES'
+    assert tile_plan['s1_ids'] == [[s1_id('20221001')],
+                                   [s1_id('20221007'), s1_id('20221007', '0002')],
+                                   [s1_id('20221013')]]
+    assert tile_plan['s2_ids'] == [['aws', s2_id('20221001', '20221001')],
+                                   ['aws', s2_id('20221006', '20221107')],
+                                   ['aws', s2_id('20221011', '20221011')]]
+    assert tile_plan['l8_ids'] == [['LC08_L2SP_198030_20221003_20221013_02_T1'],
+                                   ['LC08_L2SP_198030_20221019_20221031_02_T1']]
+    assert (tile_plan['s1_nb'], tile_plan['s2_nb'], tile_plan['l8_nb']) == (3, 3, 2)
+    # Stats of the extension replace the ones of the generation
+    assert set(tile_plan['_stats']) == {'s1', 's2', 'l8'}
+    assert all(stats['discarded'] == {} for stats in generation_stats.values())
+    assert all(stats['discarded'] == {'cloud_cover': 1}
+               for stats in tile_plan['_stats'].values())
+    # The workplan is not modified
+    assert wp._plan['wp_processing_end'] == '2022-10-07'
+    assert wp._plan['tiles'][0]['s1_nb'] == 2
+
+
+def test_extend_end_date(searches):
+    """The new end date must be after the current one"""
+    wp = WorkPlan(['31TCJ'], {}, '2022-01-01', '2022-10-07', 'creodias', ['aws'], ['L2A'])
+    searches.clear()
+    for wp_processing_end in ('2022-10-07', '2022-09-30'):
+        with pytest.raises(ValueError, match='must be after 2022-10-07'):
+            wp.extend(wp_processing_end)
+    assert not searches
+    assert '_stats' not in wp.extend('2022-10-31')._plan['tiles'][0]
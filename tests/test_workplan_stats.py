@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from ewoc_prod.ewoc_work_plan.stats import aggregate_stats, collect_stats, count_discarded
+from ewoc_prod.ewoc_work_plan.transport import LiveTransport
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+
+def identify(nb_calls, nb_discarded):
+    """Identification doing remote calls and discarding products"""
+    with collect_stats() as stats:
+        for _ in range(nb_calls):
+            LiveTransport().call('s2_l2a_bucket', 'tiles/31/T/CJ/', lambda: True)
+        count_discarded('cloud_cover', nb_discarded)
+        count_discarded('l2sr', 0)
+    return stats
+
+
+def test_collect_stats():
+    """Stats are collected per thread"""
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        all_stats = list(executor.map(identify, range(1, 9), range(10, 90, 10)))
+    for i, stats in enumerate(all_stats):
+        assert stats['calls'] == {'s2_l2a_bucket': i + 1}
+        assert stats['discarded'] == {'cloud_cover': (i + 1) * 10}
+        assert stats['time'] >= 0
+    # Calls outside of a collection are not counted
+    assert LiveTransport().call('s2_l2a_bucket', 'tiles/31/T/CJ/', lambda: False) is False
+
+
+def test_aggregate_stats():
+    """Stats of the tiles are summed per sensor"""
+    tile_plans = [
+        {'tile_id': '31TCJ', '_stats': {
+            's1': {'time': 1.5, 'calls': {'search': 1}, 'providers': {'creodias': 1.2},
+                   'discarded': {'orbit_dir': 30}},
+            's2': {'time': 4.0, 'calls': {'search': 2, 's2_l2a_bucket': 70}, 'providers': {},
+                   'discarded': {'cloud_cover': 12}}}},
+        {'tile_id': '31TDJ', '_stats': {
+            's1': {'time': 0.5, 'calls': {'search_cache': 1}, 'providers': {},
+                   'discarded': {'orbit_dir': 28, 'invalid_sar': 2}}}},
+        {'tile_id': '31TEJ'},
+    ]
+    aez_stats = aggregate_stats(tile_plans)
+    assert aez_stats['nb_tiles'] == 2
+    assert aez_stats['time'] == 6.0
+    assert aez_stats['sensors']['s1'] == {
+        'time': 2.0, 'calls': {'search': 1, 'search_cache': 1}, 'providers': {'creodias': 1.2},
+        'discarded': {'orbit_dir': 58, 'invalid_sar': 2}}
+    assert aez_stats['sensors']['s2']['calls'] == {'search': 2, 's2_l2a_bucket': 70}
+    assert aez_stats['sensors']['l8']['time'] == 0.0
+    assert aez_stats['slowest_tiles'] == [('31TCJ', 5.5), ('31TDJ', 0.5)]
@@ -0,0 +1,87 @@
+import random
+import threading
+import time
+
+import pytest
+from shapely.geometry import box
+
+from ewoc_prod.ewoc_work_plan import workplan
+from ewoc_prod.ewoc_work_plan.workplan import WorkPlan
+
+__author__ = "Marjorie Battude"
+__copyright__ = "CS Group"
+__license__ = "MIT"
+
+TILE_IDS = ['31TCJ', '31TDJ', '31TEJ', '31TFJ', '31TGJ', '32TLP']
+
+
+class Tile:
+    """S2 tile with the interface of the S2 grid GeoDataFrame used by WorkPlan"""
+
+    def __init__(self, tile_id):
+        self.tile_id = tile_id
+        self.iloc = [{'geometry': box(0, 0, 1, 1)}]
+
+
+@pytest.fixture
+def identified(monkeypatch):
+    """Identification stubs with random delays, recording the S1 orbit directions"""
+    calls = {'s1': [], 'failing': None}
+    lock = threading.Lock()
+
+    def identify_s1(self, s2_tile, orbit_dir=None, eodag_config_filepath=None):
+        time.sleep(random.uniform(0, 0.02))
+        with lock:
+            calls['s1'].append((s2_tile.tile_id, orbit_dir))
+        # The first tile selects the descending orbit, the others the ascending one
+        if orbit_dir is None:
+            orbit_dir = 'DES' if s2_tile.tile_id == TILE_IDS[0] else 'ASC'
+        return [[f'S1_{s2_tile.tile_id}_{orbit_dir}']], orbit_dir
+
+    def identify_s2(self, tile_id, s2_tile, eodag_config_filepath=None, rm_l1c=None):
+        time.sleep(random.uniform(0, 0.02))
+        if tile_id == calls['failing']:
+            raise RuntimeError(f'Search failed for {tile_id}')
+        return [['aws', f'S2_{tile_id}']]
+
+    def identify_l8(self, s2_tile, l8_sr=False, eodag_config_filepath=None):
+        time.sleep(random.uniform(0, 0.02))
+        return [[f'L8_{s2_tile.tile_id}']]
+
+    monkeypatch.setattr(workplan, 'get_s2_tile', Tile)
+    monkeypatch.setattr(workplan, 'get_s2_tiles', lambda tile_ids: [Tile(t) for t in tile_ids])
+    monkeypatch.setattr(WorkPlan, '_identify_s1', identify_s1)
+    monkeypatch.setattr(WorkPlan, '_identify_s2', identify_s2)
+    monkeypatch.setattr(WorkPlan, '_identify_l8', identify_l8)
+    return calls
+
+
+def tiles_plan(max_workers, orbit_dir=None):
+    """Tiles of a workplan generated with some workers"""
+    wp = WorkPlan(TILE_IDS, {}, '2021-01-01', '2021-12-31', 'creodias', ['aws'], ['L2A'],
+                  orbit_dir=orbit_dir, max_workers=max_workers)
+    return wp._plan['tiles']
+
+
+def test_identify_tiles(identified):
+    """Concurrent identification gives the plan of the identification tile by tile"""
+    sequential = tiles_plan(1)
+    assert [tile['tile_id'] for tile in sequential] == TILE_IDS
+    # The orbit direction of the first tile is forced for the next ones
+    assert {tile['s1_orbit_dir'] for tile in sequential} == {'DES'}
+    assert identified['s1'] == [(TILE_IDS[0], None)] + [(t, 'DES') for t in TILE_IDS[1:]]
+    identified['s1'].clear()
+    assert tiles_plan(4) == sequential
+    assert sorted(identified['s1']) == sorted(
+        [(TILE_IDS[0], None)] + [(t, 'DES') for t in TILE_IDS[1:]])
+    # A forced orbit direction is kept for all the tiles
+    assert {tile['s1_orbit_dir'] for tile in tiles_plan(4, orbit_dir='ASC')} == {'ASC'}
+    assert tiles_plan(4, orbit_dir='ASC') == tiles_plan(1, orbit_dir='ASC')
+
+
+def test_identify_tiles_error(identified):
+    """An identification error is raised in both modes"""
+    identified['failing'] = TILE_IDS[3]
+    for max_workers in (1, 4):
+        with pytest.raises(RuntimeError, match=TILE_IDS[3]):
+            tiles_plan(max_workers)